@@ -1,27 +1,85 @@
 """
 수집된 루트 좌표를 Firebase trails 컬렉션에 추가하는 스크립트
+
+루트는 polyline 문자열(route_polyline, 정밀도 10^-6도)로 압축해 저장한다.
+  python add_route_data.py                # 루트 업로드
+  python add_route_data.py --size-report  # 업로드 없이 기존 형식 대비 크기만 비교 (Firebase 불필요)
 """
+import json
 import os
+import sys
 import firebase_admin
 from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
 
+from route_geometry import POLYLINE_PRECISION, RouteGeometry, encode_polyline
+
 # .env 파일 로드
 load_dotenv()
 
-# Firebase 초기화
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
 cred_path = os.path.join(BACKEND_DIR, "khtml-a34cf-firebase-adminsdk-fbsvc-47f919b324.json")
 
-try:
-    firebase_admin.get_app()
-    print("[INFO] Firebase가 이미 초기화되어 있습니다.")
-except ValueError:
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
-    print("[INFO] Firebase를 초기화했습니다.")
+# --size-report: 루트를 업로드하지 않고 모아서 크기 비교만
+SIZE_REPORT = [] if "--size-report" in sys.argv else None
+
+db = None
+
+
+def get_db():
+    """Firebase 초기화(처음 한 번)"""
+    global db
+    if db is None:
+        try:
+            firebase_admin.get_app()
+            print("[INFO] Firebase가 이미 초기화되어 있습니다.")
+        except ValueError:
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+            print("[INFO] Firebase를 초기화했습니다.")
+        db = firestore.client()
+    return db
+
+
+def _firestore_size(value):
+    # Firestore 저장 크기 규칙: 문자열 UTF-8 바이트 + 1, 숫자 8, 맵은 (필드 이름 + 값) 합, 배열은 값 합
+    if isinstance(value, str):
+        return len(value.encode("utf-8")) + 1
+    if isinstance(value, dict):
+        return sum(_firestore_size(k) + _firestore_size(v) for k, v in value.items())
+    if isinstance(value, list):
+        return sum(_firestore_size(v) for v in value)
+    return 8
 
-db = firestore.client()
+
+def _json_size(value):
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def print_size_report(routes):
+    """기존 형식({lng, lat, order} 맵 배열 / [lng, lat] GeoJSON) 대비 polyline 형식 크기 비교"""
+    print(f"\n{'산책로':<16}{'좌표':>6}{'Firestore 기존':>16}{'polyline':>10}{'API 기존':>10}{'polyline':>10}")
+    totals = [0, 0, 0, 0]
+    for trail_name, coordinates in routes:
+        legacy_doc = {'route_coordinates': [
+            {'lng': float(c[0]), 'lat': float(c[1]), 'order': i} for i, c in enumerate(coordinates)]}
+        geometry = RouteGeometry.from_doc(legacy_doc)
+        encoded_doc = {
+            'route_polyline': geometry.encoded['polyline'],
+            'route_precision': POLYLINE_PRECISION,
+            'route_point_count': len(coordinates),
+        }
+        sizes = [
+            _firestore_size(legacy_doc),
+            _firestore_size(encoded_doc),
+            _json_size(geometry.geojson),
+            _json_size(geometry.encoded),
+        ]
+        totals = [t + s for t, s in zip(totals, sizes)]
+        print(f"{trail_name:<16}{len(coordinates):>6}{sizes[0]:>14}B{sizes[1]:>9}B{sizes[2]:>9}B{sizes[3]:>9}B")
+    print(f"{'합계':<16}{sum(len(c) for _, c in routes):>6}{totals[0]:>14}B{totals[1]:>9}B{totals[2]:>9}B{totals[3]:>9}B")
+    if totals[0] and totals[2]:
+        print(f"Firestore {100 * (1 - totals[1] / totals[0]):.1f}% 감소, API 응답(루트 부분) {100 * (1 - totals[3] / totals[2]):.1f}% 감소")
 
 def add_route_to_trail(trail_name, route_data):
     """
@@ -40,13 +98,6 @@ def add_route_to_trail(trail_name, route_data):
         }
     """
     try:
-        trail_ref = db.collection('trails').document(trail_name)
-        trail_doc = trail_ref.get()
-        
-        if not trail_doc.exists:
-            print(f"❌ '{trail_name}' 산책로를 찾을 수 없습니다.")
-            return False
-        
         # Firestore 호환 형식으로 변환
         if isinstance(route_data, dict) and 'coordinates' in route_data:
             # GeoJSON 형식인 경우 coordinates만 추출
@@ -58,34 +109,39 @@ def add_route_to_trail(trail_name, route_data):
             print(f"❌ 잘못된 루트 데이터 형식입니다.")
             return False
         
-        # 좌표를 객체 배열로 변환 (Firestore 호환)
-        coordinate_objects = []
-        for i, coord in enumerate(coordinates):
-            if isinstance(coord, list) and len(coord) == 2:
-                # [경도, 위도]를 {lng: 경도, lat: 위도} 객체로 변환
-                coord_obj = {
-                    'lng': float(coord[0]),
-                    'lat': float(coord[1]),
-                    'order': i  # 순서 보장을 위한 인덱스
-                }
-                coordinate_objects.append(coord_obj)
-            else:
+        # [경도, 위도] 좌표 검증
+        for coord in coordinates:
+            if not (isinstance(coord, list) and len(coord) == 2):
                 print(f"❌ 잘못된 좌표 형식: {coord}")
                 return False
         
         # 좌표 데이터 검증
-        if not coordinate_objects or len(coordinate_objects) < 2:
+        if len(coordinates) < 2:
             print(f"❌ 최소 2개 이상의 좌표가 필요합니다.")
             return False
         
-        print(f"[DEBUG] 좌표 객체 변환 완료: {len(coordinate_objects)}개 좌표")
-        print(f"[DEBUG] 첫 번째 좌표: lng={coordinate_objects[0]['lng']}, lat={coordinate_objects[0]['lat']}")
-        print(f"[DEBUG] 마지막 좌표: lng={coordinate_objects[-1]['lng']}, lat={coordinate_objects[-1]['lat']}")
+        if SIZE_REPORT is not None:
+            SIZE_REPORT.append((trail_name, coordinates))
+            return True
         
-        # Firestore에 저장할 데이터 구조 (객체 배열)
+        trail_ref = get_db().collection('trails').document(trail_name)
+        trail_doc = trail_ref.get()
+        
+        if not trail_doc.exists:
+            print(f"❌ '{trail_name}' 산책로를 찾을 수 없습니다.")
+            return False
+        
+        # 좌표를 polyline 문자열로 압축(위도, 경도 순 10^-6도 고정소수점 차분)
+        polyline = encode_polyline([[float(c[0]), float(c[1])] for c in coordinates])
+        print(f"[DEBUG] polyline 변환 완료: {len(coordinates)}개 좌표 → {len(polyline)}자")
+        
+        # Firestore에 저장할 데이터 구조 (이전 객체 배열 필드는 삭제)
         route_firestore_data = {
             'route_type': 'LineString',
-            'route_coordinates': coordinate_objects
+            'route_polyline': polyline,
+            'route_precision': POLYLINE_PRECISION,
+            'route_point_count': len(coordinates),
+            'route_coordinates': firestore.DELETE_FIELD,
         }
         
         # 루트 데이터 추가
@@ -107,7 +163,7 @@ def list_available_trails():
     Firebase에 있는 산책로 목록 표시
     """
     print("\n📋 사용 가능한 산책로 목록:")
-    trails_ref = db.collection('trails')
+    trails_ref = get_db().collection('trails')
     docs = trails_ref.stream()
     
     trails = []
@@ -138,7 +194,8 @@ if __name__ == "__main__":
     print("=" * 50)
     
     # 사용 가능한 산책로 목록 표시
-    trails = list_available_trails()
+    if SIZE_REPORT is None:
+        trails = list_available_trails()
     
     print("\n사용 방법:")
     print("1. route-collector.html에서 좌표 수집")
@@ -2092,5 +2149,6 @@ if __name__ == "__main__":
 }
     # 실제 산책로 이름으로 변경하여 실행
     add_route_to_trail("장이소공원", 장이소공원)
-    
-    
\ No newline at end of file
+
+    if SIZE_REPORT is not None:
+        print_size_report(SIZE_REPORT)
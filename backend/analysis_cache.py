@@ -0,0 +1,236 @@
+"""/api/analyze 응답 캐시와 동시 요청 병합(single-flight)
+
+정규화한 입력 텍스트 + 음악 취향을 키로 Gemini 분석 결과를 보관한다.
+LRU 축출, TTL 만료, 크기 상한, 적중/미스 카운터를 제공하고
+경로를 지정하면 로컬 JSON 파일로 저장해 재시작 후에도 유지한다.
+같은 키로 동시에 들어온 요청은 진행 중인 호출 하나의 결과를 공유한다.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """캐시 키용 정규화: 유니코드 NFC, 앞뒤 공백 제거, 연속 공백 축약, 소문자화"""
+    if not text:
+        return ""
+    s = unicodedata.normalize("NFC", str(text))
+    s = _WHITESPACE_RE.sub(" ", s).strip()
+    return s.lower()
+
+
+def make_cache_key(user_text: str, music_taste: Optional[str]) -> str:
+    raw = f"{normalize_text(music_taste)}\x1f{normalize_text(user_text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """스레드 안전한 LRU + TTL 캐시 (선택적 디스크 저장)"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_sec: int = 6 * 3600,
+        persist_path: Optional[str] = None,
+        persist_interval_sec: float = 5.0,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_sec = max(1, int(ttl_sec))
+        self.persist_path = persist_path
+        self.persist_interval_sec = persist_interval_sec
+        self._lock = threading.Lock()
+        # key -> (저장 시각(epoch), 값)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._dirty = False
+        self._last_persist = 0.0
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+            "rejected": 0,
+        }
+        if self.persist_path:
+            self._load()
+
+    # ---- 조회/저장 ----
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            stored_at, value = entry
+            if now - stored_at > self.ttl_sec:
+                del self._entries[key]
+                self._dirty = True
+                self._counters["expired"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            # 호출자가 결과를 수정해도 캐시 원본이 바뀌지 않도록 복사본 반환
+            return json.loads(json.dumps(value, ensure_ascii=False))
+
+    def put(self, key: str, value: Dict[str, Any]) -> bool:
+        """오류 결과는 저장하지 않는다. 저장 여부를 반환"""
+        if not value or value.get("error"):
+            with self._lock:
+                self._counters["rejected"] += 1
+            return False
+        with self._lock:
+            self._entries[key] = (time.time(), json.loads(json.dumps(value, ensure_ascii=False)))
+            self._entries.move_to_end(key)
+            self._counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            self._dirty = True
+        self._maybe_persist()
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self._maybe_persist(force=True)
+
+    # ---- 디스크 저장 ----
+    def _load(self) -> None:
+        path = self.persist_path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            now = time.time()
+            loaded = 0
+            # 파일에는 오래된 순으로 저장되어 있으므로 그대로 넣으면 LRU 순서가 유지된다
+            for item in raw.get("entries", []):
+                key, stored_at, value = item["key"], float(item["stored_at"]), item["value"]
+                if now - stored_at > self.ttl_sec or not isinstance(value, dict) or value.get("error"):
+                    continue
+                self._entries[key] = (stored_at, value)
+                loaded += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            print(f"[DEBUG] Analysis cache loaded from {path}: {loaded} entries")
+        except Exception as e:
+            print(f"[DEBUG] Failed to load analysis cache from {path}: {e}")
+
+    def _maybe_persist(self, force: bool = False) -> None:
+        if not self.persist_path:
+            return
+        now = time.time()
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and now - self._last_persist < self.persist_interval_sec:
+                return
+            snapshot = [
+                {"key": k, "stored_at": stored_at, "value": v}
+                for k, (stored_at, v) in self._entries.items()
+            ]
+            self._dirty = False
+            self._last_persist = now
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": snapshot}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            print(f"[DEBUG] Failed to persist analysis cache to {self.persist_path}: {e}")
+            with self._lock:
+                self._dirty = True
+
+    def flush(self) -> None:
+        self._maybe_persist(force=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSec": self.ttl_sec,
+                "persistPath": self.persist_path,
+                "hitRate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+                **self._counters,
+            }
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """같은 키에 대한 동시 호출을 하나로 합친다.
+
+    먼저 도착한 요청(leader)만 fn을 실행하고, 실행 중에 도착한 요청(follower)은
+    새 호출을 시작하지 않고 leader의 결과(또는 예외)를 기다려 공유한다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._counters: Dict[str, int] = {"leaders": 0, "followers": 0, "errors": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(결과, 공유 여부)를 반환. 공유된 결과는 호출자별 복사본"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self._counters["followers"] += 1
+                is_leader = False
+            else:
+                flight = _Flight()
+                self._flights[key] = flight
+                self._counters["leaders"] += 1
+                is_leader = True
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result = fn()
+            return copy.deepcopy(flight.result), False
+        except BaseException as exc:
+            flight.error = exc
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            # 결과를 먼저 기록한 뒤 키를 비우고 대기 중인 follower를 깨운다
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "inflightKeys": len(self._flights),
+                "waitingFollowers": sum(f.followers for f in self._flights.values()),
+                "savedCalls": self._counters["followers"],
+                **self._counters,
+            }
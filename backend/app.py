@@ -6,20 +6,54 @@ os.environ.pop("ALL_PROXY", None)
 logging.getLogger("google").setLevel(logging.WARNING)
 logging.getLogger("grpc").setLevel(logging.ERROR)
 import json
-from typing import Any, Dict, Optional, List
+import queue
+from typing import Any, Dict, Optional, List, Tuple
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import requests
 import pandas as pd
 from dotenv import load_dotenv
 import google.generativeai as genai
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import atexit
 import threading
 import time
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 
+from analysis_cache import AnalysisCache, SingleFlight, make_cache_key
+from circuit_breaker import CallOutcome, CircuitBreaker, CircuitOpenError
+from emotion_classifier import LocalEmotionClassifier
+from gemini_batcher import MicroBatcher
+from gemini_runtime import GeminiBusyError, GeminiHedger, GeminiWorkerPool, fair_share
+from gemini_keepwarm import GeminiKeepWarm
+from gemini_usage import GeminiUsageRecorder
+from json_stream import IncrementalJSONParser, loads_lenient, parse_json_text
+from music_catalog import MusicCatalog
+from music_stage import (
+    MUSIC_REASON_INSTRUCTION,
+    MUSIC_SYSTEM_INSTRUCTION,
+    MusicRecommendationStage,
+    apply_reasons,
+    build_music_prompt,
+    build_reason_prompt,
+    parse_recommendations,
+)
+from rate_limit import TokenBucketLimiter
+from route_geometry import DETAIL_TOLERANCES_M, RouteGeometry, detail_for_zoom
+from response_schema import (
+    MUSIC_SCHEMA,
+    REASON_SCHEMA,
+    ResponseValidator,
+    analysis_schema,
+    batch_analysis_schema,
+)
+from trail_catalog import TrailCatalog
+from trail_geo import TrailSpatialIndex, parse_lat_lng
+from trail_repository import TrailRepository
+from trail_ranking import TrailRanking
+
 # .env 로딩 정책(우선순위: backend/.env > root/.env)
 # 루트를 먼저 로드하고, 백엔드를 override=True로 다시 로드하여 백엔드 값이 최종적으로 우선되게 함
 BACKEND_DIR = os.path.dirname(__file__)
@@ -123,12 +157,93 @@ if GEMINI_API_KEY:
 
 # 타임아웃(초)
 GEMINI_TIMEOUT_SEC = get_env_int("GEMINI_TIMEOUT_SEC", 120)
+# 동시에 진행 중인 Gemini 호출 상한(= 공유 워커 수, 타임아웃으로 버려졌지만 아직 끝나지 않은 호출 포함)
+GEMINI_MAX_INFLIGHT = get_env_int("GEMINI_MAX_INFLIGHT", 8)
+# 워커가 모두 바쁠 때 기다릴 수 있는 호출 수. 초과 시 503 + Retry-After로 즉시 거절
+GEMINI_QUEUE_SIZE = get_env_int("GEMINI_QUEUE_SIZE", 16)
+# 사용자 한 명이 차지할 수 있는 대기 자리. 대기열은 사용자별로 번갈아 꺼내므로 한 사용자가 몰아 보내도 다른 사용자는 밀리지 않음
+GEMINI_QUEUE_PER_USER = get_env_int("GEMINI_QUEUE_PER_USER", 4)
+
+# 앱 전체가 공유하는 Gemini 워커 풀(요청마다 스레드를 만들지 않음)
+GEMINI_POOL = GeminiWorkerPool(
+    workers=GEMINI_MAX_INFLIGHT,
+    queue_size=GEMINI_QUEUE_SIZE,
+    per_key_queue_size=GEMINI_QUEUE_PER_USER,
+)
+
+# 사용자(uid)별 분석 요청 제한(토큰 버킷). 분당 허용 수가 0이면 제한 없음. 초과 시 429 + Retry-After
+ANALYZE_RATE_PER_MIN = get_env_int("ANALYZE_RATE_PER_MIN", 10)
+ANALYZE_RATE_BURST = get_env_int("ANALYZE_RATE_BURST", 5)
+ANALYZE_LIMITER = TokenBucketLimiter(rate_per_min=ANALYZE_RATE_PER_MIN, burst=ANALYZE_RATE_BURST)
+
+# 분석 결과 캐시(정규화된 텍스트 + 음악 취향 기준). 경로를 지정하면 디스크에 저장되어 재시작 후에도 유지
+ANALYSIS_CACHE_SIZE = get_env_int("ANALYSIS_CACHE_SIZE", 512)
+ANALYSIS_CACHE_TTL_SEC = get_env_int("ANALYSIS_CACHE_TTL_SEC", 6 * 3600)
+ANALYSIS_CACHE_PATH = get_env_str("ANALYSIS_CACHE_PATH")
+
+ANALYSIS_CACHE = AnalysisCache(
+    max_entries=ANALYSIS_CACHE_SIZE,
+    ttl_sec=ANALYSIS_CACHE_TTL_SEC,
+    persist_path=ANALYSIS_CACHE_PATH,
+)
+atexit.register(ANALYSIS_CACHE.flush)
+# 같은 키(텍스트 + 음악 취향)로 동시에 들어온 분석 요청은 Gemini 호출 하나를 공유
+ANALYSIS_FLIGHTS = SingleFlight()
+
+# 헤지 호출(선택): 첫 호출이 최근 지연의 백분위(기본 p90)를 넘기면 같은 호출을 하나 더 보냄
+# GEMINI_HEDGE_BUDGET_PERCENT는 전체 호출 대비 추가 호출 비율 상한(%). 0이면 비활성화
+GEMINI_HEDGE_BUDGET_PERCENT = get_env_int("GEMINI_HEDGE_BUDGET_PERCENT", 0)
+GEMINI_HEDGE_PERCENTILE = get_env_int("GEMINI_HEDGE_PERCENTILE", 90)
+
+GEMINI_HEDGER: Optional[GeminiHedger] = None
+if GEMINI_HEDGE_BUDGET_PERCENT > 0:
+    GEMINI_HEDGER = GeminiHedger(
+        GEMINI_POOL,
+        percentile=GEMINI_HEDGE_PERCENTILE / 100.0,
+        budget_ratio=GEMINI_HEDGE_BUDGET_PERCENT / 100.0,
+    )
+
+# 서킷 브레이커: 최근 호출의 실패율(%)이 임계치를 넘으면 GEMINI_BREAKER_OPEN_SEC 동안 호출 없이 즉시 실패
+GEMINI_BREAKER_FAILURE_PERCENT = get_env_int("GEMINI_BREAKER_FAILURE_PERCENT", 50)
+GEMINI_BREAKER_MIN_CALLS = get_env_int("GEMINI_BREAKER_MIN_CALLS", 10)
+GEMINI_BREAKER_OPEN_SEC = get_env_int("GEMINI_BREAKER_OPEN_SEC", 30)
+# 느린 호출: GEMINI_BREAKER_SLOW_CALL_MS 이상 걸린 호출의 비율(%)이 임계치를 넘어도 서킷을 연다
+GEMINI_BREAKER_SLOW_CALL_MS = get_env_int("GEMINI_BREAKER_SLOW_CALL_MS", 8000)
+GEMINI_BREAKER_SLOW_PERCENT = get_env_int("GEMINI_BREAKER_SLOW_PERCENT", 50)
+# 적응형 타임아웃: 최근 성공 호출 p99의 2배를 [GEMINI_TIMEOUT_MIN_SEC, GEMINI_TIMEOUT_SEC] 범위에서 사용
+GEMINI_TIMEOUT_MIN_SEC = get_env_int("GEMINI_TIMEOUT_MIN_SEC", 15)
+GEMINI_ADAPTIVE_TIMEOUT = get_env_int("GEMINI_ADAPTIVE_TIMEOUT", 1)
+
+GEMINI_BREAKER = CircuitBreaker(
+    failure_rate_threshold=GEMINI_BREAKER_FAILURE_PERCENT / 100.0,
+    min_calls=GEMINI_BREAKER_MIN_CALLS,
+    open_sec=GEMINI_BREAKER_OPEN_SEC,
+    slow_call_sec=GEMINI_BREAKER_SLOW_CALL_MS / 1000.0,
+    slow_call_rate_threshold=GEMINI_BREAKER_SLOW_PERCENT / 100.0,
+    max_timeout_sec=GEMINI_TIMEOUT_SEC,
+    min_timeout_sec=GEMINI_TIMEOUT_MIN_SEC,
+    adaptive_timeout=bool(GEMINI_ADAPTIVE_TIMEOUT),
+)
+
+# 마이크로 배칭(선택): 창(ms) 동안 모인 프롬프트를 한 번의 요청으로 전송. 0이면 비활성화
+GEMINI_BATCH_WINDOW_MS = get_env_int("GEMINI_BATCH_WINDOW_MS", 0)
+GEMINI_BATCH_MAX_ITEMS = get_env_int("GEMINI_BATCH_MAX_ITEMS", 8)
 
 
 # 감정 정의
 POSITIVE_EMOTIONS = ["기쁨", "자유로움", "성취감", "편안함", "사랑", "감사", "흥미", "재미", "희망", "자부심"]
 NEGATIVE_EMOTIONS = ["외로움", "우울감", "분노", "불안", "슬픔", "죄책감", "질투", "피로", "혐오", "실망"]
 
+# 로컬 감정 분류기: Gemini를 기다리는 동안 산책로 데이터를 미리 불러오고, 타임아웃/실패 시 대체 결과로 사용
+LOCAL_CLASSIFIER = LocalEmotionClassifier(labels=POSITIVE_EMOTIONS + NEGATIVE_EMOTIONS)
+# 1이면 Gemini 타임아웃/서킷 open/호출 실패 시 로컬 결과로 응답
+LOCAL_EMOTION_FALLBACK = get_env_int("LOCAL_EMOTION_FALLBACK", 1)
+LOCAL_FALLBACK_ERRORS = ("gemini_timeout", "gemini_unavailable", "gemini_call_failed")
+
+# 1이면 생성 설정에 응답 스키마(감정 20개 enum 등)를 지정. 스키마에서 조금 벗어난 응답은 재호출 없이 로컬에서 보정
+GEMINI_RESPONSE_SCHEMA = get_env_int("GEMINI_RESPONSE_SCHEMA", 1)
+RESPONSE_VALIDATOR = ResponseValidator(labels=POSITIVE_EMOTIONS + NEGATIVE_EMOTIONS)
+
 # 부정 → 긍정 감정 매핑
 NEGATIVE_TO_POSITIVE = {
     "외로움": "사랑",
@@ -145,7 +260,7 @@ NEGATIVE_TO_POSITIVE = {
 
 
 SYSTEM_INSTRUCTION = f"""
-너는 공감능력이 매우 뛰어난 심리 분석가이자 상대방 감정을 음악으로 치유해줄 수 있는 큐레이터야. 문장 속 상대방의 현재 감정 상태를 분석하고, 다음의 지침에 따라 사용자의 감정 상태에 맞춰 응답해줘.
+너는 공감능력이 매우 뛰어난 심리 분석가야. 문장 속 상대방의 현재 감정 상태를 분석하고, 다음의 지침에 따라 사용자의 감정 상태에 맞춰 응답해줘.
 
 [지침]
 1. 사용자가 입력한 텍스트를 깊이 있게 읽고, 현재 느끼고 있을 핵심적인 감정을 정확히 1~2개 분석해.
@@ -153,38 +268,38 @@ SYSTEM_INSTRUCTION = f"""
    - 긍정 감정: {', '.join(POSITIVE_EMOTIONS)}
    - 부정 감정: {', '.join(NEGATIVE_EMOTIONS)}
 3. 분석한 감정을 바탕으로, 사용자의 마음을 따뜻하게 위로하고 격려하는 '공감의 한마디'를 작성해.
-4. 분석한 감정과 텍스트의 분위기에 어울리는 음악 3곡을 추천해.
-5. 각 음악에 대해 추천하는 이유를 1~2 문장으로 간결하게 설명해.
-6. 모든 결과는 반드시 아래의 JSON 형식에 맞춰서 출력해줘. 다른 설명은 절대 추가하지 마.
+4. 모든 결과는 반드시 아래의 JSON 형식에 맞춰서 출력해줘. 다른 설명은 절대 추가하지 마.
 
 [JSON 출력 형식]
 {{
   "emotions": ["감정1", "감정2"],
   "keywords": ["텍스트에서 추출한 주요 키워드 1", "키워드 2"],
-  "comfort_message": "사용자를 위로하고 격려하는 공감의 한마디",
-  "recommendations": [
-    {{
-      "artist": "가수명",
-      "title": "노래 제목", 
-      "reason": "이 노래를 추천하는 이유"
-    }},
-    {{
-      "artist": "가수명",
-      "title": "노래 제목",
-      "reason": "이 노래를 추천하는 이유"
-    }},
-    {{
-      "artist": "가수명", 
-      "title": "노래 제목",
-      "reason": "이 노래를 추천하는 이유"
-    }}
-  ]
+  "comfort_message": "사용자를 위로하고 격려하는 공감의 한마디"
 }}
 """.strip()
 
+# 배치 모드: 여러 입력을 한 번에 분석해 같은 순서의 JSON 배열로 돌려받는다
+BATCH_SYSTEM_INSTRUCTION = SYSTEM_INSTRUCTION + """
+
+[여러 입력 처리]
+입력이 [{"id": 번호, "text": "사용자 입력"}, ...] 형태의 JSON 배열로 주어지면,
+각 입력을 서로 독립적으로 위 지침대로 분석하고 결과를 입력과 같은 순서의 JSON 배열로만 출력해.
+배열의 각 원소는 위 JSON 출력 형식에 해당 입력의 "id"를 그대로 추가한 객체여야 해.
+"""
+
+
+def _generation_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    config: Dict[str, Any] = {"response_mime_type": "application/json"}
+    if GEMINI_RESPONSE_SCHEMA:
+        config["response_schema"] = schema
+    return config
+
 
 # ---- 모델 전역 재사용 ----
 GEN_MODEL: Optional[genai.GenerativeModel] = None
+BATCH_MODEL: Optional[genai.GenerativeModel] = None
+MUSIC_MODEL: Optional[genai.GenerativeModel] = None
+MUSIC_REASON_MODEL: Optional[genai.GenerativeModel] = None
 READY: bool = False
 
 
@@ -194,68 +309,178 @@ def get_generative_model() -> genai.GenerativeModel:
         GEN_MODEL = genai.GenerativeModel(
             model_name="gemini-2.5-flash",
             system_instruction=SYSTEM_INSTRUCTION,
-            generation_config={"response_mime_type": "application/json"},
+            generation_config=_generation_config(analysis_schema(POSITIVE_EMOTIONS + NEGATIVE_EMOTIONS)),
         )
     return GEN_MODEL
 
 
-def _warmup_model() -> None:
+def get_batch_model() -> genai.GenerativeModel:
+    global BATCH_MODEL
+    if BATCH_MODEL is None:
+        BATCH_MODEL = genai.GenerativeModel(
+            model_name="gemini-2.5-flash",
+            system_instruction=BATCH_SYSTEM_INSTRUCTION,
+            generation_config=_generation_config(batch_analysis_schema(POSITIVE_EMOTIONS + NEGATIVE_EMOTIONS)),
+        )
+    return BATCH_MODEL
+
+
+def get_music_model() -> genai.GenerativeModel:
+    global MUSIC_MODEL
+    if MUSIC_MODEL is None:
+        MUSIC_MODEL = genai.GenerativeModel(
+            model_name="gemini-2.5-flash",
+            system_instruction=MUSIC_SYSTEM_INSTRUCTION,
+            generation_config=_generation_config(MUSIC_SCHEMA),
+        )
+    return MUSIC_MODEL
+
+
+def get_music_reason_model() -> genai.GenerativeModel:
+    global MUSIC_REASON_MODEL
+    if MUSIC_REASON_MODEL is None:
+        MUSIC_REASON_MODEL = genai.GenerativeModel(
+            model_name="gemini-2.5-flash",
+            system_instruction=MUSIC_REASON_INSTRUCTION,
+            generation_config=_generation_config(REASON_SCHEMA),
+        )
+    return MUSIC_REASON_MODEL
+
+
+def _warmup_model(timeout_sec: float) -> None:
+    # 짧은 웜업 호출(별도 짧은 타임아웃). 사용량 기록/트래픽 판정에는 넣지 않음
+    get_generative_model().generate_content("ping", request_options={"timeout": timeout_sec})
+
+
+def _reset_gemini_client() -> None:
+    """연결이 나빠졌을 때 클라이언트(채널)와 모델 객체를 새로 만든다"""
+    global GEN_MODEL, BATCH_MODEL, MUSIC_MODEL, MUSIC_REASON_MODEL
+    genai.configure(api_key=GEMINI_API_KEY)
+    GEN_MODEL = BATCH_MODEL = MUSIC_MODEL = MUSIC_REASON_MODEL = None
+
+
+def _set_ready(ready: bool) -> None:
     global READY
-    if not GEMINI_API_KEY:
-        READY = False
-        return
-    try:
-        model = get_generative_model()
-        # 짧은 웜업 호출(별도 짧은 타임아웃)
-        with ThreadPoolExecutor(max_workers=1) as ex:
-            fut = ex.submit(lambda: model.generate_content("ping"))
-            _ = fut.result(timeout=min(20, GEMINI_TIMEOUT_SEC))
-        READY = True
-    except Exception:
-        READY = False
+    READY = ready
+
+
+# keep-warm: 트래픽이 적을 때 GEMINI_KEEPWARM_SEC마다 저우선 레인으로 ping(0이면 기동 시 한 번만)
+# GEMINI_KEEPWARM_IDLE_SEC 동안 실제 호출이 없으면 GEMINI_KEEPWARM_MAX_SEC 간격으로 늘림
+GEMINI_KEEPWARM_SEC = get_env_int("GEMINI_KEEPWARM_SEC", 60)
+GEMINI_KEEPWARM_MAX_SEC = get_env_int("GEMINI_KEEPWARM_MAX_SEC", 600)
+GEMINI_KEEPWARM_IDLE_SEC = get_env_int("GEMINI_KEEPWARM_IDLE_SEC", 1800)
+# 연속 ping 실패가 이 횟수가 되면 클라이언트를 다시 만듦
+GEMINI_KEEPWARM_RESET_AFTER = get_env_int("GEMINI_KEEPWARM_RESET_AFTER", 2)
+
+KEEP_WARM = GeminiKeepWarm(
+    GEMINI_POOL,
+    ping=_warmup_model,
+    reset=_reset_gemini_client,
+    on_ready=_set_ready,
+    interval_sec=GEMINI_KEEPWARM_SEC,
+    max_interval_sec=GEMINI_KEEPWARM_MAX_SEC,
+    idle_after_sec=GEMINI_KEEPWARM_IDLE_SEC,
+    timeout_sec=min(20, GEMINI_TIMEOUT_SEC),
+    reset_after_failures=GEMINI_KEEPWARM_RESET_AFTER,
+)
 
 
 def parse_json_response(text: str) -> Dict[str, Any]:
-    if not text:
-        return {}
-    cleaned = text.strip()
-    if cleaned.startswith("```"):
-        cleaned = cleaned.strip("`")
-        if cleaned.lower().startswith("json"):
-            cleaned = cleaned[4:].strip()
-    first = cleaned.find('{')
-    last = cleaned.rfind('}')
-    if first != -1 and last != -1 and last > first:
-        cleaned = cleaned[first : last + 1]
+    # 정상 JSON은 바로 파싱하고, 잘리거나 어긋난 출력은 증분 파서로 쓸 수 있는 필드를 복구
+    return parse_json_text(text)
+
+
+# 호출별 프롬프트 크기/토큰/지연/파싱 성공 기록(GET /api/gemini/usage)
+GEMINI_USAGE = GeminiUsageRecorder(sample_size=get_env_int("GEMINI_USAGE_SAMPLES", 500))
+
+
+def _timed_generate(kind: str, model: Any, prompt: str, timeout_sec: Optional[float], music_taste: bool = False, **kwargs: Any) -> Tuple[Any, float]:
+    """generate_content 호출. (응답, 시작 시각)을 돌려주고 실패한 호출은 여기서 기록"""
+    # gRPC 데드라인을 함께 걸어 버려진 호출도 서버 측에서 끊기도록 함
+    request_options = {"timeout": timeout_sec} if timeout_sec else None
+    started = time.perf_counter()
     try:
-        return json.loads(cleaned)
+        return model.generate_content(prompt, request_options=request_options, **kwargs), started
     except Exception:
-        return {}
+        GEMINI_USAGE.record(kind, len(prompt), time.perf_counter() - started, music_taste=music_taste, error=True)
+        raise
+
+
+def _record_usage(kind: str, prompt: str, started: float, response: Any, parse_ok: bool, music_taste: bool = False) -> None:
+    GEMINI_USAGE.record(kind, len(prompt), time.perf_counter() - started, response, parse_ok, music_taste)
+    KEEP_WARM.note_success()
 
 
-def _gemini_generate_once(prompt: str) -> Dict[str, Any]:
-    model = get_generative_model()
-    response = model.generate_content(prompt)
+def _gemini_generate_once(prompt: str, timeout_sec: Optional[float] = None) -> Dict[str, Any]:
+    response, started = _timed_generate("analysis", get_generative_model(), prompt, timeout_sec)
     parsed = parse_json_response(getattr(response, "text", ""))
-    emotions = parsed.get("emotions")
-    if not emotions:
-        legacy = parsed.get("emotion")
-        if isinstance(legacy, list):
-            emotions = legacy
-        elif isinstance(legacy, str) and legacy.strip():
-            emotions = [e.strip() for e in legacy.split(',') if e.strip()]
-        else:
-            emotions = []
-    if isinstance(emotions, list):
-        emotions = [str(e).strip() for e in emotions if str(e).strip()][:2]
-    emotion_str = ", ".join(emotions) if emotions else None
-    return {
-        "emotion": emotion_str,
-        "emotions": emotions,
-        "keywords": parsed.get("keywords", []),
-        "comfort_message": parsed.get("comfort_message"),
-        "recommendations": parsed.get("recommendations", []),
-    }
+    _record_usage("analysis", prompt, started, response, bool(parsed))
+    return _fill_missing_emotions(_build_analysis_result(parsed, record=True), prompt)
+
+
+def _normalize_emotions(parsed: Dict[str, Any]) -> List[str]:
+    # 옛 'emotion' 키, 쉼표 문자열, 표기가 다른 라벨을 20개 라벨로 맞추고 최대 2개
+    return RESPONSE_VALIDATOR.normalize_emotions(parsed)
+
+
+def _build_analysis_result(parsed: Dict[str, Any], record: bool = False) -> Dict[str, Any]:
+    """스키마에 맞춰 보정한 분석 결과. 모델의 최종 응답일 때만 record=True로 위반을 집계"""
+    return RESPONSE_VALIDATOR.repair_analysis(parsed, record=record)
+
+
+def _fill_missing_emotions(result: Dict[str, Any], text: str) -> Dict[str, Any]:
+    # 감정만 빠진 응답은 다시 호출하지 않고 로컬 분류기로 채움(empty_result → 재시도 방지)
+    if result["emotions"] or not (result.get("comfort_message") or result.get("keywords")):
+        return result
+    labels, _, _ = LOCAL_CLASSIFIER.predict(text)
+    RESPONSE_VALIDATOR.count("emotions_filled_locally")
+    return {**result, "emotions": labels, "emotion": ", ".join(labels)}
+
+
+def _parse_batch_response(text: str, size: int) -> List[Optional[Dict[str, Any]]]:
+    """배치 응답(JSON 배열)을 입력 순서대로 나눈다. 쓸 수 없는 항목은 None"""
+    results: List[Optional[Dict[str, Any]]] = [None] * size
+    cleaned = (text or "").strip()
+    first, last = cleaned.find("["), cleaned.rfind("]")
+    try:
+        items = loads_lenient(cleaned[first:last + 1]) if first != -1 and last > first else []
+    except ValueError:
+        items = []
+    if isinstance(items, dict):
+        items = items.get("results", [])
+    for pos, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        idx = item.get("id", pos)
+        if not isinstance(idx, int) or not 0 <= idx < size:
+            idx = pos
+        if idx >= size or results[idx] is not None:
+            continue
+        result = _build_analysis_result(item, record=True)
+        if result.get("emotions") or result.get("comfort_message"):
+            results[idx] = result
+    return results
+
+
+def _gemini_generate_batch(prompts: List[str], timeout_sec: Optional[float] = None) -> List[Optional[Dict[str, Any]]]:
+    payload = json.dumps([{"id": i, "text": p} for i, p in enumerate(prompts)], ensure_ascii=False)
+    response, started = _timed_generate("analysis_batch", get_batch_model(), payload, timeout_sec)
+    results = _parse_batch_response(getattr(response, "text", ""), len(prompts))
+    _record_usage("analysis_batch", payload, started, response, any(r is not None for r in results))
+    return [_fill_missing_emotions(r, p) if r is not None else None for r, p in zip(results, prompts)]
+
+
+GEMINI_BATCHER: Optional[MicroBatcher] = None
+if GEMINI_BATCH_WINDOW_MS > 0:
+    GEMINI_BATCHER = MicroBatcher(
+        GEMINI_POOL,
+        run_batch=_gemini_generate_batch,
+        run_single=_gemini_generate_once,
+        window_ms=GEMINI_BATCH_WINDOW_MS,
+        max_items=GEMINI_BATCH_MAX_ITEMS,
+        item_timeout_sec=GEMINI_TIMEOUT_SEC,
+        breaker=GEMINI_BREAKER,
+    )
 
 
 def call_gemini_analysis(user_text: str) -> Dict[str, Any]:
@@ -264,22 +489,194 @@ def call_gemini_analysis(user_text: str) -> Dict[str, Any]:
             "error": "GEMINI_API_KEY 미설정",
             "message": "백엔드 .env 또는 루트 .env 파일에 GEMINI_API_KEY를 설정해주세요.",
         }
+    # 서킷이 열려 있으면 워커를 쓰지 않고 즉시 실패.
+    # 배치를 쓰면 서킷 확인/기록은 배처가 실제 모델 호출(배치/단건) 단위로 한다
+    breaker = None if GEMINI_BATCHER is not None else GEMINI_BREAKER
+    try:
+        probe = breaker.before_call() if breaker is not None else False
+    except CircuitOpenError as exc:
+        return {"error": "gemini_unavailable", "message": str(exc), "retry_after": exc.retry_after_sec}
+    timeout_sec = GEMINI_BREAKER.effective_timeout_sec()
+    started = time.perf_counter()
     try:
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(_gemini_generate_once, user_text)
-            result = future.result(timeout=GEMINI_TIMEOUT_SEC)
-            if any(result.values()):
-                return result
-            return {"error": "empty_result", "message": "모델이 빈 결과를 반환했습니다."}
+        # 타임아웃 시 느린 호출의 종료를 기다리지 않고 즉시 반환(결과는 폐기됨)
+        if GEMINI_BATCHER is not None:
+            result = GEMINI_BATCHER.call(user_text, timeout_sec=timeout_sec)
+        elif GEMINI_HEDGER is not None:
+            result = GEMINI_HEDGER.call(_gemini_generate_once, user_text, timeout_sec, timeout_sec=timeout_sec)
+        else:
+            result = GEMINI_POOL.call(_gemini_generate_once, user_text, timeout_sec, timeout_sec=timeout_sec)
+        if breaker is not None:
+            breaker.record_success(time.perf_counter() - started, probe=probe)
+        if any(result.values()):
+            return result
+        return {"error": "empty_result", "message": "모델이 빈 결과를 반환했습니다."}
+    except CircuitOpenError as exc:
+        return {"error": "gemini_unavailable", "message": str(exc), "retry_after": exc.retry_after_sec}
+    except GeminiBusyError as exc:
+        # 로컬 대기열 포화는 Gemini 상태와 무관하므로 실패로 세지 않음
+        if breaker is not None:
+            breaker.record_ignored(probe=probe)
+        return {"error": "gemini_busy", "message": str(exc), "retry_after": exc.retry_after_sec}
     except FuturesTimeoutError:
+        if breaker is not None:
+            breaker.record_failure(timeout=True, probe=probe)
         return {
             "error": "gemini_timeout",
-            "message": f"모델 응답이 {GEMINI_TIMEOUT_SEC}초를 초과했습니다.",
+            "message": f"모델 응답이 {timeout_sec}초를 초과했습니다.",
         }
     except Exception as exc:
+        if breaker is not None:
+            breaker.record_failure(probe=probe)
         return {"error": "gemini_call_failed", "message": str(exc)}
 
 
+# 음악 추천 방식
+# - catalog: 로컬 카탈로그가 곡을 고르고 Gemini는 추천 이유만 작성(기본값)
+# - fast: 카탈로그만 사용(모델 호출 없음, 템플릿 이유)
+# - gemini: Gemini가 곡과 이유를 모두 생성
+MUSIC_MODE = (get_env_str("MUSIC_MODE", "catalog") or "catalog").lower()
+MUSIC_CATALOG_PATH = get_env_str("MUSIC_CATALOG_PATH", os.path.join(ROOT_DIR, "data", "music_catalog.json"))
+# 1이면 시작 시 history 컬렉션의 과거 추천곡으로 카탈로그를 늘림
+MUSIC_CATALOG_FROM_HISTORY = get_env_int("MUSIC_CATALOG_FROM_HISTORY", 1)
+# 시작 시 읽는 최근 history 문서 수(전체 컬렉션을 매번 읽지 않도록)
+MUSIC_CATALOG_HISTORY_LIMIT = get_env_int("MUSIC_CATALOG_HISTORY_LIMIT", 2000)
+
+MUSIC_CATALOG = MusicCatalog(related=NEGATIVE_TO_POSITIVE)
+try:
+    MUSIC_CATALOG.load_file(MUSIC_CATALOG_PATH)
+except Exception as e:
+    print(f"[DEBUG] Failed to load music catalog: {e}")
+
+
+def _gemini_recommend_music(emotions: List[str], music_taste: str, timeout_sec: Optional[float] = None) -> List[Dict[str, Any]]:
+    has_taste = bool(music_taste)
+    picks = MUSIC_CATALOG.recommend(emotions, music_taste) if MUSIC_MODE == "catalog" else []
+    if picks:
+        prompt = build_reason_prompt(emotions, music_taste, picks)
+        try:
+            response, started = _timed_generate("music_reason", get_music_reason_model(), prompt, timeout_sec, has_taste)
+        except Exception as e:
+            # 이유 생성에 실패해도 카탈로그 곡(템플릿 이유)은 그대로 사용
+            print(f"[DEBUG] Music reason call failed: {e}")
+            return picks
+        text = getattr(response, "text", "")
+        _record_usage("music_reason", prompt, started, response, bool(parse_json_text(text).get("reasons")), has_taste)
+        return apply_reasons(text, picks)
+    prompt = build_music_prompt(emotions, music_taste)
+    response, started = _timed_generate("music", get_music_model(), prompt, timeout_sec, has_taste)
+    recommendations = parse_recommendations(getattr(response, "text", ""))
+    _record_usage("music", prompt, started, response, bool(recommendations), has_taste)
+    return recommendations
+
+
+# 음악 추천 단계: (감정 조합, 음악 취향)별로 캐시하고 MUSIC_REFRESH_AFTER_SEC가 지나면 백그라운드로 갱신
+MUSIC_CACHE_SIZE = get_env_int("MUSIC_CACHE_SIZE", 1024)
+MUSIC_CACHE_TTL_SEC = get_env_int("MUSIC_CACHE_TTL_SEC", 7 * 24 * 3600)
+MUSIC_REFRESH_AFTER_SEC = get_env_int("MUSIC_REFRESH_AFTER_SEC", 24 * 3600)
+MUSIC_CACHE_PATH = get_env_str("MUSIC_CACHE_PATH")
+# 추천곡 결과를 기다리는 스레드 수(모델 호출 자체는 GEMINI_POOL에서 실행)
+MUSIC_STAGE_WORKERS = get_env_int("MUSIC_STAGE_WORKERS", 4)
+
+MUSIC_STAGE = MusicRecommendationStage(
+    GEMINI_POOL,
+    _gemini_recommend_music,
+    max_entries=MUSIC_CACHE_SIZE,
+    ttl_sec=MUSIC_CACHE_TTL_SEC,
+    refresh_after_sec=MUSIC_REFRESH_AFTER_SEC,
+    timeout_sec=GEMINI_TIMEOUT_SEC,
+    persist_path=MUSIC_CACHE_PATH,
+    breaker=GEMINI_BREAKER,
+    max_workers=MUSIC_STAGE_WORKERS,
+)
+atexit.register(MUSIC_STAGE.cache.flush)
+
+
+def start_recommendations(result: Dict[str, Any], music_taste: Optional[str]) -> Future:
+    """분석 결과의 감정으로 추천곡 조회를 시작한다(산책로 계산 등과 겹쳐 실행).
+    로컬 대체 결과나 서킷 open 시에는 모델을 호출하지 않고 캐시만 사용"""
+    emotions = result.get("emotions") or []
+    future: Future = Future()
+    if result.get("error") or not emotions:
+        future.set_result([])
+        return future
+    if MUSIC_MODE == "fast":
+        future.set_result(MUSIC_CATALOG.recommend(emotions, music_taste))
+        return future
+    if result.get("source") == "local" or GEMINI_BREAKER.state() == "open":
+        future.set_result(MUSIC_STAGE.peek(emotions, music_taste) or MUSIC_CATALOG.recommend(emotions, music_taste))
+        return future
+    return MUSIC_STAGE.submit(emotions, music_taste, timeout_sec=GEMINI_BREAKER.effective_timeout_sec())
+
+
+def finish_recommendations(music_future: Future, result: Dict[str, Any], music_taste: Optional[str], timeout_sec: float) -> List[Dict[str, Any]]:
+    """start_recommendations 결과를 최대 timeout_sec 기다린다. 늦으면 캐시 또는 카탈로그 추천으로 대체"""
+    try:
+        return music_future.result(timeout=max(0.0, timeout_sec))
+    except FuturesTimeoutError:
+        emotions = result.get("emotions") or []
+        print("[DEBUG] Music stage timed out, using cached or catalog recommendations")
+        return MUSIC_STAGE.peek(emotions, music_taste) or MUSIC_CATALOG.recommend(emotions, music_taste)
+
+
+def _without_recommendations(result: Dict[str, Any]) -> Dict[str, Any]:
+    # 분석 캐시에는 감정/키워드/공감 메시지만 저장(추천곡은 음악 단계 캐시가 담당)
+    return {k: v for k, v in result.items() if k != "recommendations"}
+
+
+def analyze_with_cache(user_text: str) -> Dict[str, Any]:
+    """캐시를 먼저 조회하고, 없으면 Gemini 분석 후 성공한 결과만 캐시에 저장
+
+    분석은 입력 문장에만 의존하므로 음악 취향은 키에 넣지 않는다."""
+    cache_key = make_cache_key(user_text, None)
+    cached = ANALYSIS_CACHE.get(cache_key)
+    if cached is not None:
+        print("[DEBUG] Analysis cache hit")
+        return cached
+
+    def _analyze() -> Dict[str, Any]:
+        result = call_gemini_analysis(user_text)
+        # gemini_timeout, empty_result 등 오류 결과는 put에서 걸러져 저장되지 않음
+        ANALYSIS_CACHE.put(cache_key, _without_recommendations(result))
+        return result
+
+    # 이미 같은 키로 진행 중인 호출이 있으면 새로 호출하지 않고 결과를 공유
+    result, shared = ANALYSIS_FLIGHTS.do(cache_key, _analyze)
+    if shared:
+        print("[DEBUG] Analysis joined an in-flight Gemini call")
+    return result
+
+
+# ---- 스트리밍 분석 ----
+STREAM_FIELDS = ["emotions", "keywords", "comfort_message", "recommendations"]
+
+
+def _gemini_stream_into(prompt: str, sink: "queue.Queue", timeout_sec: Optional[float] = None) -> None:
+    """스트리밍 생성 결과를 조각 단위로 sink에 넣는다. (워커 풀에서 실행)"""
+    started: Optional[float] = None
+    try:
+        response, started = _timed_generate("analysis_stream", get_generative_model(), prompt, timeout_sec, stream=True)
+        chunks: List[str] = []
+        for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                chunks.append(text)
+                sink.put(("chunk", text))
+        sink.put(("end", None))
+        # 스트림을 다 읽은 뒤에야 사용량(usage_metadata)이 채워짐
+        _record_usage("analysis_stream", prompt, started, response, bool(parse_json_text("".join(chunks))))
+    except Exception as exc:
+        if started is not None:  # 스트림 도중 실패(시작 실패는 _timed_generate에서 기록)
+            GEMINI_USAGE.record("analysis_stream", len(prompt), time.perf_counter() - started, error=True)
+        sink.put(("error", str(exc)))
+        # 작업 Future에도 실패를 남겨 서킷 기록 콜백이 알 수 있게 함
+        raise
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False  # 한글이 유니코드로 변환되지 않도록 설정
 CORS(app)
@@ -368,155 +765,125 @@ def _load_score_df(path: str) -> Optional[pd.DataFrame]:
 # 데이터 로딩
 score_df: Optional[pd.DataFrame] = _load_score_df(SCORE_CSV_PATH)
 
-def get_emotion_based_trails(emotion: str) -> Dict[str, Any]:
-    """감정 기반 산책로 추천 (장이소공원까지만)
+# 점수 DB를 float32 행렬(구별 구간)로 바꾸고 단일/두 감정 조합별 상위 13개 순위를 미리 계산(요청 시에는 사전 조회)
+TRAIL_RANKING: Optional[TrailRanking] = None
+if score_df is not None and not score_df.empty:
+    try:
+        TRAIL_RANKING = TrailRanking(score_df, POSITIVE_EMOTIONS, top_k=13)
+    except Exception as e:
+        print(f"[DEBUG] Failed to build trail ranking: {e}")
+
+# 위치 기반 순위: 사용자 위치에서 반경(m) 안의 산책로만 후보로 삼고, 감정 점수와 가까운 정도를 섞는 비율(%)
+TRAIL_MAX_RADIUS_M = get_env_int("TRAIL_MAX_RADIUS_M", 3000)
+TRAIL_DISTANCE_WEIGHT_PERCENT = min(100, max(0, get_env_int("TRAIL_DISTANCE_WEIGHT_PERCENT", 30)))
+# /api/trails/nearby 용 색인: 마커 + 경로 점(경계 상자 기준 격자). 산책로 문서가 바뀌면 그 산책로만 다시 넣음
+TRAIL_NEARBY_MAX_RADIUS_M = get_env_int("TRAIL_NEARBY_MAX_RADIUS_M", 20000)
+TRAIL_INDEX = TrailSpatialIndex(cell_m=get_env_int("TRAIL_INDEX_CELL_M", 500))
+# 응답/기록의 산책로 루트 형식: polyline(압축, 기본) 또는 geojson([lng, lat] 배열)
+ROUTE_RESPONSE_FORMAT = (get_env_str("ROUTE_RESPONSE_FORMAT", "polyline") or "polyline").lower()
+# 추천 응답에 넣는 루트 상세도(low / medium / full). 확대해서 더 자세한 루트가 필요하면 /api/trails/<이름>/route
+ROUTE_DEFAULT_DETAIL = (get_env_str("ROUTE_DEFAULT_DETAIL", "medium") or "medium").lower()
+if ROUTE_DEFAULT_DETAIL not in DETAIL_TOLERANCES_M:
+    ROUTE_DEFAULT_DETAIL = "medium"
+
+
+def _map_target_emotions(emotion: str) -> List[str]:
+    """입력 감정(쉼표 구분)을 산책로 점수용 긍정 감정으로 매핑"""
+    target_emotions = []
+    for emo in (e.strip() for e in emotion.split(',')):
+        if emo in POSITIVE_EMOTIONS:
+            target_emotions.append(emo)
+        elif emo in NEGATIVE_TO_POSITIVE:
+            target_emotions.append(NEGATIVE_TO_POSITIVE[emo])
+        else:
+            print(f"[DEBUG] Unknown emotion: '{emo}'")
+    return target_emotions
+
+
+def get_emotion_based_trails(
+    emotion: str,
+    district: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+) -> Dict[str, Any]:
+    """감정 기반 산책로 추천 (장이소공원까지만). district(예: '동대문구')를 주면 그 구 안에서만 순위.
+    latitude/longitude를 주면 TRAIL_MAX_RADIUS_M 안의 산책로를 감정 점수와 거리를 섞어 순위를 매기고
+    (반경 안에 좌표가 있는 산책로가 없으면 감정만으로 순위), 산책로마다 distance_m을 붙인다.
 
     Returns a dict containing:
     - positive_emotions_used: List[str]
     - top: List[Dict[str, Any]] (top 3 trails)
     - more: List[Dict[str, Any]] (next top 10 trails)
+    - location_used: bool (위치 기반 순위를 썼는지)
     """
-    if score_df is None or score_df.empty:
+    if TRAIL_RANKING is None:
         print(f"[DEBUG] score_df is None or empty")
         return {"positive_emotions_used": [], "top": [], "more": []}
-    
-    print(f"[DEBUG] Input emotion: '{emotion}'")
-    print(f"[DEBUG] Available columns: {list(score_df.columns)}")
-    
-    # 감정을 긍정 감정으로 매핑
-    target_emotions = []
-    
-    # 입력된 감정이 쉼표로 구분된 경우 처리
-    emotions = [e.strip() for e in emotion.split(',')]
-    print(f"[DEBUG] Parsed emotions: {emotions}")
-    
-    for emo in emotions:
-        if emo in POSITIVE_EMOTIONS:
-            target_emotions.append(emo)
-            print(f"[DEBUG] Added positive emotion: {emo}")
-        elif emo in NEGATIVE_TO_POSITIVE:
-            mapped_emotion = NEGATIVE_TO_POSITIVE[emo]
-            target_emotions.append(mapped_emotion)
-            print(f"[DEBUG] Mapped negative emotion '{emo}' -> '{mapped_emotion}'")
-        else:
-            print(f"[DEBUG] Unknown emotion: '{emo}'")
-    
-    print(f"[DEBUG] Final target emotions: {target_emotions}")
-    
+
+    target_emotions = _map_target_emotions(emotion)
+    print(f"[DEBUG] Trail emotions: '{emotion}' -> {target_emotions}")
     if not target_emotions:
-        print(f"[DEBUG] No target emotions found")
         return {"positive_emotions_used": [], "top": [], "more": []}
-    
-    # score_df에서 해당 감정 컬럼들의 평균 계산
+
     try:
-        # 필요한 컬럼이 존재하는지 확인
-        available_emotions = [emo for emo in target_emotions if emo in score_df.columns]
-        print(f"[DEBUG] Available emotions in CSV: {available_emotions}")
-        
+        near = None
+        if latitude is not None and longitude is not None:
+            near = TRAIL_RANKING.rank_near(
+                target_emotions,
+                latitude,
+                longitude,
+                TRAIL_MAX_RADIUS_M,
+                TRAIL_DISTANCE_WEIGHT_PERCENT / 100,
+                district,
+            )
+            if near is None:
+                print(f"[DEBUG] No trails within {TRAIL_MAX_RADIUS_M}m of ({latitude}, {longitude}); ranking by emotion only")
+        if near is not None:
+            available_emotions, ranked, scores, distances = near
+        else:
+            available_emotions, ranked, scores = TRAIL_RANKING.rank(target_emotions, district)
+            distances = [None] * len(ranked)
         if not available_emotions:
             print(f"[DEBUG] No available emotions found in CSV columns")
             return {"positive_emotions_used": target_emotions, "top": [], "more": []}
-        
-        # 각 행에 대해 해당 감정들의 평균 점수 계산
-        score_df_copy = score_df.copy()
-        
-        # 장이소공원까지만 필터링 (ㄱㄴㄷ순으로 장이소공원까지)
-        print(f"[DEBUG] 필터링 전 총 산책로 수: {len(score_df_copy)}")
-        
-        # 산책로 이름이 '장이소공원'보다 사전순으로 앞서거나 같은 것들만 선택
-        filtered_df = score_df_copy[
-            score_df_copy['INTEGRATED_NAME'].str.strip() <= '장이소공원'
-        ].copy()
-        
-        print(f"[DEBUG] 장이소공원까지 필터링 후 산책로 수: {len(filtered_df)}")
-        print(f"[DEBUG] 필터링된 산책로 목록: {sorted(filtered_df['INTEGRATED_NAME'].tolist())}")
-        
-        if filtered_df.empty:
-            print(f"[DEBUG] 필터링 후 산책로가 없습니다.")
-            return {"positive_emotions_used": target_emotions, "top": [], "more": []}
-        
-        emotion_scores = filtered_df[available_emotions]
-        print(f"[DEBUG] Emotion scores shape: {emotion_scores.shape}")
-        print(f"[DEBUG] Sample emotion scores:\n{emotion_scores.head()}")
-        
-        filtered_df['avg_score'] = emotion_scores.mean(axis=1)
-        print(f"[DEBUG] Average scores:\n{filtered_df[['INTEGRATED_NAME', 'avg_score']].head()}")
-        
-        # 점수가 높은 순으로 정렬
-        ranked = filtered_df.sort_values('avg_score', ascending=False)
-        # 상위 3개
-        top_trails_df = ranked.head(3)
-        print(f"[DEBUG] Top 3 trails:\n{top_trails_df[['INTEGRATED_NAME', 'avg_score']]}")
-        # 그 다음 10개
-        more_trails_df = ranked.iloc[3:13]
-        
-        def _row_to_trail(row: pd.Series) -> Dict[str, Any]:
+
+        # 상위 3개와 더보기 10개의 산책로 문서를 한 번에 조회(대부분 메모리 카탈로그, 없는 것만 Firestore)
+        entries = TRAIL_REPOSITORY.get_many([TRAIL_RANKING.names[idx] for idx in ranked])
+
+        def _row_to_trail(idx: int, score: float, distance: Optional[float]) -> Dict[str, Any]:
+            trail_name = TRAIL_RANKING.names[idx]
             trail_data = {
-                "name": str(row.get('INTEGRATED_NAME', '알 수 없음')),
-                "address": str(row.get('ADDRESS', '주소 정보 없음')),
-                "score": round(float(row['avg_score']), 2)
+                "name": trail_name,
+                "address": TRAIL_RANKING.addresses[idx],
+                "score": round(float(score), 2)
             }
+            if distance is not None:
+                trail_data["distance_m"] = int(round(distance))
             
-            # 좌표 정보가 있다면 추가 (Firebase에서 가져오기)
-            try:
-                trail_name = str(row.get('INTEGRATED_NAME', ''))
-                if trail_name:
-                    trail_doc = db.collection('trails').document(trail_name).get()
-                    if trail_doc.exists:
-                        trail_firebase_data = trail_doc.to_dict()
-                        
-                        # 기본 마커 좌표
-                        if 'coordinates' in trail_firebase_data:
-                            trail_data['coordinates'] = trail_firebase_data['coordinates']
-                            print(f"[DEBUG] Added coordinates for {trail_name}: {trail_firebase_data['coordinates']}")
-                        
-                        # 루트 경로 좌표 (객체 배열을 다시 배열로 변환)
-                        if 'route_coordinates' in trail_firebase_data:
-                            route_coords = trail_firebase_data['route_coordinates']
-                            
-                            # 객체 배열을 [lng, lat] 배열로 변환
-                            if isinstance(route_coords, list) and len(route_coords) > 0:
-                                if isinstance(route_coords[0], dict):
-                                    # 객체 형태: [{lng: x, lat: y}, ...] → [[x, y], ...]
-                                    converted_coords = []
-                                    # order 필드로 정렬
-                                    sorted_coords = sorted(route_coords, key=lambda x: x.get('order', 0))
-                                    for coord_obj in sorted_coords:
-                                        converted_coords.append([coord_obj['lng'], coord_obj['lat']])
-                                    
-                                    trail_data['route'] = {
-                                        'type': trail_firebase_data.get('route_type', 'LineString'),
-                                        'coordinates': converted_coords
-                                    }
-                                    print(f"[DEBUG] Added route for {trail_name}: {len(converted_coords)} points")
-                                else:
-                                    # 이미 배열 형태인 경우 (이전 버전)
-                                    trail_data['route'] = {
-                                        'type': trail_firebase_data.get('route_type', 'LineString'),
-                                        'coordinates': route_coords
-                                    }
-                                    print(f"[DEBUG] Added route for {trail_name}: {len(route_coords)} points")
-                            
-            except Exception as e:
-                print(f"[DEBUG] Failed to fetch trail data for {trail_name}: {e}")
+            # 좌표 정보가 있다면 추가 (기한 안에 읽지 못한 산책로는 좌표 없이)
+            entry = entries.get(trail_name)
+            if entry is not None:
+                # 기본 마커 좌표
+                if entry.get('coordinates') is not None:
+                    trail_data['coordinates'] = entry['coordinates']
+
+                # 루트 경로 (카탈로그 적재 때 상세도별로 만든 polyline 또는 GeoJSON을 그대로 사용)
+                if entry.get('geometry') is not None:
+                    trail_data['route'] = entry['geometry'].route(ROUTE_DEFAULT_DETAIL, ROUTE_RESPONSE_FORMAT)
             
             return trail_data
 
-        top_results: List[Dict[str, Any]] = [
-            _row_to_trail(row)
-            for _, row in top_trails_df.iterrows()
-        ]
-        more_results: List[Dict[str, Any]] = [
-            _row_to_trail(row)
-            for _, row in more_trails_df.iterrows()
-        ]
-
-        print(f"[DEBUG] Final top results: {top_results}")
-        print(f"[DEBUG] Final more results count: {len(more_results)}")
+        ranked_trails = [_row_to_trail(idx, score, dist) for idx, score, dist in zip(ranked, scores, distances)]
+        # 상위 3개, 그 다음 10개
+        top_results: List[Dict[str, Any]] = ranked_trails[:3]
+        more_results: List[Dict[str, Any]] = ranked_trails[3:13]
+
+        print(f"[DEBUG] Top trails: {[t['name'] for t in top_results]}, more: {len(more_results)}")
         return {
             "positive_emotions_used": target_emotions,
             "top": top_results,
             "more": more_results,
+            "location_used": near is not None,
         }
     
     except Exception as e:
@@ -532,6 +899,88 @@ firebase_admin.initialize_app(cred)
 # Firestore 클라이언트 초기화
 db = firestore.client()
 
+
+def _grow_catalog_from_history() -> None:
+    # 최근 추천곡으로 음악 카탈로그 확장(백그라운드, 실패해도 서비스에는 영향 없음)
+    try:
+        docs = (
+            db.collection('history')
+            .select(['emotions', 'recommendations', 'source'])
+            .order_by('timestamp', direction=firestore.Query.DESCENDING)
+            .limit(MUSIC_CATALOG_HISTORY_LIMIT)
+            .stream()
+        )
+        added = MUSIC_CATALOG.add_from_history(doc.to_dict() for doc in docs)
+        print(f"[DEBUG] Music catalog grew by {added} songs from the latest {MUSIC_CATALOG_HISTORY_LIMIT} history docs")
+    except Exception as e:
+        print(f"[DEBUG] Failed to grow music catalog from history: {e}")
+
+
+if MUSIC_CATALOG_FROM_HISTORY:
+    threading.Thread(target=_grow_catalog_from_history, name="catalog-history", daemon=True).start()
+
+
+def _convert_trail_doc(data: Dict[str, Any]) -> Dict[str, Any]:
+    """trails 문서 → 카탈로그 항목(마커 좌표 원본, 파싱한 (위도, 경도), 경로 형상, 주소)"""
+    return {
+        "coordinates": data.get('coordinates'),
+        "point": parse_lat_lng(data.get('coordinates')),
+        "geometry": RouteGeometry.from_doc(data),
+        "address": data.get('ADDRESS'),
+    }
+
+
+def _sync_trail_geometry(changed: List[str]) -> None:
+    # 카탈로그에서 바뀐 산책로만 근처 산책로 색인에 반영하고, 순위용 좌표 색인은 다시 만듦(수십 µs)
+    entries = dict(TRAIL_CATALOG.items())
+    for name in changed:
+        entry = entries.get(name)
+        if entry is None:
+            TRAIL_INDEX.remove(name)
+            continue
+        info = {"address": entry["address"]} if entry.get("address") else {}
+        route = entry["geometry"].coords if entry.get("geometry") is not None else None
+        TRAIL_INDEX.upsert(name, entry["point"], route, info)
+    if TRAIL_RANKING is not None:
+        coordinates = {name: e["point"] for name, e in entries.items() if e.get("point") is not None}
+        TRAIL_RANKING.set_coordinates(coordinates, cell_m=max(100, TRAIL_MAX_RADIUS_M))
+
+
+def _fetch_all_trails() -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    fields = ['coordinates', 'route_polyline', 'route_precision', 'route_coordinates', 'route_type', 'ADDRESS']
+    return [(doc.id, doc.to_dict() or {}) for doc in db.collection('trails').select(fields).stream()]
+
+
+# trails 컬렉션 전체를 메모리에 두고 스냅샷 리스너로 갱신(리스너가 없거나 끊겨도 주기적으로 전체 다시 읽기)
+TRAIL_CATALOG_REFRESH_SEC = get_env_int("TRAIL_CATALOG_REFRESH_SEC", 3600)
+TRAIL_CATALOG = TrailCatalog(_convert_trail_doc, on_change=_sync_trail_geometry, refresh_sec=TRAIL_CATALOG_REFRESH_SEC)
+TRAIL_CATALOG.start(_fetch_all_trails, db.collection('trails'))
+atexit.register(TRAIL_CATALOG.stop)
+
+
+def _get_trail_docs(trail_names: List[str], timeout_sec: Optional[float] = None) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+    # 다중 문서 읽기 한 번(없는 문서는 None)
+    refs = [db.collection('trails').document(name) for name in trail_names]
+    return [(snap.id, snap.to_dict() if snap.exists else None) for snap in db.get_all(refs, timeout=timeout_sec)]
+
+
+def _get_trail_doc(trail_name: str, timeout_sec: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    trail_doc = db.collection('trails').document(trail_name).get(timeout=timeout_sec)
+    return trail_doc.to_dict() if trail_doc.exists else None
+
+
+# 카탈로그에 없는 산책로(기동 직후 등)는 한 요청분을 모아 한 번에 읽고, 요청마다 기한을 둠
+TRAIL_REPOSITORY = TrailRepository(
+    TRAIL_CATALOG,
+    get_all=_get_trail_docs,
+    get_one=_get_trail_doc,
+    max_concurrency=get_env_int("TRAIL_FETCH_CONCURRENCY", 4),
+    deadline_sec=get_env_int("TRAIL_FETCH_DEADLINE_MS", 1500) / 1000,
+    missing_ttl_sec=get_env_int("TRAIL_DOC_CACHE_TTL_SEC", 300),
+    # Firestore 읽기 하나의 타임아웃(요청 기한을 넘겨도 백그라운드에서 이 시간까지는 마저 읽음)
+    read_timeout_sec=get_env_int("TRAIL_FETCH_TIMEOUT_MS", 5000) / 1000,
+)
+
 # Firebase 인증 미들웨어
 from functools import wraps
 
@@ -557,6 +1006,25 @@ def check_token(f):
     
     return decorated_function
 
+
+def rate_limited(f):
+    """check_token 아래에 두어 uid별 토큰 버킷을 적용하고, 핸들러의 Gemini 호출을 그 uid의 대기열로 보내는 데코레이터"""
+    @wraps(f)
+    def decorated_function(uid, *args, **kwargs):
+        if request.method == "POST":
+            allowed, retry_after = ANALYZE_LIMITER.acquire(uid)
+            if not allowed:
+                print(f"[DEBUG] Rate limited uid={uid} retry_after={retry_after}")
+                return jsonify({
+                    "error": "rate_limited",
+                    "message": f"요청이 너무 많습니다. {retry_after}초 후 다시 시도해주세요.",
+                    "retry_after": retry_after,
+                }), 429, {"Retry-After": str(retry_after)}
+        with fair_share(uid):
+            return f(uid, *args, **kwargs)
+
+    return decorated_function
+
 @app.route('/')
 def home():
     return "Flask와 Firebase가 성공적으로 연결되었습니다!"
@@ -573,6 +1041,7 @@ def health() -> Any:
     return jsonify({
         "status": "ok",
         "ready": READY,
+        "keepWarm": KEEP_WARM.stats(),
         "geminiConfigured": bool(GEMINI_API_KEY),
         "geminiDiag": {
             "rawPresent": bool(RAW_GEMINI_API_KEY),
@@ -598,10 +1067,33 @@ def health() -> Any:
             "csvPath": SCORE_CSV_PATH,
             "csvExists": os.path.exists(SCORE_CSV_PATH),
         },
+        "trailRanking": TRAIL_RANKING.stats() if TRAIL_RANKING is not None else None,
+        "trailIndex": TRAIL_INDEX.stats(),
+        "trailCatalog": TRAIL_CATALOG.stats(),
+        "routeDetail": _route_detail_stats(),
+        "trailRepository": TRAIL_REPOSITORY.stats(),
         "timeoutSec": GEMINI_TIMEOUT_SEC,
+        "geminiPool": GEMINI_POOL.stats(),
+        "analysisCache": ANALYSIS_CACHE.stats(),
+        "analysisSingleFlight": ANALYSIS_FLIGHTS.stats(),
+        "geminiBatch": GEMINI_BATCHER.stats() if GEMINI_BATCHER is not None else {"enabled": False},
+        "geminiHedge": GEMINI_HEDGER.stats() if GEMINI_HEDGER is not None else {"enabled": False},
+        "geminiBreaker": GEMINI_BREAKER.stats(),
+        "rateLimit": ANALYZE_LIMITER.stats(),
+        "responseSchema": {"enabled": bool(GEMINI_RESPONSE_SCHEMA), **RESPONSE_VALIDATOR.stats()},
+        "localClassifier": LOCAL_CLASSIFIER.stats(),
+        "musicStage": MUSIC_STAGE.stats(),
+        "musicCatalog": {"mode": MUSIC_MODE, **MUSIC_CATALOG.stats()},
     })
 
 
+@app.route("/api/gemini/usage", methods=["GET"])
+def gemini_usage() -> Any:
+    """호출 형태(analysis, analysis_stream, analysis_batch, music, music_reason / +taste)별 최근 호출의
+    프롬프트 글자 수, 입력/출력 토큰, 지연 히스토그램과 JSON 파싱 성공률"""
+    return jsonify(GEMINI_USAGE.stats())
+
+
 @app.route("/api/diag", methods=["GET"])
 def diag() -> Any:
     if not GEMINI_API_KEY:
@@ -610,9 +1102,7 @@ def diag() -> Any:
     try:
         model = get_generative_model()
         t1 = time.perf_counter()
-        with ThreadPoolExecutor(max_workers=1) as ex:
-            fut = ex.submit(lambda: model.generate_content("ping"))
-            resp = fut.result(timeout=min(30, GEMINI_TIMEOUT_SEC))
+        resp = GEMINI_POOL.call(model.generate_content, "ping", timeout_sec=min(30, GEMINI_TIMEOUT_SEC))
         t2 = time.perf_counter()
         return jsonify({
             "ok": True,
@@ -620,14 +1110,115 @@ def diag() -> Any:
             "call_ms": int((t2 - t1) * 1000),
             "text": getattr(resp, "text", "")[:120]
         })
+    except GeminiBusyError as e:
+        return jsonify({"ok": False, "error": "busy", "message": str(e)}), 503, {"Retry-After": str(e.retry_after_sec)}
     except FuturesTimeoutError:
         return jsonify({"ok": False, "error": "timeout"}), 504
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+def _fetch_music_taste(uid: str) -> str:
+    try:
+        user_doc = db.collection('users').document(uid).get()
+        if user_doc.exists:
+            user_data = user_doc.to_dict()
+            return user_data.get('music_taste', '')
+    except Exception as e:
+        print(f"[DEBUG] Failed to fetch user music taste: {e}")
+    return ""
+
+
+# 미리 불러오기 전용 스레드(Gemini 워커 풀과 분리)
+TRAIL_PREFETCH = ThreadPoolExecutor(max_workers=2, thread_name_prefix="trail-prefetch")
+
+
+def _request_location(data: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """요청의 location({latitude, longitude})을 (위도, 경도)로. 없거나 잘못된 값이면 None"""
+    location = data.get("location")
+    if not location:
+        return None
+    point = parse_lat_lng(location)
+    if point is None:
+        print(f"[DEBUG] Ignoring invalid location: {location!r}")
+    return point
+
+
+def _build_trail_payload(emotion: str, location: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+    latitude, longitude = location if location is not None else (None, None)
+    emotion_trails = get_emotion_based_trails(emotion, latitude=latitude, longitude=longitude)
+    # 백엔드는 상위 3개를 기존 "trails"에, 나머지 10개는 "more"로 제공
+    return {
+        "trails": emotion_trails.get("top", []),
+        "more": emotion_trails.get("more", []),
+        "positive_emotions_used": emotion_trails.get("positive_emotions_used", []),
+        "location_used": emotion_trails.get("location_used", False),
+    }
+
+
+def _prefetch_trail_payload(local_result: Dict[str, Any], location: Optional[Tuple[float, float]] = None) -> Optional[Any]:
+    """로컬 감정으로 산책로 순위 계산 + Firestore 문서 로딩을 Gemini 호출과 동시에 시작"""
+    if not local_result.get("emotion"):
+        return None
+    try:
+        return TRAIL_PREFETCH.submit(_build_trail_payload, local_result["emotion"], location)
+    except RuntimeError:
+        return None
+
+
+def _resolve_trail_payload(
+    emotion: str,
+    local_result: Dict[str, Any],
+    prefetched: Optional[Any],
+    location: Optional[Tuple[float, float]] = None,
+) -> Dict[str, Any]:
+    # Gemini 감정이 로컬 감정과 같으면 미리 계산한 결과를 그대로 사용(다르면 캐시된 문서만 재사용)
+    if prefetched is not None and emotion == local_result.get("emotion"):
+        try:
+            return prefetched.result(timeout=GEMINI_TIMEOUT_SEC)
+        except Exception as e:
+            print(f"[DEBUG] Trail prefetch failed: {e}")
+    return _build_trail_payload(emotion, location)
+
+
+def _local_fallback(local_result: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    LOCAL_CLASSIFIER.record_fallback()
+    print(f"[DEBUG] Using local emotion fallback ({reason}): {local_result.get('emotion')}")
+    return {**local_result, "fallback_reason": reason}
+
+
+def _save_history(uid: str, user_text: str, gemini_result: Dict[str, Any], trail_payload: Dict[str, Any]) -> None:
+    """분석 결과를 history 컬렉션에 저장 (실패해도 응답에는 영향 없음)"""
+    try:
+        history_data = {
+            'user_id': uid,
+            'prompt': user_text,
+            'emotion': gemini_result.get('emotion', ''),
+            'emotions': gemini_result.get('emotions', []),
+            'keywords': gemini_result.get('keywords', []),
+            'comfort_message': gemini_result.get('comfort_message', ''),
+            'recommendations': gemini_result.get('recommendations', []),
+            'trails': trail_payload.get('trails', []),
+            'more_trails': trail_payload.get('more', []),
+            'positive_emotions_used': trail_payload.get('positive_emotions_used', []),
+            'source': gemini_result.get('source', 'gemini'),
+            'timestamp': firestore.SERVER_TIMESTAMP
+        }
+        
+        db.collection('history').add(history_data)
+        print("[DEBUG] Analysis result saved to history")
+        # Gemini가 직접 고른 추천곡은 카탈로그에도 반영(카탈로그가 고른 곡은 source로 걸러짐)
+        if MUSIC_MODE == "gemini":
+            MUSIC_CATALOG.add_from_history([history_data])
+        
+    except Exception as e:
+        print(f"[DEBUG] Failed to save history: {e}")
+        # 히스토리 저장 실패해도 응답은 정상적으로 반환
+
+
 @app.route("/api/analyze", methods=["GET", "POST", "OPTIONS"])
 @check_token
+@rate_limited
 def analyze(uid) -> Any:
     if request.method == "OPTIONS":
         return ("", 204, {
@@ -643,46 +1234,52 @@ def analyze(uid) -> Any:
 
     data = request.get_json(silent=True) or {}
     user_text = (data.get("text") or "").strip()
-    user_location = data.get("location")  # GPS 위치 정보 (latitude, longitude)
+    user_location = _request_location(data)  # GPS 위치 정보 (latitude, longitude)
     
     if not user_text:
         return jsonify({"error": "invalid_input", "message": "text 필드가 필요합니다."}), 400
     
     print(f"[DEBUG] 분석 요청 - 텍스트: {user_text[:50]}...")
     if user_location:
-        print(f"[DEBUG] 사용자 위치: {user_location['latitude']}, {user_location['longitude']}")
+        print(f"[DEBUG] 사용자 위치: {user_location[0]}, {user_location[1]}")
 
     # 사용자의 음악 취향 조회
-    user_music_taste = ""
-    try:
-        user_doc = db.collection('users').document(uid).get()
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            user_music_taste = user_data.get('music_taste', '')
-    except Exception as e:
-        print(f"[DEBUG] Failed to fetch user music taste: {e}")
+    user_music_taste = _fetch_music_taste(uid)
+
+    # 로컬 분류(수십 µs)로 산책로 데이터를 먼저 불러오기 시작
+    local_result = LOCAL_CLASSIFIER.analyze(user_text)
+    prefetched = _prefetch_trail_payload(local_result, user_location)
 
     t = time.perf_counter()
     
-    # 음악 취향을 반영한 분석 호출
-    if user_music_taste:
-        # 시스템 프롬프트에 음악 취향 추가
-        enhanced_prompt = f"사용자의 음악 취향: {user_music_taste}\n\n{user_text}"
-        gemini_result = call_gemini_analysis(enhanced_prompt)
-    else:
-        gemini_result = call_gemini_analysis(user_text)
+    gemini_result = analyze_with_cache(user_text)
     
     print("gemini_sec=", round(time.perf_counter()-t, 2))
 
+    if gemini_result.get("error") in LOCAL_FALLBACK_ERRORS and LOCAL_EMOTION_FALLBACK:
+        gemini_result = _local_fallback(local_result, gemini_result["error"])
+    elif not gemini_result.get("error"):
+        LOCAL_CLASSIFIER.record_agreement(local_result["emotions"], gemini_result.get("emotions") or [])
+
+    # 워커 풀 대기열이 가득 찼거나 서킷이 열린 경우 빠르게 503으로 거절
+    if gemini_result.get("error") in ("gemini_busy", "gemini_unavailable"):
+        retry_after = gemini_result.get("retry_after", 1)
+        busy_payload = {
+            "analysis": gemini_result,
+            "trail": {"trails": [], "more": [], "positive_emotions_used": []},
+        }
+        return jsonify(busy_payload), 503, {"Retry-After": str(retry_after)}
+
     # 감정 기반 산책로 추천
     trail_payload: Dict[str, Any] = {"trails": [], "more": [], "positive_emotions_used": []}
     
+    # 추천곡(음악 단계)은 산책로 계산과 동시에 진행
+    music_future = start_recommendations(gemini_result, user_music_taste)
     if not gemini_result.get("error") and gemini_result.get("emotion"):
-        emotion_trails = get_emotion_based_trails(gemini_result["emotion"])
-        # 백엔드는 상위 3개를 기존 "trails"에, 나머지 10개는 "more"로 제공
-        trail_payload["trails"] = emotion_trails.get("top", [])
-        trail_payload["more"] = emotion_trails.get("more", [])
-        trail_payload["positive_emotions_used"] = emotion_trails.get("positive_emotions_used", [])
+        trail_payload = _resolve_trail_payload(gemini_result["emotion"], local_result, prefetched, user_location)
+    if not gemini_result.get("error"):
+        gemini_result["recommendations"] = finish_recommendations(
+            music_future, gemini_result, user_music_taste, GEMINI_BREAKER.effective_timeout_sec())
 
     response_payload = {
         "analysis": gemini_result,
@@ -691,31 +1288,227 @@ def analyze(uid) -> Any:
     
     # 분석 결과를 history 컬렉션에 저장
     if not gemini_result.get("error"):
-        try:
-            history_data = {
-                'user_id': uid,
-                'prompt': user_text,
-                'emotion': gemini_result.get('emotion', ''),
-                'emotions': gemini_result.get('emotions', []),
-                'keywords': gemini_result.get('keywords', []),
-                'comfort_message': gemini_result.get('comfort_message', ''),
-                'recommendations': gemini_result.get('recommendations', []),
-                'trails': trail_payload.get('trails', []),
-                'more_trails': trail_payload.get('more', []),
-                'positive_emotions_used': trail_payload.get('positive_emotions_used', []),
-                'timestamp': firestore.SERVER_TIMESTAMP
-            }
-            
-            db.collection('history').add(history_data)
-            print("[DEBUG] Analysis result saved to history")
-            
-        except Exception as e:
-            print(f"[DEBUG] Failed to save history: {e}")
-            # 히스토리 저장 실패해도 응답은 정상적으로 반환
+        _save_history(uid, user_text, gemini_result, trail_payload)
     
     return jsonify(response_payload)
 
 
+@app.route("/api/analyze/stream", methods=["POST", "OPTIONS"])
+@check_token
+@rate_limited
+def analyze_stream(uid) -> Any:
+    """/api/analyze의 스트리밍(SSE) 버전
+
+    모델 출력이 도착하는 대로 필드 단위 이벤트를 보낸다.
+    - emotions: 감정이 파싱되는 즉시 전송
+    - trails: 감정 기반 산책로 추천 (emotions 직후)
+    - keywords / comfort_message: 각 필드가 완성되는 대로 전송
+    - recommendation / recommendations: 감정이 나오자마자 시작한 음악 단계 결과(한 곡씩 {index, item}, 이후 전체 목록)
+    - done: /api/analyze와 같은 형태의 최종 결과
+    - error: 실패 시 {error, message}
+    """
+    if request.method == "OPTIONS":
+        return ("", 204, {
+            "Access-Control-Allow-Origin": request.headers.get("Origin", "*"),
+            "Access-Control-Allow-Methods": "POST, OPTIONS",
+            "Access-Control-Allow-Headers": request.headers.get("Access-Control-Request-Headers", "Content-Type"),
+        })
+
+    data = request.get_json(silent=True) or {}
+    user_text = (data.get("text") or "").strip()
+    if not user_text:
+        return jsonify({"error": "invalid_input", "message": "text 필드가 필요합니다."}), 400
+    if not GEMINI_API_KEY:
+        return jsonify({
+            "error": "GEMINI_API_KEY 미설정",
+            "message": "백엔드 .env 또는 루트 .env 파일에 GEMINI_API_KEY를 설정해주세요.",
+        }), 500
+
+    user_location = _request_location(data)
+    print(f"[DEBUG] 스트리밍 분석 요청 - 텍스트: {user_text[:50]}...")
+    user_music_taste = _fetch_music_taste(uid)
+    cache_key = make_cache_key(user_text, None)
+    cached = ANALYSIS_CACHE.get(cache_key)
+
+    job = None
+    outcome: Optional[CallOutcome] = None
+    open_reason: Optional[str] = None
+    timeout_sec = GEMINI_BREAKER.effective_timeout_sec()
+    sink: "queue.Queue" = queue.Queue()
+    local_result: Dict[str, Any] = {}
+    prefetched = None
+    if cached is None:
+        local_result = LOCAL_CLASSIFIER.analyze(user_text)
+        # 스트림을 열기 전에 서킷 상태와 워커 풀 입장 여부를 확인(서킷 open은 로컬 결과로 대체 가능)
+        try:
+            outcome = CallOutcome(GEMINI_BREAKER, GEMINI_BREAKER.before_call())
+        except CircuitOpenError as exc:
+            if not LOCAL_EMOTION_FALLBACK:
+                return jsonify({"error": "gemini_unavailable", "message": str(exc)}), 503, {"Retry-After": str(exc.retry_after_sec)}
+            open_reason = "gemini_unavailable"
+    if cached is None and open_reason is None:
+        prefetched = _prefetch_trail_payload(local_result, user_location)
+        submitted = time.perf_counter()
+        try:
+            job = GEMINI_POOL.submit(
+                _gemini_stream_into,
+                user_text,
+                sink,
+                timeout_sec,
+            )
+        except GeminiBusyError as exc:
+            outcome.ignored()
+            return jsonify({"error": "gemini_busy", "message": str(exc)}), 503, {"Retry-After": str(exc.retry_after_sec)}
+
+        # 서킷 결과는 작업 완료 시 기록: 클라이언트가 끊겨 제너레이터가 한 번도 돌지 않아도
+        # 시험 호출 자리가 반환된다. 제너레이터가 시간 초과/연결 종료로 작업을 버리면 거기서 기록
+        def _record_stream_outcome(f: Future) -> None:
+            if f.cancelled():
+                outcome.ignored()
+            elif f.exception() is not None:
+                outcome.failure()
+            else:
+                outcome.success(time.perf_counter() - submitted)
+
+        job.future.add_done_callback(_record_stream_outcome)
+
+    def _finish(gemini_result: Dict[str, Any], trail_payload: Dict[str, Any]) -> str:
+        if gemini_result.get("source") != "local":
+            ANALYSIS_CACHE.put(cache_key, _without_recommendations(gemini_result))
+        _save_history(uid, user_text, gemini_result, trail_payload)
+        return _sse("done", {"analysis": gemini_result, "trail": trail_payload})
+
+    def _start_music(result: Dict[str, Any]) -> Future:
+        # 제너레이터는 핸들러가 반환된 뒤 실행되므로 음악 단계 호출도 이 사용자의 대기열로 보냄
+        with fair_share(uid):
+            return start_recommendations(result, user_music_taste)
+
+    def _emit_recommendations(music_future: Future, result: Dict[str, Any], deadline: float):
+        # 음악 단계 결과를 한 곡씩 보낸 뒤 전체 목록 전송
+        recs = finish_recommendations(music_future, result, user_music_taste, deadline - time.monotonic())
+        for index, item in enumerate(recs):
+            yield _sse("recommendation", {"index": index, "item": item})
+        yield _sse("recommendations", {"recommendations": recs})
+        result["recommendations"] = recs
+
+    def _emit_local(reason: str, sent: set, partial: Optional[Dict[str, Any]] = None):
+        # Gemini 대신 로컬 분류 결과로 남은 필드를 채워 마무리(이미 받은 Gemini 필드는 유지)
+        fallback = _local_fallback(local_result, reason)
+        if partial:
+            fallback.update({k: v for k, v in _build_analysis_result(partial).items() if v})
+        trail_payload = _resolve_trail_payload(fallback["emotion"], local_result, prefetched, user_location)
+        if "emotions" not in sent:
+            yield _sse("emotions", {"emotions": fallback["emotions"], "emotion": fallback["emotion"]})
+            yield _sse("trails", trail_payload)
+        for key in ("keywords", "comfort_message"):
+            if key not in sent:
+                yield _sse(key, {key: fallback.get(key)})
+        yield from _emit_recommendations(
+            _start_music(fallback), fallback, time.monotonic())
+        yield _finish(fallback, trail_payload)
+
+    def generate():
+        t = time.perf_counter()
+        if cached is not None:
+            print("[DEBUG] Analysis cache hit (stream)")
+            music_future = _start_music(cached)
+            trail_payload = {"trails": [], "more": [], "positive_emotions_used": []}
+            if cached.get("emotion"):
+                trail_payload = _build_trail_payload(cached["emotion"], user_location)
+            yield _sse("emotions", {"emotions": cached.get("emotions", []), "emotion": cached.get("emotion")})
+            yield _sse("trails", trail_payload)
+            for key in ("keywords", "comfort_message"):
+                yield _sse(key, {key: cached.get(key)})
+            yield from _emit_recommendations(music_future, cached, time.monotonic() + timeout_sec)
+            yield _finish(cached, trail_payload)
+            return
+        if open_reason is not None:
+            yield from _emit_local(open_reason, set())
+            return
+
+        parser = IncrementalJSONParser(item_fields=())
+        emitted: set = set()
+        trail_payload: Dict[str, Any] = {"trails": [], "more": [], "positive_emotions_used": []}
+        music_future: Optional[Future] = None
+        deadline = time.monotonic() + timeout_sec
+        finished = False
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise queue.Empty
+                kind, payload = sink.get(timeout=remaining)
+                if kind == "error":
+                    outcome.failure()
+                    finished = True
+                    if LOCAL_EMOTION_FALLBACK:
+                        yield from _emit_local("gemini_call_failed", emitted, parser.finish())
+                    else:
+                        yield _sse("error", {"error": "gemini_call_failed", "message": payload})
+                    return
+                if kind == "end":
+                    break
+
+                for key, value in parser.feed(payload):
+                    if key not in STREAM_FIELDS or key in emitted:
+                        continue
+                    emitted.add(key)
+                    if key == "emotions":
+                        emotions = _normalize_emotions({"emotions": value})
+                        emotion_str = ", ".join(emotions) if emotions else None
+                        print(f"[DEBUG] first_emotion_sec= {round(time.perf_counter() - t, 2)}")
+                        yield _sse("emotions", {"emotions": emotions, "emotion": emotion_str})
+                        # 감정이 나오자마자 음악 단계 시작(나머지 필드 생성과 겹쳐 실행)
+                        music_future = _start_music({"emotions": emotions})
+                        if emotion_str:
+                            trail_payload = _resolve_trail_payload(emotion_str, local_result, prefetched, user_location)
+                        yield _sse("trails", trail_payload)
+                    else:
+                        yield _sse(key, {key: value})
+
+            print("gemini_sec=", round(time.perf_counter() - t, 2))
+            outcome.success(time.perf_counter() - t)
+            # 잘린 출력이어도 복구 가능한 필드까지 사용
+            final_fields = parser.finish()
+            gemini_result = _fill_missing_emotions(_build_analysis_result(final_fields, record=True), user_text)
+            for key in ("keywords", "comfort_message"):
+                if key not in emitted and key in final_fields:
+                    yield _sse(key, {key: final_fields[key]})
+            finished = True
+            if not any(gemini_result.values()):
+                yield _sse("error", {"error": "empty_result", "message": "모델이 빈 결과를 반환했습니다."})
+                return
+            LOCAL_CLASSIFIER.record_agreement(local_result["emotions"], gemini_result["emotions"])
+            if "emotions" not in emitted:
+                if gemini_result["emotion"]:
+                    trail_payload = _resolve_trail_payload(gemini_result["emotion"], local_result, prefetched, user_location)
+                yield _sse("emotions", {"emotions": gemini_result["emotions"], "emotion": gemini_result["emotion"]})
+                yield _sse("trails", trail_payload)
+            if music_future is None:
+                music_future = _start_music(gemini_result)
+            yield from _emit_recommendations(music_future, gemini_result, time.monotonic() + timeout_sec)
+            yield _finish(gemini_result, trail_payload)
+        except queue.Empty:
+            outcome.failure(timeout=True)
+            if LOCAL_EMOTION_FALLBACK:
+                yield from _emit_local("gemini_timeout", emitted, parser.finish())
+                return
+            yield _sse("error", {
+                "error": "gemini_timeout",
+                "message": f"모델 응답이 {timeout_sec}초를 초과했습니다.",
+            })
+        finally:
+            # 타임아웃이나 클라이언트 연결 종료 시 진행 중인 호출은 버림
+            if not finished and job is not None:
+                outcome.ignored()
+                GEMINI_POOL.abandon(job)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
 # 회원가입 시 프로필 정보 저장
 @app.route("/api/register", methods=["POST"])
 @check_token
@@ -841,6 +1634,60 @@ def update_my_info(uid):
         return jsonify({"error": "update_failed", "message": str(e)}), 500
 
 
+# 근처 산책로 조회 (Gemini 분석 없이, 메모리 색인만 사용)
+@app.route("/api/trails/nearby", methods=["GET"])
+@check_token
+def get_nearby_trails(uid):
+    """/api/trails/nearby?lat=&lng=&radius=&limit=
+    반경(m, 기본 TRAIL_MAX_RADIUS_M) 안의 산책로를 가까운 순으로. 거리는 마커와 경로 점 중 가장 가까운 점까지"""
+    point = parse_lat_lng({"latitude": request.args.get("lat"), "longitude": request.args.get("lng")})
+    if point is None:
+        return jsonify({"error": "invalid_input", "message": "lat, lng 파라미터가 필요합니다."}), 400
+    try:
+        radius = float(request.args.get("radius") or TRAIL_MAX_RADIUS_M)
+        limit = int(request.args.get("limit") or 10)
+    except ValueError:
+        return jsonify({"error": "invalid_input", "message": "radius, limit는 숫자여야 합니다."}), 400
+    radius = min(max(radius, 1.0), float(TRAIL_NEARBY_MAX_RADIUS_M))
+    limit = min(max(limit, 1), 50)
+    trails = TRAIL_INDEX.nearby(point[0], point[1], radius, limit)
+    return jsonify({"trails": trails, "radius": radius, "index_version": TRAIL_INDEX.version})
+
+
+def _route_detail_stats() -> Dict[str, Any]:
+    """상세도별 루트 점 수 합계(카탈로그 전체)"""
+    points = {detail: 0 for detail in DETAIL_TOLERANCES_M}
+    for _, entry in TRAIL_CATALOG.items():
+        geometry = entry.get('geometry')
+        if geometry is not None:
+            for detail, count in geometry.point_counts().items():
+                points[detail] += count
+    return {"default": ROUTE_DEFAULT_DETAIL, "format": ROUTE_RESPONSE_FORMAT, "tolerancesM": DETAIL_TOLERANCES_M, "points": points}
+
+
+# 산책로 루트를 지도 확대 레벨에 맞는 상세도로 조회 (메모리 카탈로그만 사용)
+@app.route("/api/trails/<trail_name>/route", methods=["GET"])
+@check_token
+def get_trail_route(uid, trail_name):
+    """/api/trails/<이름>/route?zoom=&detail=&format=
+    detail(low / medium / full)이 없으면 zoom(카카오맵 레벨)으로 정하고, 둘 다 없으면 ROUTE_DEFAULT_DETAIL"""
+    detail = (request.args.get("detail") or "").lower()
+    if not detail:
+        zoom = request.args.get("zoom")
+        try:
+            detail = detail_for_zoom(int(zoom)) if zoom else ROUTE_DEFAULT_DETAIL
+        except ValueError:
+            return jsonify({"error": "invalid_input", "message": "zoom은 정수여야 합니다."}), 400
+    if detail not in DETAIL_TOLERANCES_M:
+        return jsonify({"error": "invalid_input", "message": f"detail은 {', '.join(DETAIL_TOLERANCES_M)} 중 하나여야 합니다."}), 400
+    fmt = (request.args.get("format") or ROUTE_RESPONSE_FORMAT).lower()
+
+    entry = TRAIL_CATALOG.get(trail_name)
+    if entry is None or entry.get('geometry') is None:
+        return jsonify({"error": "not_found", "message": "산책로 루트 정보가 없습니다."}), 404
+    return jsonify({"name": trail_name, "detail": detail, "route": entry['geometry'].route(detail, fmt)})
+
+
 # 나의 이용 내역 조회
 @app.route("/api/history", methods=["GET"])
 @check_token
@@ -909,9 +1756,9 @@ def delete_my_history(uid, history_id):
 
 
 
-# 서버 기동 시 웜업 실행(비차단)
+# 서버 기동 시 웜업 후 keep-warm 루프 시작(비차단)
 if GEMINI_API_KEY:
-    threading.Thread(target=_warmup_model, daemon=True).start()
+    KEEP_WARM.start()
     
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+# 파일: backend\bench_json_parser.py
+# 기존 parse_json_response와 증분 파서(json_stream)를 퍼즈 코퍼스로 비교하는 벤치마크. (API 키 불필요)
+#   python bench_json_parser.py [샘플 수]
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from json_stream import IncrementalJSONParser, parse_json_text
+
+EMOTIONS = ["기쁨", "자유로움", "성취감", "편안함", "사랑", "외로움", "우울감", "불안", "피로", "실망"]
+FIELDS = ["emotions", "keywords", "comfort_message", "recommendations"]
+
+
+def legacy_parse_json_response(text: str) -> Dict[str, Any]:
+    # app.py의 기존 구현(비교 기준)
+    if not text:
+        return {}
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+        if cleaned.lower().startswith("json"):
+            cleaned = cleaned[4:].strip()
+    first = cleaned.find('{')
+    last = cleaned.rfind('}')
+    if first != -1 and last != -1 and last > first:
+        cleaned = cleaned[first : last + 1]
+    try:
+        return json.loads(cleaned)
+    except Exception:
+        return {}
+
+
+def make_doc(rnd: random.Random) -> Dict[str, Any]:
+    return {
+        "emotions": rnd.sample(EMOTIONS, rnd.randint(1, 2)),
+        "keywords": [f"키워드{rnd.randint(1, 99)}" for _ in range(rnd.randint(1, 4))],
+        "comfort_message": "오늘 하루도 정말 수고 많았어요. " * rnd.randint(1, 4) + "\"천천히\" 걸어봐요.",
+        "recommendations": [
+            {"artist": f"가수{k}", "title": f"노래 [{k}]", "reason": "잔잔한 멜로디가, 마음을 {달래} 줄 거예요."}
+            for k in range(3)
+        ],
+    }
+
+
+def build_corpus(rnd: random.Random, n: int) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(분류, 텍스트, 원본 문서) 목록"""
+    corpus = []
+    for _ in range(n):
+        doc = make_doc(rnd)
+        text = json.dumps(doc, ensure_ascii=False, indent=rnd.choice([None, 2]))
+        corpus.append(("valid", text, doc))
+        corpus.append(("fenced", f"```json\n{text}\n```", doc))
+        corpus.append(("prose", f"분석 결과입니다:\n{text}\n참고하세요.", doc))
+        corpus.append(("trailing_comma", text.replace("]", ",]", 1).replace("}\n}", "},\n}"), doc))
+        corpus.append(("raw_newline", text.replace("수고 많았어요.", "수고\n많았어요.", 1), doc))
+        corpus.append(("truncated", text[: rnd.randint(len(text) // 4, len(text) - 2)], doc))
+        # 임의 위치 문자 삭제(복구 불가능할 수도 있음)
+        pos = rnd.randrange(len(text))
+        corpus.append(("mutated", text[:pos] + text[pos + 1:], doc))
+    return corpus
+
+
+def usable_fields(result: Dict[str, Any]) -> int:
+    return sum(1 for f in FIELDS if result.get(f))
+
+
+def time_us(fn: Callable[[str], Any], texts: List[str], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts) * 1e6
+
+
+def feed_in_chunks(text: str, rnd: random.Random) -> Dict[str, Any]:
+    parser = IncrementalJSONParser()
+    i = 0
+    while i < len(text):
+        k = rnd.randint(1, 16)
+        parser.feed(text[i:i + k])
+        i += k
+    return parser.finish()
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rnd = random.Random(20240617)
+    corpus = build_corpus(rnd, n)
+
+    print(f"corpus: {len(corpus)} texts ({n} per category)")
+    print(f"{'category':<16}{'legacy fields':>14}{'new fields':>12}{'legacy us':>12}{'new us':>10}")
+    categories = sorted({c for c, _, _ in corpus}, key=[c for c, _, _ in corpus].index)
+    for cat in categories:
+        texts = [t for c, t, _ in corpus if c == cat]
+        legacy = sum(usable_fields(legacy_parse_json_response(t)) for t in texts) / len(texts)
+        new = sum(usable_fields(parse_json_text(t)) for t in texts) / len(texts)
+        print(
+            f"{cat:<16}{legacy:>14.2f}{new:>12.2f}"
+            f"{time_us(legacy_parse_json_response, texts):>12.1f}{time_us(parse_json_text, texts):>10.1f}"
+        )
+
+    # 스트리밍 경로: 임의 크기 조각으로 나눠 넣어도 한 번에 파싱한 것과 결과가 같아야 함
+    mismatches = 0
+    valid = [(t, d) for c, t, d in corpus if c in ("valid", "fenced", "prose")]
+    for text, doc in valid:
+        if feed_in_chunks(text, rnd) != doc:
+            mismatches += 1
+    chunked_us = time_us(lambda t: feed_in_chunks(t, rnd), [t for t, _ in valid], repeat=1)
+    print(f"chunked feed: {len(valid)} texts, mismatches={mismatches}, {chunked_us:.1f} us/text")
+
+    # 어떤 입력에서도 예외 없이 dict를 반환해야 함
+    for _, text, _ in corpus:
+        assert isinstance(parse_json_text(text), dict)
+    assert mismatches == 0
+
+
+if __name__ == "__main__":
+    main()
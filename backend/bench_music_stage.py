@@ -0,0 +1,136 @@
+# 파일: backend\bench_music_stage.py
+# 음악 추천 단계 분리 전/후의 출력 토큰 수와 지연 비교 (GEMINI_API_KEY 필요)
+#   python bench_music_stage.py [반복 수]
+# - legacy : 분리 전 단일 호출(감정 + 공감 메시지 + 추천곡 3곡)
+# - split  : 감정 분석 호출만(/api/analyze의 첫 응답 경로)
+# - music  : 음악 단계 호출(캐시 미스일 때만 발생, 같은 감정/취향 조합은 캐시에서 즉시 반환)
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import google.generativeai as genai
+
+from music_stage import MUSIC_SYSTEM_INSTRUCTION, build_music_prompt
+
+assert os.getenv("GEMINI_API_KEY"), "GEMINI_API_KEY 필요"
+genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+
+POSITIVE_EMOTIONS = ["기쁨", "자유로움", "성취감", "편안함", "사랑", "감사", "흥미", "재미", "희망", "자부심"]
+NEGATIVE_EMOTIONS = ["외로움", "우울감", "분노", "불안", "슬픔", "죄책감", "질투", "피로", "혐오", "실망"]
+
+# 분리 전 app.py의 SYSTEM_INSTRUCTION (비교 기준)
+LEGACY_SYSTEM_INSTRUCTION = f"""
+너는 공감능력이 매우 뛰어난 심리 분석가이자 상대방 감정을 음악으로 치유해줄 수 있는 큐레이터야. 문장 속 상대방의 현재 감정 상태를 분석하고, 다음의 지침에 따라 사용자의 감정 상태에 맞춰 응답해줘.
+
+[지침]
+1. 사용자가 입력한 텍스트를 깊이 있게 읽고, 현재 느끼고 있을 핵심적인 감정을 정확히 1~2개 분석해.
+2. 감정은 반드시 다음 20개 중에서만 선택해야 함:
+   - 긍정 감정: {', '.join(POSITIVE_EMOTIONS)}
+   - 부정 감정: {', '.join(NEGATIVE_EMOTIONS)}
+3. 분석한 감정을 바탕으로, 사용자의 마음을 따뜻하게 위로하고 격려하는 '공감의 한마디'를 작성해.
+4. 분석한 감정과 텍스트의 분위기에 어울리는 음악 3곡을 추천해.
+5. 각 음악에 대해 추천하는 이유를 1~2 문장으로 간결하게 설명해.
+6. 모든 결과는 반드시 아래의 JSON 형식에 맞춰서 출력해줘. 다른 설명은 절대 추가하지 마.
+
+[JSON 출력 형식]
+{{
+  "emotions": ["감정1", "감정2"],
+  "keywords": ["텍스트에서 추출한 주요 키워드 1", "키워드 2"],
+  "comfort_message": "사용자를 위로하고 격려하는 공감의 한마디",
+  "recommendations": [
+    {{
+      "artist": "가수명",
+      "title": "노래 제목", 
+      "reason": "이 노래를 추천하는 이유"
+    }},
+    {{
+      "artist": "가수명",
+      "title": "노래 제목",
+      "reason": "이 노래를 추천하는 이유"
+    }},
+    {{
+      "artist": "가수명", 
+      "title": "노래 제목",
+      "reason": "이 노래를 추천하는 이유"
+    }}
+  ]
+}}
+""".strip()
+
+# 분리 후 app.py의 SYSTEM_INSTRUCTION
+ANALYSIS_SYSTEM_INSTRUCTION = f"""
+너는 공감능력이 매우 뛰어난 심리 분석가야. 문장 속 상대방의 현재 감정 상태를 분석하고, 다음의 지침에 따라 사용자의 감정 상태에 맞춰 응답해줘.
+
+[지침]
+1. 사용자가 입력한 텍스트를 깊이 있게 읽고, 현재 느끼고 있을 핵심적인 감정을 정확히 1~2개 분석해.
+2. 감정은 반드시 다음 20개 중에서만 선택해야 함:
+   - 긍정 감정: {', '.join(POSITIVE_EMOTIONS)}
+   - 부정 감정: {', '.join(NEGATIVE_EMOTIONS)}
+3. 분석한 감정을 바탕으로, 사용자의 마음을 따뜻하게 위로하고 격려하는 '공감의 한마디'를 작성해.
+4. 모든 결과는 반드시 아래의 JSON 형식에 맞춰서 출력해줘. 다른 설명은 절대 추가하지 마.
+
+[JSON 출력 형식]
+{{
+  "emotions": ["감정1", "감정2"],
+  "keywords": ["텍스트에서 추출한 주요 키워드 1", "키워드 2"],
+  "comfort_message": "사용자를 위로하고 격려하는 공감의 한마디"
+}}
+""".strip()
+
+PROMPTS = [
+    "오늘 야근하느라 너무 피곤하고 지쳤어",
+    "드디어 시험에 합격했어! 너무 뿌듯하다",
+    "혼자 이사 와서 주말마다 외롭고 쓸쓸해",
+    "발표를 망친 것 같아서 계속 걱정되고 불안해",
+    "오랜만에 친구들이랑 놀러 가서 정말 재밌었어",
+]
+MUSIC_TASTE = "인디, 발라드"
+
+
+def _model(instruction: str) -> genai.GenerativeModel:
+    return genai.GenerativeModel(
+        model_name="gemini-2.5-flash",
+        system_instruction=instruction,
+        generation_config={"response_mime_type": "application/json"},
+    )
+
+
+def run(model: genai.GenerativeModel, prompt: str) -> Tuple[float, int]:
+    t0 = time.perf_counter()
+    response = model.generate_content(prompt)
+    elapsed = time.perf_counter() - t0
+    usage = getattr(response, "usage_metadata", None)
+    return elapsed, int(getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def report(name: str, rows: List[Tuple[float, int]]) -> Dict[str, float]:
+    lat = sorted(r[0] for r in rows)
+    tokens = sum(r[1] for r in rows) / len(rows)
+    avg = sum(lat) / len(lat)
+    print(f"{name:<8}{len(rows):>6}{tokens:>14.1f}{avg:>12.2f}{lat[len(lat) // 2]:>10.2f}{lat[-1]:>10.2f}")
+    return {"tokens": tokens, "avg": avg}
+
+
+def main() -> None:
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    legacy, split, music = _model(LEGACY_SYSTEM_INSTRUCTION), _model(ANALYSIS_SYSTEM_INSTRUCTION), _model(MUSIC_SYSTEM_INSTRUCTION)
+    results: Dict[str, List[Tuple[float, int]]] = {"legacy": [], "split": [], "music": []}
+    for _ in range(repeat):
+        for text in PROMPTS:
+            # 분리 전과 같이 음악 취향을 프롬프트 앞에 붙임
+            results["legacy"].append(run(legacy, f"사용자의 음악 취향: {MUSIC_TASTE}\n\n{text}"))
+            results["split"].append(run(split, text))
+            results["music"].append(run(music, build_music_prompt(["피로"], MUSIC_TASTE)))
+
+    print(f"{'stage':<8}{'calls':>6}{'output tok':>14}{'avg sec':>12}{'p50':>10}{'max':>10}")
+    base = report("legacy", results["legacy"])
+    new = report("split", results["split"])
+    report("music", results["music"])
+    print(f"analysis output tokens: -{(1 - new['tokens'] / max(base['tokens'], 1)) * 100:.0f}%, "
+          f"latency: -{(1 - new['avg'] / max(base['avg'], 1e-9)) * 100:.0f}% "
+          f"(음악 단계는 감정/취향 조합별 캐시 미스일 때만 추가로 호출)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# 파일: backend\bench_route_geometry.py
+# 산책로 경로 변환 비교: 기존 요청마다 하던 변환(order 정렬 + [lng, lat] 목록 재구성)과
+# 카탈로그 적재 때 한 번 만든 RouteGeometry(GeoJSON 재사용)의 요청당 시간. 두 결과가 같은지도 확인한다. (API 키 불필요)
+#   python bench_route_geometry.py [경로 점 수 ...] [--trails 13] [--repeat 20]
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from route_geometry import RouteGeometry
+
+
+def legacy_route(trail_firebase_data: Dict[str, Any]) -> Dict[str, Any]:
+    # 기존 _row_to_trail의 경로 변환(비교 기준)
+    route_coords = trail_firebase_data['route_coordinates']
+    if isinstance(route_coords[0], dict):
+        converted_coords = []
+        sorted_coords = sorted(route_coords, key=lambda x: x.get('order', 0))
+        for coord_obj in sorted_coords:
+            converted_coords.append([coord_obj['lng'], coord_obj['lat']])
+        return {'type': trail_firebase_data.get('route_type', 'LineString'), 'coordinates': converted_coords}
+    return {'type': trail_firebase_data.get('route_type', 'LineString'), 'coordinates': route_coords}
+
+
+def synthetic_doc(points: int, seed: int) -> Dict[str, Any]:
+    # add_route_data.py가 저장하는 형태({lng, lat, order}), Firestore에서 읽으면 순서가 섞여 올 수 있어 섞어 둠
+    rnd = random.Random(seed)
+    lng, lat = 127.03 + rnd.random() * 0.05, 37.57 + rnd.random() * 0.04
+    coords = []
+    for i in range(points):
+        lng += rnd.uniform(-1, 1) * 1e-4
+        lat += rnd.uniform(-1, 1) * 1e-4
+        coords.append({'lng': lng, 'lat': lat, 'order': i})
+    rnd.shuffle(coords)
+    return {'route_type': 'LineString', 'route_coordinates': coords}
+
+
+def per_request_us(fn: Callable[[], Any], repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    trails = int(args[args.index("--trails") + 1]) if "--trails" in args else 13
+    repeat = int(args[args.index("--repeat") + 1]) if "--repeat" in args else 20
+    flags = {i for i, a in enumerate(args) if a.startswith("--")} | {i + 1 for i, a in enumerate(args) if a.startswith("--")}
+    sizes = [int(a) for i, a in enumerate(args) if i not in flags] or [500, 2000, 5000, 20000]
+
+    print(f"trails/request={trails} repeat={repeat}")
+    print(f"{'points':>8}{'build ms':>12}{'legacy us':>14}{'cached us':>12}{'speedup':>10}")
+    for points in sizes:
+        docs = [synthetic_doc(points, seed) for seed in range(trails)]
+        t0 = time.perf_counter()
+        geometries: List[RouteGeometry] = [RouteGeometry.from_doc(doc) for doc in docs]
+        build_ms = (time.perf_counter() - t0) * 1000 / trails
+        for doc, geometry in zip(docs, geometries):
+            assert legacy_route(doc) == geometry.geojson, "변환 결과가 기존과 다릅니다."
+        catalog = {f"trail{i}": {"geometry": g} for i, g in enumerate(geometries)}
+
+        legacy_us = per_request_us(lambda: [legacy_route(doc) for doc in docs], repeat)
+        cached_us = per_request_us(
+            lambda: [{"name": name, "route": entry["geometry"].geojson} for name, entry in catalog.items()], repeat * 100)
+        print(f"{points:>8}{build_ms:>12.2f}{legacy_us:>14.1f}{cached_us:>12.2f}{legacy_us / cached_us:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
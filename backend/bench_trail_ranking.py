@@ -0,0 +1,135 @@
+# 파일: backend\bench_trail_ranking.py
+# 기존 get_emotion_based_trails의 pandas 순위 계산과 미리 계산한 순위표(trail_ranking)의 호출당 시간을 비교하고
+# 모든 단일/두 감정 조합에서 점수 순위가 같은지 확인한다. Firestore 좌표 조회는 두 경로 모두 제외. (API 키 불필요)
+#   python bench_trail_ranking.py [CSV 경로] [반복 수]
+#   python bench_trail_ranking.py --synthetic [행 수] [구 수]   # 합성 카탈로그에서 미리 계산하지 않은 조회 시간
+import itertools
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trail_ranking import TrailRanking
+
+POSITIVE_EMOTIONS = ["기쁨", "자유로움", "성취감", "편안함", "사랑", "감사", "흥미", "재미", "희망", "자부심"]
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data", "score_db_final.csv")
+
+
+def load_csv(path: str) -> pd.DataFrame:
+    # app.py의 _load_score_df처럼 감정 컬럼이 보이는 인코딩을 고름
+    for enc in ("utf-8-sig", "cp949", "euc-kr"):
+        try:
+            df = pd.read_csv(path, encoding=enc)
+        except Exception:
+            continue
+        df.columns = [str(c).strip().lstrip("﻿").replace("�", "").strip() for c in df.columns]
+        if len(set(df.columns) & set(POSITIVE_EMOTIONS)) >= 5:
+            return df
+    raise SystemExit(f"CSV를 읽을 수 없습니다: {path}")
+
+
+def legacy_rank(score_df: pd.DataFrame, target_emotions: Sequence[str]) -> List[Tuple[str, float]]:
+    # 기존 구현(비교 기준, 출력 제외): 복사 → 이름 필터 → 평균 → 전체 정렬 → iterrows
+    available = [emo for emo in target_emotions if emo in score_df.columns]
+    score_df_copy = score_df.copy()
+    filtered_df = score_df_copy[score_df_copy["INTEGRATED_NAME"].str.strip() <= "장이소공원"].copy()
+    filtered_df["avg_score"] = filtered_df[available].mean(axis=1)
+    ranked = filtered_df.sort_values("avg_score", ascending=False)
+    return [(str(row.get("INTEGRATED_NAME")), round(float(row["avg_score"]), 2)) for _, row in ranked.head(13).iterrows()]
+
+
+def table_rank(ranking: TrailRanking, target_emotions: Sequence[str]) -> List[Tuple[str, float]]:
+    _, ranked, scores = ranking.rank(target_emotions)
+    return [(ranking.names[i], round(float(s), 2)) for i, s in zip(ranked, scores)]
+
+
+def time_per_call(fn: Callable[[Sequence[str]], object], targets: List[List[str]], repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for target in targets:
+            fn(target)
+    return (time.perf_counter() - t0) / (repeat * len(targets)) * 1e6
+
+
+def synthetic_df(rows: int, districts: int, seed: int = 7) -> pd.DataFrame:
+    rnd = np.random.default_rng(seed)
+    district_names = [f"합성{i:02d}구" for i in range(districts)]
+    picked = rnd.integers(0, districts, rows)
+    data: Dict[str, object] = {
+        "INTEGRATED_NAME": [f"공원{i:06d}" for i in range(rows)],
+        "ADDRESS": [f"서울특별시 {district_names[d]} 산책로 {i}" for i, d in enumerate(picked)],
+    }
+    for emo in POSITIVE_EMOTIONS:
+        data[emo] = np.round(rnd.uniform(1, 9, rows), 2)
+    return pd.DataFrame(data)
+
+
+def percentile_us(samples: List[float], q: float) -> float:
+    data = sorted(samples)
+    return data[int(q * (len(data) - 1))] * 1e6
+
+
+def synthetic(rows: int, districts: int) -> None:
+    df = synthetic_df(rows, districts)
+    ranking = TrailRanking(df, POSITIVE_EMOTIONS, name_cutoff=None)
+    keys = [ranking.key(t) for t in itertools.combinations(POSITIVE_EMOTIONS, 2)] + [(e,) for e in POSITIVE_EMOTIONS]
+    shard_names = sorted(ranking.shards)
+
+    def measure(bounds_of: Callable[[int], Tuple[int, int]]) -> List[float]:
+        samples = []
+        for i, key in enumerate(keys * 3):
+            start, end = bounds_of(i)
+            t0 = time.perf_counter()
+            ranking._compute(key, start, end)  # 미리 계산/캐시를 거치지 않는 순위 계산
+            samples.append(time.perf_counter() - t0)
+        return samples
+
+    full = measure(lambda i: (0, len(ranking.names)))
+    shard = measure(lambda i: ranking.shards[shard_names[i % len(shard_names)]])
+    t0 = time.perf_counter()
+    for key in keys * 200:
+        ranking.rank(key)
+    lookup_us = (time.perf_counter() - t0) / (len(keys) * 200) * 1e6
+
+    print(f"rows={len(ranking.names)} districts={len(ranking.shards)} build_ms={ranking.build_ms}")
+    print(f"{'query':<22}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    for name, samples in (("uncached, all rows", full), ("uncached, 1 district", shard)):
+        print(f"{name:<22}{percentile_us(samples, 0.5):>10.1f}{percentile_us(samples, 0.99):>10.1f}{max(samples) * 1e6:>10.1f}")
+    print(f"{'precomputed lookup':<22}{lookup_us:>10.1f}")
+    assert percentile_us(full, 0.99) < 1000, "10만 행에서도 한 번의 조회는 1ms 안에 끝나야 합니다."
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == "--synthetic":
+        synthetic(int(sys.argv[2]) if len(sys.argv) > 2 else 100_000, int(sys.argv[3]) if len(sys.argv) > 3 else 25)
+        return
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CSV
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    df = load_csv(path)
+    ranking = TrailRanking(df, POSITIVE_EMOTIONS)
+    targets = [[e] for e in POSITIVE_EMOTIONS] + [list(p) for p in itertools.combinations(POSITIVE_EMOTIONS, 2)]
+
+    mismatches = [t for t in targets if legacy_rank(df, t) != table_rank(ranking, t)]
+    # 동점이면 정렬 방식에 따라 순서가 바뀔 수 있어 점수 목록도 따로 비교
+    score_mismatches = [
+        t for t in mismatches
+        if [s for _, s in legacy_rank(df, t)] != [s for _, s in table_rank(ranking, t)]
+    ]
+
+    legacy_us = time_per_call(lambda t: legacy_rank(df, t), targets, repeat)
+    table_us = time_per_call(lambda t: table_rank(ranking, t), targets, repeat * 50)
+    print(f"rows={len(df)} trails={len(ranking.names)} emotion_sets={len(targets)} build_ms={ranking.build_ms}")
+    print(f"{'path':<10}{'us/call':>12}")
+    print(f"{'legacy':<10}{legacy_us:>12.1f}")
+    print(f"{'table':<10}{table_us:>12.1f}")
+    print(f"speedup x{legacy_us / table_us:.0f}")
+    # 동점끼리의 순서는 새 엔진에서 행 순서로 고정되므로 순서 차이는 참고용
+    print(f"order mismatches: {len(mismatches)} (score mismatches: {len(score_mismatches)})")
+    assert not score_mismatches, score_mismatches[:3]
+
+
+if __name__ == "__main__":
+    main()
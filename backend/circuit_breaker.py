@@ -0,0 +1,248 @@
+"""Gemini 의존성용 서킷 브레이커와 적응형 타임아웃
+
+최근 호출의 오류율(타임아웃 포함)과 느린 호출 비율을 기준으로 closed → open → half_open
+상태를 전환한다. slow_call_sec 이상 걸린 호출(타임아웃 포함)은 성공하더라도 느린 호출로
+기록하며, 둘 중 어느 비율이든 임계치에 닿으면 서킷을 연다. 유효 타임아웃은 성공 지연의
+p99 x 배수라 점진적인 지연 증가에 따라 같이 늘어나므로, 오류율만으로는 잡히지 않는 저하를
+느린 호출 비율로 잡는다. open 상태에서는 호출을 즉시 거절해 워커를 붙잡지 않고, 일정 시간 뒤
+half_open에서 소수의 시험 호출로 회복 여부를 확인한다(느린 시험 호출은 실패로 본다).
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 지연 히스토그램 구간 상한(ms). 마지막 구간은 그 이상 전부
+LATENCY_BUCKETS_MS: List[int] = [250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000]
+
+
+class CircuitOpenError(Exception):
+    """서킷이 열려 있어 호출을 시작하지 않았을 때 발생"""
+
+    def __init__(self, message: str, retry_after_sec: int = 1):
+        super().__init__(message)
+        self.retry_after_sec = retry_after_sec
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 10,
+        window: int = 50,
+        open_sec: float = 30.0,
+        half_open_max_calls: int = 1,
+        half_open_successes: int = 2,
+        max_timeout_sec: float = 120.0,
+        min_timeout_sec: float = 10.0,
+        timeout_percentile: float = 0.99,
+        timeout_multiplier: float = 2.0,
+        adaptive_timeout: bool = True,
+        latency_samples: int = 200,
+        slow_call_sec: float = 8.0,
+        slow_call_rate_threshold: float = 0.5,
+    ):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.open_sec = open_sec
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.half_open_successes = max(1, half_open_successes)
+        self.max_timeout_sec = max_timeout_sec
+        self.min_timeout_sec = min(min_timeout_sec, max_timeout_sec)
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+        self.adaptive_timeout = adaptive_timeout
+        self.slow_call_sec = slow_call_sec
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_inflight = 0
+        self._half_open_ok = 0
+        # 최근 호출 결과 (실패 여부, 느린 호출 여부)
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=latency_samples)
+        self._counters: Dict[str, int] = {
+            "successes": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "slowCalls": 0,
+            "shortCircuited": 0,
+            "opened": 0,
+        }
+
+    # ---- 상태 ----
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        print(f"[DEBUG] Gemini circuit {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._counters["opened"] += 1
+        if state == HALF_OPEN:
+            self._half_open_inflight = 0
+            self._half_open_ok = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(failed for failed, _ in self._outcomes) / len(self._outcomes)
+
+    def _slow_call_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(slow for _, slow in self._outcomes) / len(self._outcomes)
+
+    def _maybe_trip(self) -> None:
+        if self._state != CLOSED or len(self._outcomes) < self.min_calls:
+            return
+        if (
+            self._failure_rate() >= self.failure_rate_threshold
+            or self._slow_call_rate() >= self.slow_call_rate_threshold
+        ):
+            self._transition(OPEN)
+
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_sec:
+                self._transition(HALF_OPEN)
+            return self._state
+
+    # ---- 호출 전후 ----
+    def before_call(self) -> bool:
+        """호출 허용 여부를 확인한다. 허용되면 half_open 시험 호출인지 여부를 반환.
+        거절 시 CircuitOpenError"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                remaining = self.open_sec - (now - self._opened_at)
+                if remaining > 0:
+                    self._counters["shortCircuited"] += 1
+                    raise CircuitOpenError(
+                        "Gemini 호출 실패나 지연이 이어져 잠시 요청을 중단했습니다.",
+                        retry_after_sec=max(1, math.ceil(remaining)),
+                    )
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._half_open_inflight >= self.half_open_max_calls:
+                    self._counters["shortCircuited"] += 1
+                    raise CircuitOpenError("Gemini 회복 여부를 확인하는 중입니다.", retry_after_sec=1)
+                self._half_open_inflight += 1
+                return True
+            return False
+
+    def record_success(self, latency_sec: float, probe: bool = False) -> None:
+        with self._lock:
+            slow = latency_sec >= self.slow_call_sec
+            self._counters["successes"] += 1
+            if slow:
+                self._counters["slowCalls"] += 1
+            self._latencies.append(latency_sec)
+            self._outcomes.append((False, slow))
+            if probe and self._state == HALF_OPEN:
+                if slow:
+                    # 느린 시험 호출 → 회복되지 않은 것으로 보고 다시 open
+                    self._transition(OPEN)
+                    return
+                self._half_open_inflight -= 1
+                self._half_open_ok += 1
+                if self._half_open_ok >= self.half_open_successes:
+                    self._transition(CLOSED)
+                return
+            self._maybe_trip()
+
+    def record_failure(self, timeout: bool = False, probe: bool = False) -> None:
+        with self._lock:
+            self._counters["timeouts" if timeout else "failures"] += 1
+            if timeout:
+                self._counters["slowCalls"] += 1
+            self._outcomes.append((True, timeout))
+            if probe and self._state == HALF_OPEN:
+                # 시험 호출 실패 → 다시 open
+                self._transition(OPEN)
+                return
+            self._maybe_trip()
+
+    def record_ignored(self, probe: bool = False) -> None:
+        """로컬 과부하 등 의존성 상태와 무관한 실패. 시험 호출 슬롯만 반환"""
+        with self._lock:
+            if probe and self._state == HALF_OPEN:
+                self._half_open_inflight = max(0, self._half_open_inflight - 1)
+
+    # ---- 적응형 타임아웃 ----
+    def effective_timeout_sec(self) -> float:
+        """최근 성공 호출 지연의 백분위 x 배수를 [min, max] 범위로 제한한 값"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not self.adaptive_timeout or len(samples) < self.min_calls:
+            return self.max_timeout_sec
+        observed = samples[int(self.timeout_percentile * (len(samples) - 1))]
+        return round(min(self.max_timeout_sec, max(self.min_timeout_sec, observed * self.timeout_multiplier)), 1)
+
+    def _histogram(self) -> List[Tuple[str, int]]:
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for sec in self._latencies:
+            ms = sec * 1000
+            idx = next((i for i, b in enumerate(LATENCY_BUCKETS_MS) if ms <= b), len(LATENCY_BUCKETS_MS))
+            counts[idx] += 1
+        labels = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return list(zip(labels, counts))
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state()
+        timeout = self.effective_timeout_sec()
+        with self._lock:
+            return {
+                "state": state,
+                "failureRate": round(self._failure_rate(), 3),
+                "slowCallRate": round(self._slow_call_rate(), 3),
+                "slowCallSec": self.slow_call_sec,
+                "recentCalls": len(self._outcomes),
+                "effectiveTimeoutSec": timeout,
+                "openRemainingSec": (
+                    round(max(0.0, self.open_sec - (time.monotonic() - self._opened_at)), 1)
+                    if state == OPEN else 0.0
+                ),
+                "latencyHistogram": dict(self._histogram()),
+                **self._counters,
+            }
+
+
+class CallOutcome:
+    """before_call()로 시작한 호출 하나의 결과를 한 번만 기록한다.
+
+    요청 스레드와 워커 완료 콜백처럼 여러 경로가 결과를 알게 되는 호출에서, 먼저 기록한 쪽만
+    반영하고 나머지는 무시한다(half_open 시험 호출 자리가 두 번 반환되거나 새지 않도록)."""
+
+    def __init__(self, breaker: CircuitBreaker, probe: bool):
+        self.breaker = breaker
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._recorded = False
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._recorded:
+                return False
+            self._recorded = True
+            return True
+
+    def success(self, latency_sec: float) -> None:
+        if self._claim():
+            self.breaker.record_success(latency_sec, probe=self.probe)
+
+    def failure(self, timeout: bool = False) -> None:
+        if self._claim():
+            self.breaker.record_failure(timeout=timeout, probe=self.probe)
+
+    def ignored(self) -> None:
+        if self._claim():
+            self.breaker.record_ignored(probe=self.probe)
@@ -0,0 +1,234 @@
+"""로컬 감정 분류기 (빠른 경로)
+
+20개 감정 라벨에 대한 한국어 어휘 사전으로 입력 문장의 감정을 즉시(수십 µs) 추정한다.
+Gemini 응답을 기다리는 동안 산책로 순위를 먼저 계산하거나 Firestore 데이터를 미리
+불러오는 데 쓰고, Gemini가 타임아웃/실패하면 그대로 대체 결과로 쓴다.
+기록된 history(프롬프트 + Gemini 감정)로 Gemini와의 일치율을 평가할 수 있다.
+"""
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 라벨별 단서 어휘(활용형을 잡기 위해 어간 위주)와 가중치
+EMOTION_LEXICON: Dict[str, Dict[str, float]] = {
+    "기쁨": {"기쁘": 2, "기뻐": 2, "기쁜": 2, "행복": 2, "신나": 1.5, "신난": 1.5, "좋았": 1, "좋아": 0.5,
+            "웃었": 1, "웃음": 1, "최고": 1, "ㅎㅎ": 0.5, "야호": 1.5},
+    "자유로움": {"자유": 2, "해방": 2, "홀가분": 2, "훌훌": 1.5, "여유": 1, "떠나고": 1, "여행": 1,
+             "방학": 1.5, "휴가": 1.5, "퇴사": 1.5, "종강": 2, "끝났": 0.5},
+    "성취감": {"성취": 2, "해냈": 2, "합격": 2, "통과": 1.5, "완성": 1.5, "끝냈": 1.5, "성공": 1.5,
+            "뿌듯": 2, "달성": 2, "승진": 2, "1등": 1.5, "마감": 0.5},
+    "편안함": {"편안": 2, "편해": 1.5, "편하": 1.5, "평온": 2, "차분": 1.5, "잔잔": 1, "느긋": 1.5,
+            "포근": 1.5, "안정": 1, "휴식": 1, "힐링": 1.5, "쉬고": 0.5},
+    "사랑": {"사랑": 2, "연애": 1.5, "애인": 1.5, "여자친구": 1.5, "남자친구": 1.5, "여친": 1.5, "남친": 1.5,
+           "데이트": 1.5, "고백": 1.5, "보고싶": 1, "보고 싶": 1, "설레": 1.5},
+    "감사": {"감사": 2, "고마": 2, "고맙": 2, "덕분": 1.5, "다행": 1},
+    "흥미": {"흥미": 2, "궁금": 1.5, "새로운": 1, "배우": 1, "호기심": 2, "관심": 1, "신기": 1.5},
+    "재미": {"재미": 2, "재밌": 2, "웃기": 1.5, "ㅋㅋ": 1, "즐거": 1.5, "즐겁": 1.5, "놀았": 1, "놀러": 1},
+    "희망": {"희망": 2, "기대": 1, "잘 될": 1.5, "잘될": 1.5, "꿈": 1, "앞으로": 1, "내일은": 1,
+           "새출발": 2, "다시 시작": 1.5},
+    "자부심": {"자부심": 2, "자랑": 1.5, "인정받": 2, "칭찬": 1.5, "대견": 2, "당당": 1.5, "자신감": 1.5},
+    "외로움": {"외로": 2, "외롭": 2, "혼자": 1, "쓸쓸": 2, "고독": 2, "아무도": 1, "연락이 없": 1.5,
+            "그리워": 1, "그립": 1},
+    "우울감": {"우울": 2, "무기력": 2, "공허": 1.5, "의욕이 없": 2, "의욕없": 2, "다 싫": 1.5, "울적": 2,
+            "눈물": 0.5, "ㅠ": 0.5, "힘들": 0.5},
+    "분노": {"화나": 2, "화가": 2, "짜증": 2, "열받": 2, "빡치": 2, "빡쳐": 2, "억울": 1.5, "분노": 2,
+           "어이없": 1.5, "미치겠": 1},
+    "불안": {"불안": 2, "걱정": 2, "초조": 2, "긴장": 1.5, "무서": 1.5, "두려": 1.5, "떨려": 1, "막막": 1.5,
+           "시험": 0.5, "면접": 0.5, "어떡하": 1.5, "어떻게 하": 1},
+    "슬픔": {"슬프": 2, "슬퍼": 2, "슬픈": 2, "이별": 2, "헤어": 1.5, "눈물": 1, "상실": 1.5, "떠났": 1,
+           "돌아가셨": 2, "울었": 1.5, "서럽": 1.5},
+    "죄책감": {"죄책": 2, "미안": 1.5, "죄송": 1.5, "잘못했": 1.5, "내 탓": 2, "내탓": 2, "후회": 1, "자책": 2},
+    "질투": {"질투": 2, "부럽": 2, "부러": 1.5, "샘나": 2, "비교": 1, "나만 빼고": 1.5},
+    "피로": {"피곤": 2, "지쳤": 2, "지친": 2, "지쳐": 2, "피로": 2, "졸려": 1.5, "야근": 1.5, "녹초": 2,
+           "번아웃": 2, "쉬고 싶": 1.5, "잠을 못": 1, "힘들": 1},
+    "혐오": {"혐오": 2, "역겹": 2, "역겨": 2, "꼴보기": 2, "지긋지긋": 2, "질려": 1.5, "싫어": 1, "싫다": 1},
+    "실망": {"실망": 2, "기대했는데": 2, "떨어졌": 1.5, "불합격": 2, "망했": 1.5, "허무": 1.5, "아쉽": 1,
+           "속상": 1.5},
+}
+
+# 단서 바로 뒤에 오면 그 단서를 무시하는 부정 표현 (예: "행복하지 않아")
+_NEGATIONS = ("지 않", "지않", "지 못", "지못", "지도 않")
+_NEGATION_SPAN = 6
+_WORD_STRIP = ".,!?~…\"'()[]<>ㅋㅎㅠㅜ"
+
+# 단서가 하나도 없을 때 사용할 기본 라벨(산책로 추천은 항상 가능하도록)
+DEFAULT_EMOTION = "편안함"
+
+# Gemini 대체 결과용 공감의 한마디
+COMFORT_MESSAGES: Dict[str, str] = {
+    "기쁨": "기쁜 마음이 전해져요. 그 기분 그대로 가볍게 걸어보는 건 어떨까요?",
+    "자유로움": "홀가분한 지금의 여유를 마음껏 누려보세요.",
+    "성취감": "정말 수고 많았어요. 스스로를 충분히 칭찬해 주세요.",
+    "편안함": "편안한 마음으로 천천히 걸으며 오늘을 정리해 보세요.",
+    "사랑": "따뜻한 마음이 느껴져요. 그 마음을 품고 산책해 보세요.",
+    "감사": "감사하는 마음은 하루를 더 빛나게 해요.",
+    "흥미": "새로운 것에 설레는 마음, 산책길에서도 발견해 보세요.",
+    "재미": "즐거운 기분이 오래 이어지길 바라요.",
+    "희망": "앞으로의 날들이 기대한 만큼 환하게 펼쳐질 거예요.",
+    "자부심": "당신이 해낸 일들은 충분히 자랑스러워요.",
+    "외로움": "혼자라고 느껴질 때도 당신은 소중한 사람이에요. 잠시 바깥 공기를 쐬어 봐요.",
+    "우울감": "마음이 무거운 날이네요. 천천히, 할 수 있는 만큼만 해도 괜찮아요.",
+    "분노": "많이 속상했겠어요. 걸으면서 마음을 조금 내려놓아 봐요.",
+    "불안": "걱정이 많은 하루였죠. 깊게 숨 쉬며 한 걸음씩 걸어봐요.",
+    "슬픔": "슬픈 마음을 억지로 감추지 않아도 괜찮아요. 곁에 있을게요.",
+    "죄책감": "너무 자신을 탓하지 마세요. 당신은 충분히 노력하고 있어요.",
+    "질투": "다른 사람과 비교하지 않아도 당신만의 속도가 있어요.",
+    "피로": "오늘 정말 고생 많았어요. 잠시 쉬어가도 괜찮아요.",
+    "혐오": "불편한 감정이 드는 날도 있어요. 잠시 거리를 두고 쉬어 봐요.",
+    "실망": "기대가 컸던 만큼 아쉬웠겠어요. 다음에는 분명 더 좋은 일이 있을 거예요.",
+}
+
+
+def agreement(local: Sequence[str], reference: Sequence[str]) -> Dict[str, float]:
+    """로컬 예측과 기준(Gemini) 감정 목록의 일치 지표"""
+    local_set, ref_set = set(local), set(reference)
+    union = local_set | ref_set
+    return {
+        "top1": float(bool(local) and bool(reference) and local[0] == reference[0]),
+        "top1InReference": float(bool(local) and local[0] in ref_set),
+        "overlap": float(bool(local_set & ref_set)),
+        "jaccard": len(local_set & ref_set) / len(union) if union else 1.0,
+    }
+
+
+def _surface_word(text: str, start: int, end: int) -> str:
+    """매칭 구간을 감싸는 공백 단위 어절(앞뒤 문장부호 제거)"""
+    left, right = start, end
+    while left > 0 and not text[left - 1].isspace():
+        left -= 1
+    while right < len(text) and not text[right].isspace():
+        right += 1
+    return text[left:right].strip(_WORD_STRIP)
+
+
+class LocalEmotionClassifier:
+    def __init__(
+        self,
+        labels: Optional[Iterable[str]] = None,
+        lexicon: Optional[Dict[str, Dict[str, float]]] = None,
+        max_labels: int = 2,
+        second_label_ratio: float = 0.6,
+        sample_size: int = 500,
+    ):
+        lexicon = lexicon or EMOTION_LEXICON
+        self.labels = list(labels) if labels is not None else list(lexicon)
+        unknown = [label for label in lexicon if label not in self.labels]
+        if unknown:
+            raise ValueError(f"lexicon has unknown labels: {unknown}")
+        # (단서, 라벨, 가중치) 목록을 긴 단서부터 검사
+        self._cues: List[Tuple[str, str, float]] = sorted(
+            ((cue, label, float(w)) for label, cues in lexicon.items() for cue, w in cues.items()),
+            key=lambda x: -len(x[0]),
+        )
+        self.max_labels = max_labels
+        self.second_label_ratio = second_label_ratio
+        self._lock = threading.Lock()
+        self._latency_us: Deque[float] = deque(maxlen=sample_size)
+        self._agreement: Deque[Dict[str, float]] = deque(maxlen=sample_size)
+        self._counters: Dict[str, int] = {"calls": 0, "noCue": 0, "fallbacks": 0}
+
+    def scores(self, text: str) -> Tuple[Dict[str, float], List[str]]:
+        """라벨별 점수와 매칭된 원문 단어 목록
+
+        단서가 여러 번 나오면 부정되지 않은 출현이 하나라도 있을 때 센다.
+        """
+        text = (text or "").lower()
+        scores: Dict[str, float] = {}
+        matched: List[str] = []
+        for cue, label, weight in self._cues:
+            for m in re.finditer(re.escape(cue), text):
+                tail = text[m.end(): m.end() + _NEGATION_SPAN]
+                if any(neg in tail for neg in _NEGATIONS):
+                    continue
+                scores[label] = scores.get(label, 0.0) + weight
+                word = _surface_word(text, m.start(), m.end())
+                if word and word not in matched:
+                    matched.append(word)
+                break
+        return scores, matched
+
+    def predict(self, text: str) -> Tuple[List[str], float, List[str]]:
+        """(감정 1~2개, 신뢰도 0~1, 매칭된 원문 단어)"""
+        started = time.perf_counter()
+        scores, matched = self.scores(text)
+        if scores:
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.labels.index(kv[0])))
+            top = ranked[0][1]
+            labels = [label for label, s in ranked[: self.max_labels] if s >= top * self.second_label_ratio]
+            confidence = round(top / (sum(scores.values()) or 1.0), 3)
+        else:
+            labels, confidence = [DEFAULT_EMOTION], 0.0
+        with self._lock:
+            self._counters["calls"] += 1
+            if not scores:
+                self._counters["noCue"] += 1
+            self._latency_us.append((time.perf_counter() - started) * 1e6)
+        return labels, confidence, matched
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """Gemini 분석 결과와 같은 형태의 로컬 결과(추천곡 없음)"""
+        labels, confidence, matched = self.predict(text)
+        return {
+            "emotion": ", ".join(labels),
+            "emotions": labels,
+            "keywords": matched[:3],
+            "comfort_message": COMFORT_MESSAGES.get(labels[0], COMFORT_MESSAGES[DEFAULT_EMOTION]),
+            "recommendations": [],
+            "source": "local",
+            "confidence": confidence,
+        }
+
+    # ---- 평가 ----
+    def record_agreement(self, local: Sequence[str], reference: Sequence[str]) -> None:
+        if not reference:
+            return
+        with self._lock:
+            self._agreement.append(agreement(local, reference))
+
+    def record_fallback(self) -> None:
+        with self._lock:
+            self._counters["fallbacks"] += 1
+
+    def evaluate(self, samples: Iterable[Tuple[str, Sequence[str]]]) -> Dict[str, Any]:
+        """(프롬프트, Gemini 감정 목록) 쌍에 대한 일치율. history 기록으로 오프라인 평가에 사용"""
+        rows: List[Dict[str, float]] = []
+        latencies: List[float] = []
+        for text, reference in samples:
+            if not text or not reference:
+                continue
+            t0 = time.perf_counter()
+            labels, _, _ = self.predict(text)
+            latencies.append((time.perf_counter() - t0) * 1e6)
+            rows.append(agreement(labels, list(reference)))
+        return {"samples": len(rows), **_mean_metrics(rows), "latencyUs": _summarize_us(latencies)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "labels": len(self.labels),
+                "cues": len(self._cues),
+                "latencyUs": _summarize_us(self._latency_us),
+                "onlineAgreement": {"samples": len(self._agreement), **_mean_metrics(self._agreement)},
+                **self._counters,
+            }
+
+
+def _mean_metrics(rows: Iterable[Dict[str, float]]) -> Dict[str, float]:
+    rows = list(rows)
+    if not rows:
+        return {"top1": 0.0, "top1InReference": 0.0, "overlap": 0.0, "jaccard": 0.0}
+    return {key: round(sum(r[key] for r in rows) / len(rows), 3) for key in rows[0]}
+
+
+def _summarize_us(samples: Iterable[float]) -> Dict[str, float]:
+    data = sorted(samples)
+    if not data:
+        return {"count": 0, "avg": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "count": len(data),
+        "avg": round(sum(data) / len(data), 1),
+        "p95": round(data[int(0.95 * (len(data) - 1))], 1),
+        "max": round(data[-1], 1),
+    }
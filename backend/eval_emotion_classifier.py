@@ -0,0 +1,75 @@
+# 파일: backend\eval_emotion_classifier.py
+# 로컬 감정 분류기(emotion_classifier)와 Gemini 분석 결과의 일치율 평가
+#   python eval_emotion_classifier.py              # Firestore history 컬렉션 사용
+#   python eval_emotion_classifier.py export.json  # history 내보내기 파일(JSON 배열 또는 JSONL) 사용
+# 각 기록의 prompt와 emotions(Gemini 결과)를 비교한다. 로컬 대체 결과(source == "local")는 제외.
+import json
+import os
+import sys
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from emotion_classifier import LocalEmotionClassifier
+
+
+def load_history_file(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def load_history_firestore() -> List[Dict[str, Any]]:
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    cred_path = os.path.join(backend_dir, "khtml-a34cf-firebase-adminsdk-fbsvc-47f919b324.json")
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        firebase_admin.initialize_app(credentials.Certificate(cred_path))
+    db = firestore.client()
+    return [doc.to_dict() for doc in db.collection("history").stream()]
+
+
+def to_samples(rows: List[Dict[str, Any]]) -> List[Tuple[str, List[str]]]:
+    samples = []
+    for row in rows:
+        if row.get("source") == "local":
+            continue
+        emotions = row.get("emotions") or [e.strip() for e in str(row.get("emotion") or "").split(",") if e.strip()]
+        if row.get("prompt") and emotions:
+            samples.append((str(row["prompt"]), list(emotions)))
+    return samples
+
+
+def main() -> None:
+    rows = load_history_file(sys.argv[1]) if len(sys.argv) > 1 else load_history_firestore()
+    samples = to_samples(rows)
+    if not samples:
+        print("평가할 history 기록이 없습니다.")
+        return
+
+    classifier = LocalEmotionClassifier()
+    report = classifier.evaluate(samples)
+    print(f"samples: {report['samples']}")
+    for key in ("top1", "top1InReference", "overlap", "jaccard"):
+        print(f"  {key:<16}{report[key]:.3f}")
+    print(f"  latency us      avg={report['latencyUs']['avg']} p95={report['latencyUs']['p95']} "
+          f"max={report['latencyUs']['max']}")
+
+    # 가장 많이 어긋난 (Gemini 1순위 -> 로컬 1순위) 조합
+    confusions: Counter = Counter()
+    for text, reference in samples:
+        labels, _, _ = classifier.predict(text)
+        if labels[0] != reference[0]:
+            confusions[(reference[0], labels[0])] += 1
+    print("top confusions (gemini -> local):")
+    for (ref, got), count in confusions.most_common(10):
+        print(f"  {ref} -> {got}: {count}")
+
+
+if __name__ == "__main__":
+    main()
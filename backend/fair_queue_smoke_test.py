@@ -0,0 +1,70 @@
+# 파일: backend\fair_queue_smoke_test.py
+# 한 사용자가 요청을 몰아 보낼 때(편중 부하) 다른 사용자의 대기 시간을 FIFO 대기열과 사용자별 공정 대기열로 비교하고,
+# 사용자별 대기 자리 제한과 토큰 버킷 요청 제한을 확인한다. (API 키 불필요)
+import time
+from typing import Dict, List
+
+from gemini_runtime import GeminiBusyError, GeminiWorkerPool, fair_share
+from rate_limit import TokenBucketLimiter
+
+SERVICE_SEC = 0.05
+HEAVY_CALLS = 40
+LIGHT_USERS = ["light-1", "light-2", "light-3", "light-4"]
+
+
+def fake_call() -> float:
+    time.sleep(SERVICE_SEC)
+    return time.perf_counter()
+
+
+def light_user_waits(fair: bool) -> List[float]:
+    """heavy 사용자가 먼저 HEAVY_CALLS개를 넣은 뒤 light 사용자들이 한 건씩 넣었을 때 light 요청의 완료 시간(초)"""
+    pool = GeminiWorkerPool(workers=2, queue_size=64, name="fair" if fair else "fifo")
+    heavy = []
+    with fair_share("heavy"):
+        for _ in range(HEAVY_CALLS):
+            heavy.append(pool.submit(fake_call))
+    submitted: Dict[str, tuple] = {}
+    for user in LIGHT_USERS:
+        # FIFO 비교용: 모두 같은 키로 넣으면 기존 단일 대기열과 같은 순서
+        with fair_share(user if fair else "heavy"):
+            submitted[user] = (time.perf_counter(), pool.submit(fake_call))
+    waits = [pool.wait(job, timeout_sec=10) - started for started, job in submitted.values()]
+    for job in heavy:
+        pool.wait(job, timeout_sec=10)
+    return waits
+
+
+fifo = light_user_waits(fair=False)
+fair = light_user_waits(fair=True)
+print("light_wait_fifo_sec:", [round(w, 2) for w in fifo])
+print("light_wait_fair_sec:", [round(w, 2) for w in fair])
+assert max(fair) < max(fifo) / 4, "공정 대기열에서는 light 사용자가 heavy 사용자의 대기열 뒤에 줄 서지 않아야 합니다."
+assert max(fair) < SERVICE_SEC * (len(LIGHT_USERS) + 2), "light 요청은 몇 건의 처리 시간 안에 끝나야 합니다."
+
+# 사용자별 대기 자리 제한: heavy 사용자가 자기 몫을 다 쓰면 그 사용자만 거절됨
+pool = GeminiWorkerPool(workers=1, queue_size=16, per_key_queue_size=3, name="per-user")
+rejected = 0
+with fair_share("heavy"):
+    for _ in range(10):
+        try:
+            pool.submit(fake_call)
+        except GeminiBusyError:
+            rejected += 1
+with fair_share("light-1"):
+    light_job = pool.submit(fake_call)
+print("per_user_rejected:", rejected, pool.stats()["queuedKeys"], "keys queued")
+assert rejected >= 6, "heavy 사용자는 자기 대기 자리(3)를 넘는 요청부터 거절되어야 합니다."
+pool.wait(light_job, timeout_sec=5)
+
+# 토큰 버킷: burst 이후 heavy 사용자는 429(Retry-After) 대상, light 사용자는 영향 없음
+limiter = TokenBucketLimiter(rate_per_min=6, burst=5)
+heavy_results = [limiter.acquire("heavy") for _ in range(30)]
+light_results = [limiter.acquire(user) for user in LIGHT_USERS]
+allowed = sum(ok for ok, _ in heavy_results)
+retry_after = max(wait for _, wait in heavy_results)
+print("heavy_allowed:", allowed, "retry_after_sec:", retry_after)
+print("limiter:", limiter.stats())
+assert allowed == 5 and 1 <= retry_after <= 10
+assert all(ok for ok, _ in light_results)
+print("ok")
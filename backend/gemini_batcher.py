@@ -0,0 +1,310 @@
+"""분석 프롬프트 마이크로 배칭
+
+짧은 시간 창(window_ms) 동안 들어온 프롬프트를 모아 한 번의 Gemini 요청으로 보내고,
+JSON 배열로 돌아온 결과를 각 요청에 나눠 준다. 배치 결과에서 특정 항목이 비었거나
+배치 호출 자체가 실패하면 해당 항목만 단건 호출로 다시 시도한다(항목별 오류 격리).
+
+배치는 전용 공정성 키(BATCH_FAIR_KEY)로 워커 풀에 들어가고, 단건 재시도는 요청한 사용자의 키로 들어간다.
+서킷 브레이커가 있으면 실제 모델 호출(배치/단건)마다 서킷을 확인하고 결과를 기록하며,
+유효 타임아웃을 호출에 넘긴다. 호출을 기다리던 항목이 모두 포기하면 풀 작업도 버린다.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from gemini_runtime import GeminiBusyError, GeminiWorkerPool, current_fair_key, fair_share, summarize_ms
+
+# 여러 사용자의 프롬프트를 묶은 배치 작업의 공정성 키
+BATCH_FAIR_KEY = "_batch"
+
+
+class _BatchItem:
+    __slots__ = ("prompt", "future", "enqueued_at", "fair_key", "abandoned", "call")
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.fair_key = current_fair_key()
+        self.abandoned = False  # 호출자가 기다리기를 포기함
+        self.call: Optional["_Call"] = None  # 이 항목을 처리 중인 모델 호출
+
+
+class _Call:
+    """풀에 제출한 모델 호출 하나(배치 또는 단건)와 그 결과를 기다리는 항목들"""
+
+    __slots__ = ("items", "job", "probe", "started", "recorded")
+
+    def __init__(self, items: List[_BatchItem], probe: bool):
+        self.items = items
+        self.job: Any = None
+        self.probe = probe
+        self.started = time.perf_counter()
+        self.recorded = False  # 서킷에 결과를 기록했는지
+
+
+class MicroBatcher:
+    """프롬프트를 모아 배치로 호출하는 수집기.
+
+    - run_batch(prompts, timeout_sec) -> 항목별 결과 목록(쓸 수 없는 항목은 None)
+    - run_single(prompt, timeout_sec) -> 단건 결과 (배치가 1개뿐이거나 항목 재시도 시 사용)
+    둘 다 공유 워커 풀에서 실행되므로 동시 호출 상한과 대기열 제한이 그대로 적용된다.
+    배치 키는 풀 전체 대기 자리를 쓸 수 있고, 한 차례에 max_items개까지 배정받는다(배치 하나가 여러 사용자 몫).
+    """
+
+    def __init__(
+        self,
+        pool: GeminiWorkerPool,
+        run_batch: Callable[[List[str], Optional[float]], List[Optional[Dict[str, Any]]]],
+        run_single: Callable[[str, Optional[float]], Dict[str, Any]],
+        window_ms: int = 100,
+        max_items: int = 8,
+        item_timeout_sec: float = 120,
+        sample_size: int = 200,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.pool = pool
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.window_sec = max(1, int(window_ms)) / 1000.0
+        self.max_items = max(1, int(max_items))
+        # 호출 타임아웃 상한. 이 시간이 지난 항목은 호출자가 이미 포기했으므로 단건 재시도하지 않음
+        self.item_timeout_sec = item_timeout_sec
+        self.breaker = breaker
+        pool.configure_key(BATCH_FAIR_KEY, queue_size=pool.queue_size, turns=self.max_items)
+        self._pending: "queue.Queue[_BatchItem]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._sample_size = sample_size
+        # 배치 크기별 배치 호출 지연(초)
+        self._latency_by_size: Dict[int, Deque[float]] = {}
+        # 항목이 창에 모이는 동안 기다린 시간(초)
+        self._collect_samples: Deque[float] = deque(maxlen=sample_size)
+        self._counters: Dict[str, int] = {
+            "items": 0,
+            "batches": 0,
+            "batchedItems": 0,
+            "singleCalls": 0,
+            "itemFallbacks": 0,
+            "batchFailures": 0,
+            "skippedCancelled": 0,
+            "abandonedCalls": 0,
+            "shortCircuited": 0,
+        }
+        # 진행 중인 모델 호출(포기한 항목 찾기용)
+        self._calls: set = set()
+        self._thread = threading.Thread(target=self._collector_loop, name="gemini-batcher", daemon=True)
+        self._thread.start()
+
+    # ---- 호출 ----
+    def submit(self, prompt: str) -> Future:
+        item = _BatchItem(prompt)
+        with self._lock:
+            self._counters["items"] += 1
+        self._pending.put(item)
+        return item.future
+
+    def call(self, prompt: str, timeout_sec: float) -> Dict[str, Any]:
+        future = self.submit(prompt)
+        try:
+            return future.result(timeout=timeout_sec)
+        except FuturesTimeoutError:
+            # 아직 배치로 보내지지 않았다면 취소되어 배치에서 빠진다
+            if not future.cancel():
+                self._give_up(future)
+            raise
+
+    def _give_up(self, future: Future) -> None:
+        # 이미 보낸 항목: 같은 호출을 기다리는 항목이 모두 포기했으면 풀 작업도 버림
+        with self._lock:
+            item = next((i for c in self._calls for i in c.items if i.future is future), None)
+            if item is None:
+                return
+            item.abandoned = True
+            call = item.call
+            if call is None or call.job is None or not all(i.abandoned for i in call.items):
+                return
+        self._abandon_call(call)
+
+    def _abandon_call(self, call: _Call) -> None:
+        if not self.pool.abandon(call.job):
+            return
+        with self._lock:
+            self._counters["abandonedCalls"] += 1
+            self._calls.discard(call)
+        # 실행 중에 버린 작업은 완료 콜백이 오지 않으므로 여기서 시간 초과로 기록(시험 호출 자리도 반환)
+        self._record(call, timeout=True)
+
+    # ---- 서킷 ----
+    def _begin(self, items: List[_BatchItem]) -> Optional[_Call]:
+        """서킷이 허용하면 호출 기록을 만든다. 거절되면 항목을 CircuitOpenError로 끝내고 None"""
+        probe = False
+        if self.breaker is not None:
+            try:
+                probe = self.breaker.before_call()
+            except CircuitOpenError as exc:
+                with self._lock:
+                    self._counters["shortCircuited"] += 1
+                for item in items:
+                    item.future.set_exception(exc)
+                return None
+        call = _Call(items, probe)
+        with self._lock:
+            for item in items:
+                item.call = call
+            self._calls.add(call)
+        return call
+
+    def _timeout_sec(self) -> float:
+        if self.breaker is None:
+            return self.item_timeout_sec
+        return min(self.item_timeout_sec, self.breaker.effective_timeout_sec())
+
+    def _record(self, call: _Call, fut: Optional[Future] = None, timeout: bool = False, ignored: bool = False) -> None:
+        with self._lock:
+            if call.recorded:
+                return
+            call.recorded = True
+            self._calls.discard(call)
+        if self.breaker is None:
+            return
+        if ignored or (fut is not None and fut.cancelled()):
+            self.breaker.record_ignored(probe=call.probe)
+        elif timeout or (fut is not None and fut.exception() is not None):
+            timed_out = timeout or isinstance(fut.exception(), FuturesTimeoutError)
+            self.breaker.record_failure(timeout=timed_out, probe=call.probe)
+        else:
+            self.breaker.record_success(time.perf_counter() - call.started, probe=call.probe)
+
+    def _submit(self, call: _Call, fn: Callable[..., Any], arg: Any, fair_key: str) -> bool:
+        """호출을 풀에 넣는다. 대기열이 가득 차면 항목을 GeminiBusyError로 끝내고 False"""
+        try:
+            with fair_share(fair_key):
+                job = self.pool.submit(fn, arg, self._timeout_sec())
+        except GeminiBusyError as exc:
+            self._record(call, ignored=True)
+            for item in call.items:
+                item.future.set_exception(exc)
+            return False
+        with self._lock:
+            call.job = job
+            everyone_gone = all(i.abandoned for i in call.items)
+        if everyone_gone:
+            self._abandon_call(call)
+        return True
+
+    # ---- 수집/전송 ----
+    def _collector_loop(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.window_sec
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._dispatch(batch)
+            except Exception as exc:  # 수집 스레드는 어떤 경우에도 멈추지 않음
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+
+    def _dispatch(self, batch: List[_BatchItem]) -> None:
+        now = time.perf_counter()
+        live: List[_BatchItem] = []
+        for item in batch:
+            # 호출자가 이미 포기(취소)한 항목은 제외하고, 나머지는 더 이상 취소되지 않게 고정
+            if item.future.set_running_or_notify_cancel():
+                live.append(item)
+                with self._lock:
+                    self._collect_samples.append(now - item.enqueued_at)
+            else:
+                with self._lock:
+                    self._counters["skippedCancelled"] += 1
+        if not live:
+            return
+        if len(live) == 1:
+            self._run_single(live[0])
+            return
+
+        call = self._begin(live)
+        if call is None:
+            return
+        if not self._submit(call, self.run_batch, [item.prompt for item in live], BATCH_FAIR_KEY):
+            return
+        with self._lock:
+            self._counters["batches"] += 1
+            self._counters["batchedItems"] += len(live)
+        call.job.future.add_done_callback(lambda f: self._on_batch_done(call, f))
+
+    def _on_batch_done(self, call: _Call, fut: Future) -> None:
+        self._record(call, fut)
+        live = call.items
+        elapsed = time.perf_counter() - call.started
+        results: List[Optional[Dict[str, Any]]] = [None] * len(live)
+        if fut.cancelled() or fut.exception() is not None:
+            print(f"[DEBUG] Gemini batch call failed, falling back to single calls: "
+                  f"{None if fut.cancelled() else fut.exception()}")
+            with self._lock:
+                self._counters["batchFailures"] += 1
+        else:
+            got = fut.result() or []
+            results = (list(got) + [None] * len(live))[: len(live)]
+        with self._lock:
+            samples = self._latency_by_size.setdefault(len(live), deque(maxlen=self._sample_size))
+            samples.append(elapsed)
+
+        for item, result in zip(live, results):
+            if result:
+                item.future.set_result(result)
+            elif item.abandoned or time.perf_counter() - item.enqueued_at >= self.item_timeout_sec:
+                item.future.set_exception(FuturesTimeoutError())
+            else:
+                # 이 항목만 단건 호출로 다시 시도(다른 항목 결과에는 영향 없음)
+                with self._lock:
+                    self._counters["itemFallbacks"] += 1
+                self._run_single(item)
+
+    def _run_single(self, item: _BatchItem) -> None:
+        with self._lock:
+            self._counters["singleCalls"] += 1
+        call = self._begin([item])
+        if call is None:
+            return
+        # 단건 호출은 요청한 사용자의 대기열로
+        if not self._submit(call, self.run_single, item.prompt, item.fair_key):
+            return
+
+        def _transfer(f: Future) -> None:
+            self._record(call, f)
+            if f.cancelled():
+                item.future.set_exception(FuturesTimeoutError())
+            elif f.exception() is not None:
+                item.future.set_exception(f.exception())
+            else:
+                item.future.set_result(f.result())
+
+        call.job.future.add_done_callback(_transfer)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = self._counters["batches"]
+            return {
+                "windowMs": int(self.window_sec * 1000),
+                "maxItems": self.max_items,
+                "pending": self._pending.qsize(),
+                "avgBatchSize": round(self._counters["batchedItems"] / batches, 2) if batches else 0.0,
+                "collectWaitMs": summarize_ms(self._collect_samples),
+                "latencyMsByBatchSize": {
+                    str(size): summarize_ms(samples)
+                    for size, samples in sorted(self._latency_by_size.items())
+                },
+                **self._counters,
+            }
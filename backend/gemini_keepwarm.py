@@ -0,0 +1,163 @@
+"""Gemini 연결 keep-warm 루프
+
+트래픽이 적을 때 주기적으로 짧은 ping 호출을 보내 채널/연결이 식지 않게 한다.
+- ping은 워커 풀의 저우선 레인으로 보내며, 풀이 완전히 한가할 때만 보낸다(사용자 호출과 경쟁하지 않음).
+- 최근 간격 안에 실제 호출이 성공했다면 이미 연결이 살아 있으므로 건너뛴다.
+- 오래 트래픽이 없으면 간격을 max_interval_sec까지 늘리고, 실패하면 지수적으로 늘린다.
+- 연속 실패가 reset_after_failures번이면 reset()으로 클라이언트를 다시 만든다.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from gemini_runtime import GeminiBusyError, GeminiWorkerPool
+
+
+class GeminiKeepWarm:
+    def __init__(
+        self,
+        pool: GeminiWorkerPool,
+        ping: Callable[[float], Any],
+        reset: Callable[[], None],
+        on_ready: Optional[Callable[[bool], None]] = None,
+        interval_sec: float = 60,
+        max_interval_sec: float = 600,
+        idle_after_sec: float = 1800,
+        timeout_sec: float = 10,
+        reset_after_failures: int = 2,
+    ):
+        self.pool = pool
+        self.ping = ping
+        self.reset = reset
+        self.on_ready = on_ready
+        self.interval_sec = interval_sec
+        self.max_interval_sec = max(interval_sec, max_interval_sec)
+        self.idle_after_sec = idle_after_sec
+        self.timeout_sec = timeout_sec
+        self.reset_after_failures = max(1, reset_after_failures)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ready = False
+        self._last_success = 0.0  # time.time() 기준(ping 또는 실제 호출)
+        self._last_traffic = 0.0  # 실제 사용자 호출 성공 시각
+        self._last_ping = 0.0
+        self._failures = 0
+        self._next_interval = interval_sec
+        self._counters: Dict[str, int] = {
+            "pings": 0,
+            "pingFailures": 0,
+            "resets": 0,
+            "skippedTraffic": 0,
+            "skippedBusy": 0,
+        }
+
+    # ---- 상태 ----
+    def _set_ready(self, ready: bool) -> None:
+        changed = ready != self.ready
+        self.ready = ready
+        if changed:
+            print(f"[DEBUG] Gemini ready={ready}")
+        if self.on_ready is not None:
+            self.on_ready(ready)
+
+    def note_success(self) -> None:
+        """실제 호출 성공. 다음 ping을 미루는 근거가 된다"""
+        now = time.time()
+        with self._lock:
+            self._last_success = now
+            self._last_traffic = now
+            self._failures = 0
+        if not self.ready:
+            self._set_ready(True)
+
+    # ---- 루프 ----
+    def _interval(self, now: float) -> float:
+        with self._lock:
+            if self._failures:
+                return min(self.max_interval_sec, self.interval_sec * (2 ** self._failures))
+            if now - self._last_traffic >= self.idle_after_sec:
+                return self.max_interval_sec
+            return self.interval_sec
+
+    def _ping_once(self) -> bool:
+        job = self.pool.submit_low_priority(self.ping, self.timeout_sec)
+        try:
+            self.pool.wait(job, self.timeout_sec)
+            return True
+        except Exception as exc:  # 타임아웃(FuturesTimeoutError) 포함
+            print(f"[DEBUG] Gemini keep-warm ping failed: {exc!r}")
+            return False
+
+    def tick(self) -> str:
+        """한 번 점검한다. 결과: ping_ok / ping_failed / skipped_traffic / skipped_busy"""
+        now = time.time()
+        with self._lock:
+            warm_by_traffic = bool(self._last_ping) and now - self._last_traffic < self.interval_sec
+        if warm_by_traffic:
+            with self._lock:
+                self._counters["skippedTraffic"] += 1
+            return "skipped_traffic"
+        if not self.pool.is_idle():
+            with self._lock:
+                self._counters["skippedBusy"] += 1
+            return "skipped_busy"
+        try:
+            ok = self._ping_once()
+        except GeminiBusyError:
+            with self._lock:
+                self._counters["skippedBusy"] += 1
+            return "skipped_busy"
+        reset = False
+        with self._lock:
+            self._last_ping = time.time()
+            self._counters["pings"] += 1
+            if ok:
+                self._failures = 0
+                self._last_success = self._last_ping
+            else:
+                self._failures += 1
+                self._counters["pingFailures"] += 1
+                reset = self._failures % self.reset_after_failures == 0
+                if reset:
+                    self._counters["resets"] += 1
+        if reset:
+            print("[DEBUG] Gemini keep-warm: recreating client after repeated ping failures")
+            try:
+                self.reset()
+            except Exception as exc:
+                print(f"[DEBUG] Gemini client reset failed: {exc!r}")
+        self._set_ready(ok)
+        return "ping_ok" if ok else "ping_failed"
+
+    def _loop(self) -> None:
+        # 기동 직후 한 번 웜업한 뒤 적응형 간격으로 반복
+        while not self._stop.is_set():
+            self.tick()
+            if self.interval_sec <= 0:
+                return
+            interval = self._interval(time.time())
+            with self._lock:
+                self._next_interval = interval
+            self._stop.wait(interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="gemini-keepwarm", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "enabled": self.interval_sec > 0,
+                "intervalSec": self._next_interval,
+                "lastSuccessAgoSec": round(now - self._last_success, 1) if self._last_success else None,
+                "lastPingAgoSec": round(now - self._last_ping, 1) if self._last_ping else None,
+                "consecutiveFailures": self._failures,
+                **self._counters,
+            }
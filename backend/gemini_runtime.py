@@ -0,0 +1,467 @@
+"""Gemini 호출 런타임
+
+앱 전체가 공유하는 고정 크기 워커 풀에서 Gemini 호출을 실행한다.
+요청 스레드가 느린 모델 호출에 묶이지 않도록 데드라인 기반으로 기다리고,
+대기열이 가득 차면 즉시 거절(backpressure)한다.
+지연 꼬리를 줄이기 위한 헤지(hedged) 호출도 제공한다.
+대기열은 사용자(공정성 키)별로 나뉘어 라운드 로빈으로 꺼내지므로, 한 사용자가 요청을
+몰아 보내도 다른 사용자의 호출이 그 뒤에 줄 서지 않는다.
+"""
+import contextlib
+import contextvars
+import math
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as FuturesTimeoutError, wait as futures_wait
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+# 현재 요청의 공정성 키(보통 사용자 uid). 키 없이 제출된 호출은 DEFAULT_FAIR_KEY로 묶인다
+DEFAULT_FAIR_KEY = "_shared"
+_FAIR_KEY: "contextvars.ContextVar[str]" = contextvars.ContextVar("gemini_fair_key", default=DEFAULT_FAIR_KEY)
+
+
+def current_fair_key() -> str:
+    """지금 제출하면 쓰일 공정성 키(다른 스레드로 넘겨 같은 대기열에 넣을 때 사용)"""
+    return _FAIR_KEY.get()
+
+
+@contextlib.contextmanager
+def fair_share(key: Optional[str]) -> Iterator[None]:
+    """이 블록에서 제출되는 풀 작업을 key의 대기열에 넣는다."""
+    token = _FAIR_KEY.set(key or DEFAULT_FAIR_KEY)
+    try:
+        yield
+    finally:
+        _FAIR_KEY.reset(token)
+
+
+class GeminiBusyError(Exception):
+    """대기열이 가득 차 새 호출을 받을 수 없을 때 발생 (retry_after_sec 후 재시도 권장)"""
+
+    def __init__(self, message: str, retry_after_sec: int = 1):
+        super().__init__(message)
+        self.retry_after_sec = retry_after_sec
+
+
+def summarize_ms(samples: Deque[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "count": n,
+        "avg": round(sum(ordered) / n * 1000, 1),
+        "p50": round(ordered[int(0.50 * (n - 1))] * 1000, 1),
+        "p95": round(ordered[int(0.95 * (n - 1))] * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+class _FairQueue:
+    """키별 FIFO 대기열을 라운드 로빈으로 꺼내는 공정 대기열.
+
+    전체 용량(maxsize)과 키별 용량(per_key_max)을 넘으면 queue.Full을 던진다.
+    configure_key()로 특정 키(예: 여러 사용자를 묶은 배치)의 용량과 한 차례에 꺼낼 수(turns)를 따로 줄 수 있다.
+    저우선 레인(low)은 일반 대기열이 비어 있을 때만 꺼내며 용량(low_max)과 깊이를 따로 센다.
+    """
+
+    def __init__(self, maxsize: int, per_key_max: Optional[int] = None, low_max: int = 1):
+        self.maxsize = maxsize
+        self.per_key_max = per_key_max or maxsize
+        self.low_max = low_max
+        self._cond = threading.Condition()
+        # 순서 = 다음 차례. 꺼낸 키는 뒤로 보내고 비면 제거
+        self._queues: "OrderedDict[str, Deque[Any]]" = OrderedDict()
+        self._size = 0
+        self._low: Deque[Any] = deque()
+        self._limits: Dict[str, int] = {}
+        self._turns: Dict[str, int] = {}
+        self._streak = 0  # 맨 앞 키에서 이번 차례에 꺼낸 수
+
+    def configure_key(self, key: str, max_items: Optional[int] = None, turns: int = 1) -> None:
+        with self._cond:
+            if max_items is not None:
+                self._limits[key] = max(1, min(int(max_items), self.maxsize))
+            self._turns[key] = max(1, int(turns))
+
+    def put_nowait(self, item: Any, key: str, low: bool = False) -> None:
+        with self._cond:
+            if low:
+                if len(self._low) >= self.low_max:
+                    raise queue.Full
+                self._low.append(item)
+                self._cond.notify()
+                return
+            pending = self._queues.get(key)
+            limit = self._limits.get(key, self.per_key_max)
+            if self._size >= self.maxsize or (pending is not None and len(pending) >= limit):
+                raise queue.Full
+            if pending is None:
+                pending = self._queues[key] = deque()
+            pending.append(item)
+            self._size += 1
+            self._cond.notify()
+
+    def get(self) -> Any:
+        with self._cond:
+            while not self._size and not self._low:
+                self._cond.wait()
+            if not self._size:
+                return self._low.popleft()
+            key, pending = next(iter(self._queues.items()))
+            item = pending.popleft()
+            self._streak += 1
+            if not pending:
+                del self._queues[key]
+                self._streak = 0
+            elif self._streak >= self._turns.get(key, 1):
+                self._queues.move_to_end(key)
+                self._streak = 0
+            self._size -= 1
+            return item
+
+    def qsize(self) -> int:
+        with self._cond:
+            return self._size
+
+    def keys(self) -> int:
+        with self._cond:
+            return len(self._queues)
+
+    def low_size(self) -> int:
+        with self._cond:
+            return len(self._low)
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "enqueued_at", "abandoned", "delivered")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.abandoned = False
+        self.delivered = False
+
+
+class GeminiWorkerPool:
+    """동시 실행 수(workers)와 대기열 길이(queue_size)가 고정된 장수명 워커 풀.
+
+    - 워커 스레드는 생성 시 한 번만 만들어지고 요청마다 생성/종료하지 않는다.
+    - 대기열이 가득 차면 submit이 즉시 GeminiBusyError를 던진다.
+    - 타임아웃 시 대기 중인 작업은 취소하고, 실행 중인 작업은 버려진(abandoned) 것으로
+      표시해 뒤늦게 도착한 결과를 폐기한다.
+    - 대기열은 공정성 키(fair_share)별로 라운드 로빈되며, 한 키가 차지할 수 있는
+      대기 자리는 per_key_queue_size개로 제한된다.
+    - 실행 중 수, 대기열 깊이, 대기/처리 시간을 stats()로 제공한다.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        queue_size: int = 16,
+        name: str = "gemini",
+        sample_size: int = 200,
+        per_key_queue_size: Optional[int] = None,
+    ):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.per_key_queue_size = max(1, min(int(per_key_queue_size or self.queue_size), self.queue_size))
+        self.name = name
+        self._queue = _FairQueue(self.queue_size, self.per_key_queue_size)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._abandoned = 0
+        self._wait_samples: Deque[float] = deque(maxlen=sample_size)
+        self._service_samples: Deque[float] = deque(maxlen=sample_size)
+        self._counters: Dict[str, int] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "rejected": 0,
+            "discarded": 0,
+            "lowPriority": 0,
+        }
+        self._threads: List[threading.Thread] = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f"{name}-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    # ---- 워커 ----
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                # 대기 중 취소된 작업은 건너뜀
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                started = time.perf_counter()
+                with self._lock:
+                    self._running += 1
+                    self._wait_samples.append(started - job.enqueued_at)
+                result: Any = None
+                error: Any = None
+                try:
+                    result = job.fn(*job.args, **job.kwargs)
+                except BaseException as exc:  # 결과와 동일하게 호출자에게 전달
+                    error = exc
+                # 전달 여부(delivered)와 abandoned 판정을 같은 락 안에서 정해 경합을 막는다
+                with self._lock:
+                    self._running -= 1
+                    self._service_samples.append(time.perf_counter() - started)
+                    self._counters["failed" if error is not None else "completed"] += 1
+                    if job.abandoned:
+                        self._abandoned -= 1
+                        self._counters["discarded"] += 1
+                    else:
+                        job.delivered = True
+                # 결과 설정은 락 밖에서 해 완료 콜백이 풀을 다시 호출해도 교착되지 않게 함
+                if job.delivered:
+                    if error is not None:
+                        job.future.set_exception(error)
+                    else:
+                        job.future.set_result(result)
+            except Exception as exc:  # 워커 스레드는 예기치 못한 오류에도 멈추지 않음
+                print(f"[DEBUG] {self.name} worker error: {exc!r}")
+
+    # ---- 호출 ----
+    def retry_after_sec(self) -> int:
+        """대기열이 비워질 때까지의 대략적인 시간(초). Retry-After 헤더에 사용"""
+        with self._lock:
+            samples = list(self._service_samples)
+        avg_service = (sum(samples) / len(samples)) if samples else 1.0
+        backlog = self._queue.qsize() + self.workers
+        return int(min(60, max(1, math.ceil(avg_service * backlog / self.workers))))
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> _Job:
+        job = _Job(fn, args, kwargs)
+        try:
+            self._queue.put_nowait(job, _FAIR_KEY.get())
+        except queue.Full:
+            with self._lock:
+                self._counters["rejected"] += 1
+            raise GeminiBusyError(
+                f"Gemini 대기열이 가득 찼습니다. (동시 {self.workers}, 대기 {self.queue_size}, "
+                f"사용자당 대기 {self.per_key_queue_size})",
+                retry_after_sec=self.retry_after_sec(),
+            )
+        with self._lock:
+            self._counters["submitted"] += 1
+        return job
+
+    def submit_low_priority(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> _Job:
+        """웜업 등 배경 작업용. 사용자 대기열이 비어 있을 때만 워커에 배정되고 queue_depth()에 잡히지 않음"""
+        job = _Job(fn, args, kwargs)
+        try:
+            self._queue.put_nowait(job, DEFAULT_FAIR_KEY, low=True)
+        except queue.Full:
+            raise GeminiBusyError("저우선 작업이 이미 대기 중입니다.", retry_after_sec=self.retry_after_sec())
+        with self._lock:
+            self._counters["lowPriority"] += 1
+        return job
+
+    def is_idle(self) -> bool:
+        """실행 중이거나 대기 중인 호출이 하나도 없는지(버려졌지만 아직 실행 중인 호출 포함)"""
+        with self._lock:
+            running = self._running
+        return running == 0 and self._queue.qsize() == 0 and self._queue.low_size() == 0
+
+    def abandon(self, job: _Job) -> bool:
+        """더 이상 결과를 기다리지 않는 작업을 정리한다.
+
+        대기 중이면 취소하고, 실행 중이면 버려진 것으로 표시해 결과를 폐기한다.
+        이미 끝난 작업이면 False를 반환한다.
+        """
+        with self._lock:
+            if job.future.done() or job.abandoned or job.delivered:
+                return False
+            self._counters["timeouts"] += 1
+            if job.future.cancel():
+                # 아직 대기열에 있던 작업: 워커가 꺼낼 때 건너뜀
+                self._counters["cancelled"] += 1
+            else:
+                job.abandoned = True
+                self._abandoned += 1
+            return True
+
+    def wait(self, job: _Job, timeout_sec: float) -> Any:
+        """작업 결과를 기다리고, timeout_sec가 지나면 즉시 TimeoutError를 던진다."""
+        try:
+            return job.future.result(timeout=timeout_sec)
+        except FuturesTimeoutError:
+            if self.abandon(job) or job.abandoned or job.future.cancelled():
+                raise
+            # 타임아웃 직후 결과가 도착한 경우에는 그대로 사용
+            return job.future.result()
+
+    def call(self, fn: Callable[..., Any], *args: Any, timeout_sec: float, **kwargs: Any) -> Any:
+        return self.wait(self.submit(fn, *args, **kwargs), timeout_sec)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def configure_key(self, key: str, queue_size: Optional[int] = None, turns: int = 1) -> None:
+        """공정성 키 하나의 대기 자리 수(기본 per_key_queue_size)와 한 차례에 배정받는 작업 수"""
+        self._queue.configure_key(key, queue_size, turns)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queueCapacity": self.queue_size,
+                "perKeyQueueCapacity": self.per_key_queue_size,
+                "queueDepth": self._queue.qsize(),
+                "queuedKeys": self._queue.keys(),
+                "lowPriorityDepth": self._queue.low_size(),
+                "inflight": self._running,
+                "abandoned": self._abandoned,
+                "waitMs": summarize_ms(self._wait_samples),
+                "serviceMs": summarize_ms(self._service_samples),
+                **self._counters,
+            }
+
+
+class GeminiHedger:
+    """헤지 호출: 첫 호출이 적응형 임계값(최근 지연의 p90 등) 안에 끝나지 않으면
+    같은 호출을 하나 더 보내고 먼저 끝난 결과를 사용한다. 진 쪽은 풀에서 취소/폐기된다.
+
+    - 추가 호출 비율은 최근 window개 호출 중 budget_ratio 이하로 제한
+    - 대기열에 작업이 쌓여 있으면(포화) 헤지하지 않음
+    - 표본이 min_samples보다 적으면 initial_delay_sec를 임계값으로 사용
+    """
+
+    def __init__(
+        self,
+        pool: GeminiWorkerPool,
+        percentile: float = 0.9,
+        budget_ratio: float = 0.1,
+        min_delay_sec: float = 0.5,
+        initial_delay_sec: float = 10.0,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.pool = pool
+        self.percentile = min(0.99, max(0.5, percentile))
+        self.budget_ratio = max(0.0, budget_ratio)
+        self.min_delay_sec = min_delay_sec
+        self.initial_delay_sec = initial_delay_sec
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        # 최근 호출별 헤지 여부(예산 계산용)
+        self._hedged_flags: Deque[bool] = deque(maxlen=window)
+        # 보냈지만 아직 _hedged_flags에 들어가지 않은(진행 중인) 헤지 수
+        self._reserved = 0
+        self._counters: Dict[str, int] = {
+            "calls": 0,
+            "hedgesSent": 0,
+            "hedgeWins": 0,
+            "primaryWins": 0,
+            "budgetDenied": 0,
+            "saturatedSkipped": 0,
+        }
+
+    def hedge_delay_sec(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_delay_sec
+        return max(self.min_delay_sec, samples[int(self.percentile * (len(samples) - 1))])
+
+    def _take_budget(self) -> bool:
+        """예산이 남아 있으면 헤지 1개 몫을 예약한다(동시 요청이 같은 자리를 함께 쓰지 않도록 락 안에서)"""
+        with self._lock:
+            window = max(len(self._hedged_flags), self.min_samples)
+            used = sum(self._hedged_flags) + self._reserved
+            if (used + 1) / window > self.budget_ratio:
+                self._counters["budgetDenied"] += 1
+                return False
+            self._reserved += 1
+            return True
+
+    def _release_budget(self) -> None:
+        with self._lock:
+            self._reserved -= 1
+
+    def call(self, fn: Callable[..., Any], *args: Any, timeout_sec: float, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout_sec
+        primary = self.pool.submit(fn, *args, **kwargs)
+        jobs: Dict[Future, _Job] = {primary.future: primary}
+        hedged = False
+
+        delay = min(self.hedge_delay_sec(), timeout_sec)
+        done, _ = futures_wait([primary.future], timeout=delay)
+        if not done and time.monotonic() < deadline:
+            if self.pool.queue_depth() > 0:
+                with self._lock:
+                    self._counters["saturatedSkipped"] += 1
+            elif self._take_budget():
+                try:
+                    backup = self.pool.submit(fn, *args, **kwargs)
+                    jobs[backup.future] = backup
+                    hedged = True
+                except GeminiBusyError:
+                    self._release_budget()
+
+        winner: Optional[_Job] = None
+        last_error: Optional[BaseException] = None
+        pending = set(jobs)
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = futures_wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for f in done:
+                    if f.cancelled():
+                        continue
+                    if f.exception() is None:
+                        winner = jobs[f]
+                        break
+                    last_error = f.exception()
+                if winner is not None:
+                    break
+        finally:
+            # 진 쪽(또는 타임아웃 시 전부)은 취소/폐기
+            for job in jobs.values():
+                if job is not winner:
+                    self.pool.abandon(job)
+
+        with self._lock:
+            self._counters["calls"] += 1
+            self._hedged_flags.append(hedged)
+            if hedged:
+                # 예약을 기록으로 옮김
+                self._reserved -= 1
+                self._counters["hedgesSent"] += 1
+            if winner is not None:
+                self._latencies.append(time.perf_counter() - started)
+                self._counters["primaryWins" if winner is primary else "hedgeWins"] += 1
+
+        if winner is not None:
+            return winner.future.result()
+        if last_error is not None and not pending:
+            raise last_error
+        raise FuturesTimeoutError()
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay_sec()
+        with self._lock:
+            window = len(self._hedged_flags)
+            return {
+                "percentile": self.percentile,
+                "budgetRatio": self.budget_ratio,
+                "hedgeDelayMs": round(delay * 1000, 1),
+                "recentHedgeRatio": round(sum(self._hedged_flags) / window, 3) if window else 0.0,
+                "hedgesInflight": self._reserved,
+                "latencyMs": summarize_ms(self._latencies),
+                **self._counters,
+            }
@@ -0,0 +1,56 @@
+# 파일: backend\gemini_timeout_smoke_test.py
+# 느리게 응답하는 가짜 모델로 GeminiWorkerPool의 타임아웃 컷오프와 대기열 거절을 확인한다. (API 키 불필요)
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from types import SimpleNamespace
+
+from gemini_runtime import GeminiBusyError, GeminiWorkerPool
+
+
+class SlowFakeModel:
+    def __init__(self, delay_sec: float):
+        self.delay_sec = delay_sec
+
+    def generate_content(self, prompt, request_options=None):
+        time.sleep(self.delay_sec)
+        return SimpleNamespace(text='{"emotions": ["피로"]}')
+
+
+model = SlowFakeModel(delay_sec=2.0)
+pool = GeminiWorkerPool(workers=1, queue_size=1, name="smoke")
+
+t0 = time.perf_counter()
+try:
+    pool.call(model.generate_content, "ping", timeout_sec=0.3)
+    raise AssertionError("타임아웃이 발생해야 합니다.")
+except FuturesTimeoutError:
+    elapsed = time.perf_counter() - t0
+print("timeout_elapsed_sec:", round(elapsed, 2))
+assert elapsed < 0.8, "타임아웃 직후 제어가 돌아와야 합니다."
+assert pool.stats()["abandoned"] == 1
+
+# 워커는 버려진 호출을 처리 중 → 하나는 대기열에 들어가고, 다음 호출은 즉시 거절되어야 함
+queued = pool.submit(model.generate_content, "ping")
+t0 = time.perf_counter()
+try:
+    pool.call(model.generate_content, "ping", timeout_sec=5)
+    raise AssertionError("대기열이 가득 차 거절되어야 합니다.")
+except GeminiBusyError as e:
+    print("rejected:", e, "retry_after:", e.retry_after_sec, "elapsed_ms:", int((time.perf_counter() - t0) * 1000))
+
+# 대기 중이던 호출은 타임아웃 시 취소되어 워커가 건너뜀
+try:
+    pool.wait(queued, timeout_sec=0.1)
+except FuturesTimeoutError:
+    pass
+print("after_timeouts:", pool.stats())
+assert pool.stats()["cancelled"] == 1
+
+# 버려진 호출이 끝나면 결과는 폐기되고 워커가 반환됨
+time.sleep(2.0)
+stats = pool.stats()
+print("after_drain:", stats)
+assert stats["abandoned"] == 0 and stats["discarded"] == 1 and stats["queueDepth"] == 0
+
+fast = SlowFakeModel(delay_sec=0.05)
+print("json:", pool.call(fast.generate_content, "ping", timeout_sec=1.0).text)
@@ -0,0 +1,113 @@
+"""Gemini 호출별 토큰/지연 기록
+
+호출마다 프롬프트 글자 수, 모델이 보고한 사용량(usage_metadata의 입력/출력 토큰), 지연,
+JSON 파싱 성공 여부, 음악 취향 포함 여부를 남긴다. 최근 호출만 호출 형태(kind + 취향 포함 여부)별로
+보관하고, stats()에서 구간별 히스토그램과 백분위로 요약한다.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# 히스토그램 구간 상한. 마지막 구간은 그 이상 전부
+CHAR_BUCKETS: List[int] = [64, 128, 256, 512, 1024, 2048, 4096, 8192]
+TOKEN_BUCKETS: List[int] = [32, 64, 128, 256, 512, 1024, 2048, 4096]
+LATENCY_BUCKETS_MS: List[int] = [250, 500, 1000, 2000, 4000, 8000, 16000, 32000]
+
+
+def usage_tokens(response: Any) -> Tuple[Optional[int], Optional[int]]:
+    """응답의 (입력 토큰, 출력 토큰). 사용량이 없으면 None"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None, None
+    prompt = getattr(usage, "prompt_token_count", None)
+    output = getattr(usage, "candidates_token_count", None)
+    return (int(prompt) if prompt is not None else None, int(output) if output is not None else None)
+
+
+def _histogram(values: List[float], buckets: List[int], unit: str = "") -> Dict[str, int]:
+    counts = [0] * (len(buckets) + 1)
+    for v in values:
+        counts[next((i for i, b in enumerate(buckets) if v <= b), len(buckets))] += 1
+    labels = [f"<={b}{unit}" for b in buckets] + [f">{buckets[-1]}{unit}"]
+    return dict(zip(labels, counts))
+
+
+def _summary(values: List[float], buckets: List[int], unit: str = "") -> Dict[str, Any]:
+    data = sorted(values)
+    if not data:
+        return {"count": 0}
+    return {
+        "count": len(data),
+        "avg": round(sum(data) / len(data), 1),
+        "p50": round(data[len(data) // 2], 1),
+        "p95": round(data[int(0.95 * (len(data) - 1))], 1),
+        "max": round(data[-1], 1),
+        "histogram": _histogram(data, buckets, unit),
+    }
+
+
+class GeminiUsageRecorder:
+    def __init__(self, sample_size: int = 500):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        # 호출 형태 -> 최근 기록
+        self._records: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    @staticmethod
+    def shape(kind: str, music_taste: bool) -> str:
+        return f"{kind}+taste" if music_taste else kind
+
+    def record(
+        self,
+        kind: str,
+        prompt_chars: int,
+        latency_sec: float,
+        response: Any = None,
+        parse_ok: Optional[bool] = None,
+        music_taste: bool = False,
+        error: bool = False,
+    ) -> None:
+        input_tokens, output_tokens = usage_tokens(response)
+        entry = {
+            "at": time.time(),
+            "promptChars": prompt_chars,
+            "inputTokens": input_tokens,
+            "outputTokens": output_tokens,
+            "latencyMs": latency_sec * 1000,
+            "parseOk": parse_ok,
+            "error": error,
+        }
+        key = self.shape(kind, music_taste)
+        with self._lock:
+            records = self._records.get(key)
+            if records is None:
+                records = self._records[key] = deque(maxlen=self.sample_size)
+                self._totals[key] = {"calls": 0, "errors": 0, "inputTokens": 0, "outputTokens": 0}
+            records.append(entry)
+            totals = self._totals[key]
+            totals["calls"] += 1
+            totals["errors"] += int(error)
+            totals["inputTokens"] += input_tokens or 0
+            totals["outputTokens"] += output_tokens or 0
+
+    def _shape_stats(self, records: List[Dict[str, Any]], totals: Dict[str, int]) -> Dict[str, Any]:
+        parsed = [r["parseOk"] for r in records if r["parseOk"] is not None]
+        return {
+            "recent": len(records),
+            "parseOkRate": round(sum(parsed) / len(parsed), 3) if parsed else None,
+            "promptChars": _summary([r["promptChars"] for r in records], CHAR_BUCKETS),
+            "inputTokens": _summary([r["inputTokens"] for r in records if r["inputTokens"] is not None], TOKEN_BUCKETS),
+            "outputTokens": _summary([r["outputTokens"] for r in records if r["outputTokens"] is not None], TOKEN_BUCKETS),
+            "latencyMs": _summary([r["latencyMs"] for r in records if not r["error"]], LATENCY_BUCKETS_MS, "ms"),
+            "totals": totals,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {k: (list(v), dict(self._totals[k])) for k, v in self._records.items()}
+        return {
+            "sampleSize": self.sample_size,
+            "shapes": {k: self._shape_stats(records, totals) for k, (records, totals) in sorted(snapshot.items())},
+        }
@@ -0,0 +1,291 @@
+"""모델 출력용 증분 JSON 파서
+
+스트리밍으로 도착하는 텍스트 조각을 순서대로 받아, 최상위 객체의 필드 값이
+완성되는 즉시 이벤트로 돌려준다. 배열 필드(recommendations 등)는 원소 하나가
+완성될 때마다 "<필드>[]" 이벤트도 함께 낸다.
+
+출력이 중간에 잘리거나 약간 어긋난 경우(코드펜스/앞뒤 설명문, 끝의 쉼표,
+문자열 안 개행, 닫히지 않은 괄호)에도 쓸 수 있는 필드를 최대한 살린다.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (필드명, 값). 배열 원소 이벤트는 필드명 뒤에 "[]"가 붙는다. 예: ("recommendations[]", {...})
+ParseEvent = Tuple[str, Any]
+
+_WS = " \t\r\n"
+_DECODER = json.JSONDecoder(strict=False)
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """문자열 밖에 있는 ',' 뒤에 곧바로 '}' 또는 ']'가 오면 쉼표를 제거한다."""
+    out: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "}]":
+            # 직전의 공백을 건너뛰고 쉼표가 있으면 제거
+            j = len(out) - 1
+            while j >= 0 and out[j] in _WS:
+                j -= 1
+            if j >= 0 and out[j] == ",":
+                del out[j]
+        out.append(ch)
+    return "".join(out)
+
+
+def loads_lenient(text: str) -> Any:
+    """json.loads + 가벼운 보정(문자열 안 제어문자 허용, 끝 쉼표 제거). 실패 시 ValueError"""
+    text = text.strip()
+    try:
+        return _DECODER.decode(text)
+    except ValueError:
+        return _DECODER.decode(_strip_trailing_commas(text))
+
+
+class IncrementalJSONParser:
+    """최상위 JSON 객체를 조각 단위로 읽어 필드가 완성될 때마다 이벤트를 낸다.
+
+    사용법:
+        parser = IncrementalJSONParser(item_fields=("recommendations",))
+        for chunk in stream:
+            for key, value in parser.feed(chunk):
+                ...
+        result = parser.finish()  # 잘린 출력에서도 복구 가능한 필드까지 포함
+    """
+
+    def __init__(self, item_fields: Iterable[str] = ("recommendations",)):
+        self.item_fields = set(item_fields)
+        self.fields: Dict[str, Any] = {}
+        self.items: Dict[str, List[Any]] = {}
+        self._buf = ""
+        self._pos = 0
+        # seek → key_or_end → key → colon → value_start → (value | scalar) → after_value → ... → done
+        self._state = "seek"
+        self._key: Optional[str] = None
+        self._key_start = 0
+        self._value_start = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._item_start: Optional[int] = None
+        self._item_is_string = False
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> List[ParseEvent]:
+        if not chunk or self._state == "done":
+            return []
+        self._buf += chunk
+        events: List[ParseEvent] = []
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+        while i < n:
+            c = buf[i]
+            state = self._state
+
+            if state == "seek":
+                # 코드펜스나 앞쪽 설명문은 첫 '{'까지 건너뜀
+                if c == "{":
+                    self._state = "key_or_end"
+
+            elif state == "key_or_end" or state == "after_value":
+                if c == '"':
+                    self._state = "key"
+                    self._key_start = i
+                    self._escape = False
+                elif c == "}":
+                    self._state = "done"
+                    break
+                # ',' / 공백 / 그 밖의 잡음은 건너뜀
+
+            elif state == "key":
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    try:
+                        self._key = loads_lenient(buf[self._key_start:i + 1])
+                    except ValueError:
+                        self._key = buf[self._key_start + 1:i]
+                    self._state = "colon"
+
+            elif state == "colon":
+                if c == ":":
+                    self._state = "value_start"
+                elif c not in _WS:
+                    # 콜론이 빠진 경우 값 시작으로 간주
+                    self._state = "value_start"
+                    continue
+
+            elif state == "value_start":
+                if c not in _WS:
+                    self._value_start = i
+                    self._stack = []
+                    self._in_string = False
+                    self._escape = False
+                    self._item_start = None
+                    if c in "{[":
+                        self._stack.append(c)
+                        self._state = "value"
+                    elif c == '"':
+                        self._in_string = True
+                        self._state = "value"
+                    else:
+                        self._state = "scalar"
+
+            elif state == "value":
+                self._scan_value_char(i, c, events)
+
+            elif state == "scalar":
+                if c in ",}" or c in _WS:
+                    self._complete_value(i - 1, events)
+                    self._state = "after_value"
+                    continue
+
+            i += 1
+        self._pos = i if self._state != "done" else n
+        return events
+
+    def _scan_value_char(self, i: int, c: str, events: List[ParseEvent]) -> None:
+        tracking_items = self._key in self.item_fields and self._stack[:1] == ["["]
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif c == "\\":
+                self._escape = True
+            elif c == '"':
+                self._in_string = False
+                if not self._stack:
+                    self._complete_value(i, events)
+                    self._state = "after_value"
+                elif tracking_items and len(self._stack) == 1 and self._item_is_string:
+                    self._complete_item(i, events)
+            return
+
+        # 배열 필드의 원소 시작 감지(깊이 1에서 처음 나오는 의미 있는 문자)
+        if tracking_items and len(self._stack) == 1 and self._item_start is None and c not in _WS + ",]":
+            self._item_start = i
+            self._item_is_string = c == '"'
+
+        if c == '"':
+            self._in_string = True
+        elif c in "{[":
+            self._stack.append(c)
+        elif c in "}]":
+            if self._stack:
+                self._stack.pop()
+            if tracking_items and len(self._stack) == 1 and self._item_start is not None:
+                self._complete_item(i, events)
+            elif tracking_items and not self._stack and self._item_start is not None:
+                # 숫자 등 스칼라 원소가 ']' 바로 앞에서 끝난 경우
+                self._complete_item(i - 1, events)
+            if not self._stack:
+                self._complete_value(i, events)
+                self._state = "after_value"
+        elif c == "," and tracking_items and len(self._stack) == 1 and self._item_start is not None:
+            self._complete_item(i - 1, events)
+
+    def _complete_item(self, end: int, events: List[ParseEvent]) -> None:
+        text = self._buf[self._item_start:end + 1]
+        self._item_start = None
+        if not text.strip():
+            return
+        try:
+            item = loads_lenient(text)
+        except ValueError:
+            return
+        self.items.setdefault(self._key, []).append(item)
+        events.append((f"{self._key}[]", item))
+
+    def _complete_value(self, end: int, events: List[ParseEvent]) -> None:
+        text = self._buf[self._value_start:end + 1]
+        try:
+            value = loads_lenient(text)
+        except ValueError:
+            # 배열 필드는 완성된 원소만이라도 살림
+            if self._key in self.items:
+                value = list(self.items[self._key])
+            else:
+                return
+        self.fields[self._key] = value
+        events.append((self._key, value))
+
+    # ---- 잘린 출력 복구 ----
+    def _recover_partial(self) -> Optional[Any]:
+        key = self._key
+        if self._state == "scalar":
+            try:
+                return loads_lenient(self._buf[self._value_start:])
+            except ValueError:
+                return None
+        if self._state != "value":
+            return None
+        # 배열 필드는 완성된 원소까지만 사용(마지막 반쪽짜리 원소는 버림)
+        if key in self.item_fields and self._stack[:1] == ["["]:
+            return list(self.items.get(key, [])) or None
+        text = self._buf[self._value_start:]
+        if self._in_string:
+            if self._escape:
+                text = text[:-1]
+            text += '"'
+        text = text.rstrip().rstrip(",")
+        closers = {"{": "}", "[": "]"}
+        text += "".join(closers[c] for c in reversed(self._stack))
+        try:
+            return loads_lenient(text)
+        except ValueError:
+            return None
+
+    def finish(self) -> Dict[str, Any]:
+        """지금까지 완성된 필드 + 잘린 마지막 필드에서 복구 가능한 값을 반환"""
+        result = dict(self.fields)
+        if self._state in ("value", "scalar") and self._key is not None and self._key not in result:
+            recovered = self._recover_partial()
+            if recovered is not None:
+                result[self._key] = recovered
+        return result
+
+
+def _strip_code_fence(text: str) -> str:
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+        if cleaned.lower().startswith("json"):
+            cleaned = cleaned[4:].strip()
+    return cleaned
+
+
+def parse_json_text(text: str, item_fields: Iterable[str] = ("recommendations",)) -> Dict[str, Any]:
+    """완성된 텍스트용. 정상 JSON은 json.loads 한 번으로 처리하고,
+    실패하면 증분 파서로 쓸 수 있는 필드를 복구한다. 최상위가 객체가 아니면 {}"""
+    if not text:
+        return {}
+    cleaned = _strip_code_fence(text)
+    first = cleaned.find("{")
+    last = cleaned.rfind("}")
+    if first != -1 and last > first:
+        try:
+            value = loads_lenient(cleaned[first:last + 1])
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+    parser = IncrementalJSONParser(item_fields=item_fields)
+    parser.feed(cleaned)
+    return parser.finish()
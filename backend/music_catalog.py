@@ -0,0 +1,214 @@
+"""로컬 음악 카탈로그
+
+(가수, 제목, 장르, 감정 태그) 목록을 감정별/감정+장르별 인덱스로 메모리에 올려 두고,
+분석된 감정과 사용자의 음악 취향 문장만으로 추천곡 3곡을 수 µs 안에 고른다.
+시드 파일(data/music_catalog.json)에서 시작해 history 컬렉션에 저장된 과거 추천곡으로
+계속 늘어난다. 카탈로그가 고른 곡에는 source="catalog"를 붙여 두고, 다시 읽을 때는 건너뛴다
+(자기가 고른 곡의 추천 횟수가 올라가 순위가 굳지 않도록).
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from analysis_cache import normalize_text
+
+# 카탈로그가 고른 추천곡 표시(history에서 다시 읽을 때 제외)
+CATALOG_SOURCE = "catalog"
+
+# 카탈로그 장르 → 음악 취향 문장에서 찾을 표현(소문자)
+GENRE_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "발라드": ("발라드", "ballad"),
+    "인디": ("인디", "indie", "홍대"),
+    "록": ("록", "락", "rock", "밴드"),
+    "힙합": ("힙합", "랩", "hiphop", "hip-hop", "rap"),
+    "R&B": ("r&b", "알앤비", "알엔비", "소울", "soul"),
+    "댄스": ("댄스", "dance", "edm"),
+    "K-POP": ("k-pop", "kpop", "케이팝", "아이돌"),
+    "팝": ("팝", "pop"),
+    "재즈": ("재즈", "jazz"),
+    "클래식": ("클래식", "classical", "피아노"),
+    "포크": ("포크", "folk", "어쿠스틱", "acoustic"),
+    "OST": ("ost", "드라마", "영화음악"),
+}
+
+# 감정 순서(첫 번째가 주 감정)별 가중치, 취향 장르 일치 가중치, 연관 감정 가중치
+_EMOTION_WEIGHTS = (2.0, 1.0)
+_GENRE_WEIGHT = 1.5
+_RELATED_WEIGHT = 0.5
+
+
+@functools.lru_cache(maxsize=1024)
+def detect_genres(music_taste: Optional[str]) -> Tuple[str, ...]:
+    taste = normalize_text(music_taste)
+    if not taste:
+        return ()
+    return tuple(genre for genre, aliases in GENRE_ALIASES.items() if any(a in taste for a in aliases))
+
+
+def _song_key(artist: str, title: str) -> str:
+    return f"{normalize_text(artist)}\x1f{normalize_text(title)}"
+
+
+def template_reason(song: Dict[str, Any], emotions: Sequence[str]) -> str:
+    kind = f"{song['genre']} 곡이에요" if song.get("genre") else "노래예요"
+    if not emotions:
+        return f"마음을 달래 줄 {kind}."
+    return f"지금의 {emotions[0]} 감정에 잘 어울리는 {kind}."
+
+
+class MusicCatalog:
+    def __init__(self, related: Optional[Dict[str, str]] = None, sample_size: int = 500):
+        # 태그가 부족한 감정(예: 부정 감정)은 연관 감정(예: 매핑된 긍정 감정)의 곡으로 보충
+        self.related = related or {}
+        self._lock = threading.Lock()
+        self._songs: List[Dict[str, Any]] = []
+        self._index: Dict[str, int] = {}
+        self._by_emotion: Dict[str, List[int]] = {}
+        self._by_emotion_genre: Dict[Tuple[str, str], List[int]] = {}
+        self._latency_us: Deque[float] = deque(maxlen=sample_size)
+        self._counters: Dict[str, int] = {"lookups": 0, "historyAdded": 0, "short": 0}
+
+    # ---- 적재 ----
+    def _tag(self, idx: int, emotion: str) -> None:
+        song = self._songs[idx]
+        if emotion in song["emotions"]:
+            return
+        song["emotions"].append(emotion)
+        self._by_emotion.setdefault(emotion, []).append(idx)
+        if song["genre"]:
+            self._by_emotion_genre.setdefault((emotion, song["genre"]), []).append(idx)
+
+    def add(self, artist: str, title: str, genre: str = "", emotions: Iterable[str] = ()) -> bool:
+        """곡 추가. 이미 있으면 감정 태그만 합치고 추천 횟수를 올린다. 새 곡이면 True"""
+        artist, title = str(artist or "").strip(), str(title or "").strip()
+        if not artist or not title:
+            return False
+        key = _song_key(artist, title)
+        with self._lock:
+            idx = self._index.get(key)
+            created = idx is None
+            if created:
+                idx = len(self._songs)
+                self._songs.append({"artist": artist, "title": title, "genre": genre or "", "emotions": [], "count": 0})
+                self._index[key] = idx
+            song = self._songs[idx]
+            if genre and not song["genre"]:
+                song["genre"] = genre
+                for emotion in song["emotions"]:
+                    self._by_emotion_genre.setdefault((emotion, genre), []).append(idx)
+            song["count"] += 1
+            for emotion in emotions:
+                if emotion:
+                    self._tag(idx, str(emotion).strip())
+        return created
+
+    def load_file(self, path: str) -> int:
+        """JSON 배열([{artist, title, genre, emotions}]) 적재. 추가된 곡 수"""
+        if not path or not os.path.exists(path):
+            print(f"[DEBUG] Music catalog not found: {path}")
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        added = sum(
+            self.add(r.get("artist"), r.get("title"), r.get("genre", ""), r.get("emotions") or [])
+            for r in rows if isinstance(r, dict)
+        )
+        print(f"[DEBUG] Music catalog loaded: {added} songs from {path}")
+        return added
+
+    def add_from_history(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """history 기록의 추천곡을 그 기록의 감정으로 태깅해 추가. 로컬 대체 결과와 카탈로그가 고른 곡은 제외"""
+        added = 0
+        for row in rows:
+            if not row or row.get("source") == "local":
+                continue
+            emotions = row.get("emotions") or []
+            for rec in row.get("recommendations") or []:
+                if not isinstance(rec, dict) or rec.get("source") == CATALOG_SOURCE:
+                    continue
+                if self.add(rec.get("artist"), rec.get("title"), rec.get("genre", ""), emotions):
+                    added += 1
+        if added:
+            with self._lock:
+                self._counters["historyAdded"] += added
+        return added
+
+    # ---- 추천 ----
+    def recommend(
+        self,
+        emotions: Sequence[str],
+        music_taste: Optional[str] = None,
+        k: int = 3,
+        exclude: Iterable[str] = (),
+    ) -> List[Dict[str, Any]]:
+        """감정 일치 > 취향 장르 일치 > 추천 횟수 순으로 k곡. 같은 가수는 가능하면 한 곡만"""
+        started = time.perf_counter()
+        genres = detect_genres(music_taste)
+        excluded = {normalize_text(t) for t in exclude}
+        scores: Dict[int, float] = {}
+        with self._lock:
+            for pos, emotion in enumerate(emotions[: len(_EMOTION_WEIGHTS)]):
+                weight = _EMOTION_WEIGHTS[pos]
+                for idx in self._by_emotion.get(emotion, ()):
+                    scores[idx] = scores.get(idx, 0.0) + weight
+                for genre in genres:
+                    for idx in self._by_emotion_genre.get((emotion, genre), ()):
+                        scores[idx] = scores.get(idx, 0.0) + _GENRE_WEIGHT
+            if len(scores) < k * 2:
+                for emotion in emotions:
+                    related = self.related.get(emotion)
+                    for idx in self._by_emotion.get(related, ()) if related else ():
+                        bonus = _GENRE_WEIGHT if self._songs[idx]["genre"] in genres else 0.0
+                        scores[idx] = scores.get(idx, 0.0) + _RELATED_WEIGHT + bonus * _RELATED_WEIGHT
+            ranked = sorted(scores, key=lambda i: (-scores[i], -self._songs[i]["count"], i))
+            picked: List[Dict[str, Any]] = []
+            picked_idx = set()
+            artists = set()
+            for strict in (True, False):
+                for idx in ranked:
+                    song = self._songs[idx]
+                    if len(picked) >= k:
+                        break
+                    if idx in picked_idx or (excluded and normalize_text(song["title"]) in excluded):
+                        continue
+                    if strict and song["artist"] in artists:
+                        continue
+                    picked.append(song)
+                    picked_idx.add(idx)
+                    artists.add(song["artist"])
+            result = [
+                {
+                    "artist": s["artist"],
+                    "title": s["title"],
+                    "genre": s["genre"],
+                    "reason": template_reason(s, emotions),
+                    "source": CATALOG_SOURCE,
+                }
+                for s in picked
+            ]
+            self._counters["lookups"] += 1
+            if len(result) < k:
+                self._counters["short"] += 1
+            self._latency_us.append((time.perf_counter() - started) * 1e6)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._songs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data = sorted(self._latency_us)
+            return {
+                "songs": len(self._songs),
+                "emotions": len(self._by_emotion),
+                "genres": sorted({s["genre"] for s in self._songs if s["genre"]}),
+                "latencyUs": {
+                    "avg": round(sum(data) / len(data), 1) if data else 0.0,
+                    "p95": round(data[int(0.95 * (len(data) - 1))], 1) if data else 0.0,
+                },
+                **self._counters,
+            }
@@ -0,0 +1,253 @@
+"""음악 추천 단계 (감정 분석과 분리)
+
+추천곡은 입력 문장이 아니라 (감정 조합, 음악 취향)에만 의존하므로 그 조합을 키로
+결과를 캐시한다. 오래된 항목은 그대로 돌려주면서 워커 풀이 한가할 때 백그라운드로
+다시 채운다(stale-while-revalidate). 같은 키로 동시에 들어온 요청은 호출 하나를 공유한다.
+백그라운드 갱신은 서킷이 닫혀 있을 때만 하고 결과를 서킷에 기록한다.
+"""
+import contextvars
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from analysis_cache import AnalysisCache, SingleFlight, normalize_text
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from gemini_runtime import GeminiBusyError, GeminiWorkerPool
+from json_stream import parse_json_text
+
+Recommendations = List[Dict[str, Any]]
+
+MUSIC_SYSTEM_INSTRUCTION = """
+너는 상대방 감정을 음악으로 치유해줄 수 있는 음악 큐레이터야.
+입력으로 사용자의 감정(1~2개)과 음악 취향이 주어지면 다음 지침에 따라 응답해줘.
+
+[지침]
+1. 감정과 음악 취향에 어울리는 실제로 존재하는 음악 3곡을 추천해.
+2. 각 음악에 대해 추천하는 이유를 1~2 문장으로 간결하게 설명해.
+3. 결과는 반드시 아래의 JSON 형식으로만 출력해. 다른 설명은 절대 추가하지 마.
+
+[JSON 출력 형식]
+{
+  "recommendations": [
+    {"artist": "가수명", "title": "노래 제목", "reason": "이 노래를 추천하는 이유"},
+    {"artist": "가수명", "title": "노래 제목", "reason": "이 노래를 추천하는 이유"},
+    {"artist": "가수명", "title": "노래 제목", "reason": "이 노래를 추천하는 이유"}
+  ]
+}
+""".strip()
+
+
+def build_music_prompt(emotions: List[str], music_taste: Optional[str]) -> str:
+    prompt = f"감정: {', '.join(emotions)}"
+    if music_taste:
+        prompt += f"\n사용자의 음악 취향: {music_taste}"
+    return prompt
+
+
+def parse_recommendations(text: str, limit: int = 3) -> Recommendations:
+    """모델 출력에서 artist/title이 있는 추천곡만 최대 limit개"""
+    recs = parse_json_text(text).get("recommendations") or []
+    return [r for r in recs if isinstance(r, dict) and r.get("artist") and r.get("title")][:limit]
+
+
+# 카탈로그가 곡을 고른 경우 모델은 추천 이유만 작성(출력이 짧음)
+MUSIC_REASON_INSTRUCTION = """
+너는 음악 큐레이터야. 사용자의 감정과 음악 취향, 그리고 이미 고른 곡 목록이 주어지면
+각 곡을 추천하는 이유를 곡 순서대로 1~2 문장으로 간결하게 써줘.
+결과는 반드시 {"reasons": ["1번 곡 추천 이유", "2번 곡 추천 이유", "3번 곡 추천 이유"]} 형식의 JSON으로만 출력해.
+""".strip()
+
+
+def build_reason_prompt(emotions: List[str], music_taste: Optional[str], songs: Recommendations) -> str:
+    lines = [f"{i + 1}. {s['artist']} - {s['title']}" for i, s in enumerate(songs)]
+    return build_music_prompt(emotions, music_taste) + "\n곡 목록:\n" + "\n".join(lines)
+
+
+def apply_reasons(text: str, songs: Recommendations) -> Recommendations:
+    """모델이 쓴 이유를 곡 순서대로 채운다. 비어 있는 항목은 기존(템플릿) 이유 유지"""
+    reasons = parse_json_text(text).get("reasons") or []
+    merged = []
+    for i, song in enumerate(songs):
+        reason = reasons[i] if i < len(reasons) and isinstance(reasons[i], str) and reasons[i].strip() else None
+        merged.append({**song, "reason": reason.strip() if reason else song.get("reason", "")})
+    return merged
+
+
+def normalize_taste(music_taste: Optional[str]) -> str:
+    """'발라드, 인디' 와 '인디,발라드' 가 같은 키가 되도록 항목을 정렬"""
+    parts = [p.strip() for p in normalize_text(music_taste).replace("/", ",").split(",")]
+    return ",".join(sorted(p for p in parts if p))
+
+
+def make_music_key(emotions: Iterable[str], music_taste: Optional[str]) -> str:
+    emotion_part = "|".join(sorted({str(e).strip() for e in emotions if str(e).strip()}))
+    raw = f"{emotion_part}\x1f{normalize_taste(music_taste)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MusicRecommendationStage:
+    """generate(emotions, music_taste) -> 추천곡 목록 을 캐시/병합/백그라운드 갱신으로 감싼다."""
+
+    def __init__(
+        self,
+        pool: GeminiWorkerPool,
+        generate: Callable[[List[str], str, Optional[float]], Recommendations],
+        max_entries: int = 1024,
+        ttl_sec: int = 7 * 24 * 3600,
+        refresh_after_sec: int = 24 * 3600,
+        timeout_sec: float = 60,
+        persist_path: Optional[str] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_workers: int = 4,
+    ):
+        self.pool = pool
+        self.generate = generate
+        self.timeout_sec = timeout_sec
+        self.breaker = breaker
+        # submit()용 대기 스레드. 실제 모델 호출은 워커 풀에서 하고 여기서는 결과만 기다림
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="music-stage")
+        self.refresh_after_sec = refresh_after_sec
+        self.cache = AnalysisCache(max_entries=max_entries, ttl_sec=ttl_sec, persist_path=persist_path)
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._refreshing: Set[str] = set()
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "staleHits": 0,
+            "misses": 0,
+            "calls": 0,
+            "failures": 0,
+            "refreshes": 0,
+            "refreshSkipped": 0,
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] += 1
+
+    def _lookup(self, key: str, emotions: List[str], music_taste: str) -> Optional[Recommendations]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.get("generated_at", 0) > self.refresh_after_sec:
+            self._count("staleHits")
+            self._schedule_refresh(key, emotions, music_taste)
+        else:
+            self._count("hits")
+        return entry["recommendations"]
+
+    def _store(self, key: str, recommendations: Recommendations) -> None:
+        if recommendations:
+            self.cache.put(key, {"recommendations": recommendations, "generated_at": time.time()})
+
+    def _timeout_sec(self) -> float:
+        # 서킷이 있으면 관측된 지연에 맞춘 유효 타임아웃(최대 timeout_sec)
+        if self.breaker is None:
+            return self.timeout_sec
+        return min(self.timeout_sec, self.breaker.effective_timeout_sec())
+
+    def _call(self, emotions: List[str], music_taste: str, timeout_sec: Optional[float]) -> Recommendations:
+        self._count("calls")
+        return self.generate(emotions, music_taste, timeout_sec) or []
+
+    # ---- 조회 ----
+    def peek(self, emotions: List[str], music_taste: Optional[str]) -> Optional[Recommendations]:
+        """캐시에 있을 때만 반환(모델 호출 없음). 로컬 대체 결과 등에 사용"""
+        if not emotions:
+            return None
+        return self._lookup(make_music_key(emotions, music_taste), list(emotions), music_taste or "")
+
+    def get(self, emotions: List[str], music_taste: Optional[str], timeout_sec: Optional[float] = None) -> Recommendations:
+        """캐시 → 진행 중인 호출 공유 → 워커 풀에서 새 호출. 실패 시 빈 목록"""
+        if not emotions:
+            return []
+        emotions, music_taste = list(emotions), music_taste or ""
+        key = make_music_key(emotions, music_taste)
+        cached = self._lookup(key, emotions, music_taste)
+        if cached is not None:
+            return cached
+        self._count("misses")
+        timeout_sec = timeout_sec or self._timeout_sec()
+
+        def _fetch() -> Dict[str, Any]:
+            recs = self.pool.call(self._call, emotions, music_taste, timeout_sec, timeout_sec=timeout_sec)
+            self._store(key, recs)
+            return {"recommendations": recs}
+
+        try:
+            result, _ = self._flights.do(key, _fetch)
+            return result["recommendations"]
+        except Exception as exc:
+            self._count("failures")
+            print(f"[DEBUG] Music stage failed: {exc!r}")
+            return []
+
+    def submit(self, emotions: List[str], music_taste: Optional[str], timeout_sec: Optional[float] = None) -> Future:
+        """get()을 대기 스레드(max_workers개)에서 시작하고 Future로 돌려준다(다른 필드와 겹쳐 실행)"""
+        cached = self.peek(emotions, music_taste)
+        if cached is not None:
+            future: Future = Future()
+            future.set_result(cached)
+            return future
+        # 호출한 요청의 컨텍스트(워커 풀 공정성 키 등)를 그대로 이어받아 실행
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self.get, emotions, music_taste, timeout_sec)
+
+    # ---- 백그라운드 갱신 ----
+    def _schedule_refresh(self, key: str, emotions: List[str], music_taste: str) -> None:
+        # 사용자 요청이 대기 중이거나 서킷이 닫혀 있지 않으면 갱신하지 않음(다음 조회 때 다시 시도)
+        with self._lock:
+            if key in self._refreshing or self.pool.queue_depth() > 0:
+                self._counters["refreshSkipped"] += 1
+                return
+            self._refreshing.add(key)
+        probe = False
+        try:
+            if self.breaker is not None:
+                if self.breaker.state() != CLOSED:
+                    raise CircuitOpenError("서킷이 닫혀 있지 않아 갱신을 미룹니다.")
+                probe = self.breaker.before_call()
+            started = time.perf_counter()
+            job = self.pool.submit(self._call, emotions, music_taste, self._timeout_sec())
+        except (GeminiBusyError, CircuitOpenError) as exc:
+            if self.breaker is not None and isinstance(exc, GeminiBusyError):
+                self.breaker.record_ignored(probe=probe)
+            with self._lock:
+                self._refreshing.discard(key)
+                self._counters["refreshSkipped"] += 1
+            return
+
+        def _done(f: Future) -> None:
+            with self._lock:
+                self._refreshing.discard(key)
+            if f.cancelled():
+                if self.breaker is not None:
+                    self.breaker.record_ignored(probe=probe)
+                self._count("failures")
+                return
+            if f.exception() is not None:
+                if self.breaker is not None:
+                    self.breaker.record_failure(probe=probe)
+                self._count("failures")
+                return
+            if self.breaker is not None:
+                self.breaker.record_success(time.perf_counter() - started, probe=probe)
+            self._store(key, f.result())
+            self._count("refreshes")
+
+        job.future.add_done_callback(_done)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            refreshing = len(self._refreshing)
+        cache_stats = self.cache.stats()
+        return {
+            "entries": cache_stats.get("entries", 0),
+            "refreshAfterSec": self.refresh_after_sec,
+            "refreshing": refreshing,
+            "singleFlight": self._flights.stats(),
+            **counters,
+        }
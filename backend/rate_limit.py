@@ -0,0 +1,103 @@
+"""사용자(uid)별 토큰 버킷 요청 제한
+
+분당 rate_per_min개의 토큰이 채워지고 최대 burst개까지 쌓인다. 요청마다 토큰 1개를 쓰며,
+토큰이 없으면 다음 토큰이 생길 때까지의 시간(Retry-After)을 돌려준다.
+버킷 상태는 RateLimitBackend에 저장된다. 기본은 프로세스 메모리(InMemoryBucketBackend)이고,
+여러 프로세스/인스턴스가 한도를 공유해야 하면 같은 take()를 구현한 공유 저장소(Redis 등)로 바꾼다.
+"""
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class RateLimitBackend(ABC):
+    """버킷 저장소 인터페이스. take()는 키 단위로 원자적이어야 한다."""
+
+    @abstractmethod
+    def take(self, key: str, rate_per_sec: float, burst: int, cost: float = 1.0, now: Optional[float] = None) -> Tuple[bool, float]:
+        """토큰 cost개를 쓸 수 있으면 (True, 0), 아니면 (False, 다시 시도까지 남은 초)"""
+
+    @abstractmethod
+    def size(self) -> int:
+        """추적 중인 버킷 수"""
+
+
+class InMemoryBucketBackend(RateLimitBackend):
+    """프로세스 메모리 버킷. 마지막 사용 순서(OrderedDict)로 두고 앞쪽(오래된 것)부터 정리한다"""
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        # key -> [남은 토큰, 마지막 갱신 시각], 오래 쓰지 않은 순
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def _prune(self, now: float, rate_per_sec: float, burst: int) -> None:
+        # 지금쯤 다시 가득 찼을 버킷은 지워도 결과가 같음. 앞에서부터 보다가 아직 안 찬 버킷에서 멈춤
+        full_after = burst / rate_per_sec if rate_per_sec > 0 else math.inf
+        while self._buckets:
+            _, (_, ts) = next(iter(self._buckets.items()))
+            if now - ts < full_after:
+                break
+            self._buckets.popitem(last=False)
+        # 그래도 max_keys를 넘으면 가장 오래 쓰지 않은 버킷부터 버림
+        while len(self._buckets) >= self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def take(self, key: str, rate_per_sec: float, burst: int, cost: float = 1.0, now: Optional[float] = None) -> Tuple[bool, float]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._prune(now, rate_per_sec, burst)
+                bucket = self._buckets[key] = [float(burst), now]
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate_per_sec)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+            bucket[0] = tokens
+            wait = (cost - tokens) / rate_per_sec if rate_per_sec > 0 else math.inf
+            return False, wait
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate_per_min: float = 10, burst: int = 5, backend: Optional[RateLimitBackend] = None):
+        self.rate_per_min = float(rate_per_min)
+        self.burst = max(1, int(burst))
+        self.backend = backend or InMemoryBucketBackend()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"allowed": 0, "limited": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_min > 0
+
+    def acquire(self, key: str) -> Tuple[bool, int]:
+        """(허용 여부, Retry-After 초). 제한이 꺼져 있으면 항상 허용"""
+        if not self.enabled:
+            return True, 0
+        allowed, wait = self.backend.take(key, self.rate_per_min / 60.0, self.burst)
+        with self._lock:
+            self._counters["allowed" if allowed else "limited"] += 1
+        return allowed, (0 if allowed else max(1, math.ceil(wait)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "enabled": self.enabled,
+            "ratePerMin": self.rate_per_min,
+            "burst": self.burst,
+            "backend": type(self.backend).__name__,
+            "trackedKeys": self.backend.size(),
+            **counters,
+        }
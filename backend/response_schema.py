@@ -0,0 +1,220 @@
+"""Gemini 구조화 출력 스키마와 로컬 보정
+
+모델 생성 설정(response_schema)에 넣을 JSON 스키마를 만들고, 응답이 스키마에서 조금
+벗어났을 때(라벨 표기 차이, 감정 개수 초과, 옛 'emotion' 키, 문자열로 온 목록 등)
+모델을 다시 부르지 않고 로컬에서 고친다. 고친 항목은 위반 유형별로 집계한다.
+
+google-generativeai 0.7의 Schema는 maxItems를 지원하지 않으므로 개수 상한
+(감정 2개, 추천곡 3곡)은 여기서 잘라 맞춘다.
+"""
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+MAX_EMOTIONS = 2
+MAX_RECOMMENDATIONS = 3
+
+# 같은 뜻의 다른 표기 → 감정 라벨. 여기 없는 표기는 접두어가 같아도 맞추지 않는다
+# (예: '불안하지않음'이 '불안'으로, '사랑'이 다른 뜻의 더 긴 라벨로 바뀌지 않도록)
+EMOTION_ALIASES: Dict[str, str] = {
+    "우울": "우울감",
+    "우울함": "우울감",
+    "불안감": "불안",
+    "불안함": "불안",
+    "피곤": "피로",
+    "피곤함": "피로",
+    "피로감": "피로",
+    "화남": "분노",
+    "실망감": "실망",
+    "질투심": "질투",
+    "죄책": "죄책감",
+    "외로운": "외로움",
+    "슬픈": "슬픔",
+    "기쁜": "기쁨",
+    "편안": "편안함",
+    "자유": "자유로움",
+    "성취": "성취감",
+    "감사함": "감사",
+    "흥미로움": "흥미",
+    "자랑스러움": "자부심",
+}
+
+
+def analysis_schema(labels: Sequence[str]) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "emotions": {"type": "array", "items": {"type": "string", "format": "enum", "enum": list(labels)}},
+            "keywords": {"type": "array", "items": {"type": "string"}},
+            "comfort_message": {"type": "string"},
+        },
+        "required": ["emotions", "keywords", "comfort_message"],
+    }
+
+
+def batch_analysis_schema(labels: Sequence[str]) -> Dict[str, Any]:
+    item = analysis_schema(labels)
+    item["properties"]["id"] = {"type": "integer"}
+    item["required"] = ["id"] + item["required"]
+    return {"type": "array", "items": item}
+
+
+MUSIC_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "artist": {"type": "string"},
+                    "title": {"type": "string"},
+                    "reason": {"type": "string"},
+                },
+                "required": ["artist", "title", "reason"],
+            },
+        },
+    },
+    "required": ["recommendations"],
+}
+
+REASON_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {"reasons": {"type": "array", "items": {"type": "string"}}},
+    "required": ["reasons"],
+}
+
+
+def _as_list(value: Any) -> Tuple[List[str], bool]:
+    """목록이 아니면 목록으로 바꾼다. (값, 바뀌었는지)"""
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()], False
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()], True
+    return [], value is not None
+
+
+class ResponseValidator:
+    def __init__(
+        self,
+        labels: Sequence[str],
+        max_emotions: int = MAX_EMOTIONS,
+        max_recommendations: int = MAX_RECOMMENDATIONS,
+        aliases: Optional[Dict[str, str]] = None,
+    ):
+        self.labels = list(labels)
+        self._label_set = set(self.labels)
+        # 라벨 목록에 있는 라벨을 가리키는 별칭만 사용
+        self._aliases = {k: v for k, v in (EMOTION_ALIASES if aliases is None else aliases).items() if v in self._label_set}
+        self.max_emotions = max_emotions
+        self.max_recommendations = max_recommendations
+        self._lock = threading.Lock()
+        self._violations: Counter = Counter()
+        self._counters: Dict[str, int] = {"checked": 0, "valid": 0, "repaired": 0, "unusable": 0}
+
+    # ---- 감정 라벨 ----
+    def match_label(self, value: str) -> Optional[str]:
+        """공백/따옴표를 뺀 값이 라벨과 같거나 별칭표('우울' → '우울감')에 있을 때만 라벨을 돌려준다"""
+        value = value.strip().strip("\"'").replace(" ", "")
+        if value in self._label_set:
+            return value
+        return self._aliases.get(value)
+
+    def normalize_emotions(self, parsed: Dict[str, Any], violations: Optional[List[str]] = None) -> List[str]:
+        violations = violations if violations is not None else []
+        raw = parsed.get("emotions")
+        if not raw and parsed.get("emotion"):
+            violations.append("legacy_emotion_key")
+            raw = parsed.get("emotion")
+        values, coerced = _as_list(raw)
+        if coerced:
+            violations.append("emotions_not_list")
+        emotions: List[str] = []
+        for value in values:
+            label = self.match_label(value)
+            if label is None:
+                violations.append("unknown_emotion")
+                continue
+            if label != value:
+                violations.append("emotion_mapped")
+            if label in emotions:
+                violations.append("duplicate_emotion")
+                continue
+            emotions.append(label)
+        if len(emotions) > self.max_emotions:
+            violations.append("too_many_emotions")
+            emotions = emotions[: self.max_emotions]
+        return emotions
+
+    # ---- 추천곡 ----
+    def repair_recommendations(self, recs: Any, violations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        violations = violations if violations is not None else []
+        if not isinstance(recs, list):
+            if recs:
+                violations.append("recommendations_not_list")
+            return []
+        valid = []
+        for rec in recs:
+            if not isinstance(rec, dict) or not rec.get("artist") or not rec.get("title"):
+                violations.append("invalid_recommendation")
+                continue
+            valid.append({**rec, "reason": str(rec.get("reason") or "")})
+        if len(valid) > self.max_recommendations:
+            violations.append("too_many_recommendations")
+        return valid[: self.max_recommendations]
+
+    # ---- 분석 결과 ----
+    def repair_analysis(self, parsed: Any, record: bool = True) -> Dict[str, Any]:
+        """분석 응답을 {emotion, emotions, keywords, comfort_message, recommendations}로 맞춘다.
+        record=False면 집계하지 않음(스트리밍 중간 결과 등)"""
+        violations: List[str] = []
+        if not isinstance(parsed, dict):
+            violations.append("not_object")
+            parsed = {}
+        emotions = self.normalize_emotions(parsed, violations)
+        if not emotions:
+            violations.append("missing_emotions")
+        keywords, coerced = _as_list(parsed.get("keywords"))
+        if coerced:
+            violations.append("keywords_not_list")
+        comfort = parsed.get("comfort_message")
+        if comfort is not None and not isinstance(comfort, str):
+            violations.append("comfort_message_not_string")
+            comfort = str(comfort)
+        comfort = (comfort or "").strip() or None
+        if comfort is None:
+            violations.append("missing_comfort_message")
+        result = {
+            "emotion": ", ".join(emotions) if emotions else None,
+            "emotions": emotions,
+            "keywords": keywords,
+            "comfort_message": comfort,
+            "recommendations": self.repair_recommendations(parsed.get("recommendations", []), violations),
+        }
+        if record:
+            self.record(violations, usable=bool(emotions or comfort))
+        return result
+
+    def record(self, violations: Sequence[str], usable: bool = True) -> None:
+        with self._lock:
+            self._counters["checked"] += 1
+            if not usable:
+                self._counters["unusable"] += 1
+            elif violations:
+                self._counters["repaired"] += 1
+            else:
+                self._counters["valid"] += 1
+            self._violations.update(violations)
+
+    def count(self, violation: str) -> None:
+        with self._lock:
+            self._violations[violation] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checked = self._counters["checked"]
+            return {
+                **self._counters,
+                "violationRate": round(1 - self._counters["valid"] / checked, 3) if checked else 0.0,
+                "violations": dict(self._violations.most_common()),
+            }
@@ -0,0 +1,189 @@
+"""산책로 경로 형상(미리 변환)
+
+Firestore의 route_coordinates([{lng, lat, order}, ...] 또는 이전 버전의 [[lng, lat], ...])를
+카탈로그에 적재할 때 한 번만 (N, 2) float64 배열([경도, 위도], order 순)로 바꾸고,
+응답에 넣을 GeoJSON(dict)도 그때 만들어 둔다. 요청 경로는 만들어 둔 객체를 그대로 붙이기만 한다.
+
+저장/응답용 압축 형식은 Google polyline 알고리즘(위도, 경도 순, 10^precision 고정소수점 정수의 차분을
+5비트씩 문자로)이다. precision 6이면 오차는 약 0.1m 이내.
+
+지도 표시용으로 Douglas–Peucker 간소화 결과를 상세도(detail)별로 미리 만들어 둔다.
+간소화는 원래 점 중 일부를 고르는 방식이라 시작점과 끝점은 항상 원래 좌표 그대로 남는다.
+"""
+import math
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from trail_geo import METERS_PER_DEG_LAT
+
+POLYLINE_PRECISION = 6
+ROUTE_ENCODING = f"polyline{POLYLINE_PRECISION}"
+
+# 상세도 → Douglas–Peucker 허용 오차(m). full은 간소화하지 않은 원본
+DETAIL_TOLERANCES_M: Dict[str, float] = {"low": 20.0, "medium": 5.0, "full": 0.0}
+DEFAULT_DETAIL = "medium"
+
+
+def detail_for_zoom(level: int) -> str:
+    """카카오맵 확대 레벨(1=가장 가까움 ~ 14) → 상세도. 한 화면 픽셀이 허용 오차보다 커지는 레벨부터 낮춤"""
+    if level <= 3:
+        return "full"
+    if level <= 6:
+        return "medium"
+    return "low"
+
+
+def simplify_mask(coords: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas–Peucker로 남길 점 표시(bool). 구간마다 안쪽 점 전체와 선분 사이 거리를 한 번에 계산한다.
+    경로가 닫혀 있어도(시작 = 끝) 되도록 직선이 아닌 선분까지의 거리를 쓴다"""
+    n = len(coords)
+    if n <= 2 or tolerance_m <= 0:
+        return np.ones(n, dtype=bool)
+    # 경로 하나는 수 km 이내라 평균 위도 기준 평면 근사(m)로 충분
+    cos_lat = math.cos(math.radians(float(coords[:, 1].mean())))
+    xy = np.column_stack((coords[:, 0] * METERS_PER_DEG_LAT * cos_lat, coords[:, 1] * METERS_PER_DEG_LAT))
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        inner = xy[start + 1:end] - a
+        ab = b - a
+        length_sq = float(ab @ ab)
+        if length_sq > 0:
+            t = np.clip(inner @ ab / length_sq, 0.0, 1.0)
+            inner = inner - np.outer(t, ab)
+        dist = np.hypot(inner[:, 0], inner[:, 1])
+        far = int(np.argmax(dist))
+        if dist[far] > tolerance_m:
+            mid = start + 1 + far
+            keep[mid] = True
+            stack.append((start, mid))
+            stack.append((mid, end))
+    return keep
+
+
+def encode_polyline(coords: np.ndarray, precision: int = POLYLINE_PRECISION) -> str:
+    """(N, 2) [경도, 위도] → polyline 문자열"""
+    scaled = np.round(np.asarray(coords, dtype=np.float64)[:, ::-1] * (10 ** precision)).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    chars = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+def decode_polyline(text: str, precision: int = POLYLINE_PRECISION) -> np.ndarray:
+    """polyline 문자열 → (N, 2) float64 [경도, 위도]"""
+    values = []
+    result = shift = 0
+    for ch in text:
+        byte = ord(ch) - 63
+        result |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(result >> 1) if result & 1 else result >> 1)
+            result = shift = 0
+    if len(values) < 2:
+        return np.empty((0, 2))
+    lat_lng = np.cumsum(np.asarray(values[: len(values) // 2 * 2], dtype=np.int64).reshape(-1, 2), axis=0)
+    return np.ascontiguousarray(lat_lng[:, ::-1] / (10 ** precision))
+
+
+def route_array(route_coords: Any) -> Optional[np.ndarray]:
+    """route_coordinates → (N, 2) float64 [경도, 위도]. 경로가 없거나 읽을 수 있는 점이 없으면 None"""
+    if not isinstance(route_coords, list) or len(route_coords) == 0:
+        return None
+    if isinstance(route_coords[0], dict):
+        # 객체 형태: order 순으로 정렬(같은 order는 저장 순서 유지)
+        n = len(route_coords)
+        lng = np.fromiter((c.get('lng', np.nan) for c in route_coords), dtype=np.float64, count=n)
+        lat = np.fromiter((c.get('lat', np.nan) for c in route_coords), dtype=np.float64, count=n)
+        order = np.fromiter((c.get('order', 0) for c in route_coords), dtype=np.float64, count=n)
+        idx = np.argsort(order, kind="stable")
+        coords = np.column_stack((lng[idx], lat[idx]))
+    else:
+        # 이미 배열 형태인 경우 (이전 버전)
+        try:
+            coords = np.asarray([pt[:2] for pt in route_coords], dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+    coords = coords[~np.isnan(coords).any(axis=1)]
+    return np.ascontiguousarray(coords) if len(coords) else None
+
+
+class RouteGeometry:
+    __slots__ = ("coords", "route_type", "geojson", "encoded", "_forms")
+
+    def __init__(self, coords: np.ndarray, route_type: str = "LineString", polyline: Optional[str] = None):
+        self.coords = coords
+        self.route_type = route_type
+        # 응답/기록에 그대로 쓰는 GeoJSON과 압축 형식(원본 상세도). 공유 객체이므로 수정하지 않는다
+        self.geojson: Dict[str, Any] = {"type": route_type, "coordinates": coords.tolist()}
+        self.encoded: Dict[str, Any] = {
+            "type": route_type,
+            "encoding": ROUTE_ENCODING,
+            "polyline": polyline if polyline is not None else encode_polyline(coords),
+            "point_count": len(coords),
+        }
+        # (상세도, 형식) → 응답용 루트. 간소화해도 점 수가 같으면 원본 객체를 같이 씀
+        self._forms: Dict[Any, Dict[str, Any]] = {}
+        for detail, tolerance_m in DETAIL_TOLERANCES_M.items():
+            keep = simplify_mask(coords, tolerance_m)
+            if keep.all():
+                geojson, encoded = self.geojson, self.encoded
+            else:
+                simplified = coords[keep]
+                geojson = {"type": route_type, "coordinates": simplified.tolist()}
+                encoded = {
+                    "type": route_type,
+                    "encoding": ROUTE_ENCODING,
+                    "polyline": encode_polyline(simplified),
+                    "point_count": len(simplified),
+                }
+            self._forms[(detail, "geojson")] = geojson
+            self._forms[(detail, "polyline")] = encoded
+
+    def route(self, detail: str = DEFAULT_DETAIL, fmt: str = "polyline") -> Dict[str, Any]:
+        """미리 만든 상세도별 루트(fmt: polyline / geojson). 모르는 상세도는 기본 상세도"""
+        if detail not in DETAIL_TOLERANCES_M:
+            detail = DEFAULT_DETAIL
+        return self._forms[(detail, "geojson" if fmt == "geojson" else "polyline")]
+
+    def point_counts(self) -> Dict[str, int]:
+        return {detail: self._forms[(detail, "polyline")]["point_count"] for detail in DETAIL_TOLERANCES_M}
+
+    @classmethod
+    def from_doc(cls, data: Dict[str, Any]) -> Optional["RouteGeometry"]:
+        """route_polyline(압축 저장)이 있으면 그것을, 없으면 route_coordinates를 읽는다"""
+        route_type = data.get('route_type') or 'LineString'
+        polyline = data.get('route_polyline')
+        precision = int(data.get('route_precision') or POLYLINE_PRECISION)
+        if isinstance(polyline, str) and polyline:
+            coords = decode_polyline(polyline, precision)
+            if len(coords):
+                # 저장 정밀도가 응답 정밀도와 같으면 문자열을 다시 만들지 않음
+                return cls(coords, route_type, polyline if precision == POLYLINE_PRECISION else None)
+        coords = route_array(data.get('route_coordinates'))
+        if coords is None:
+            return None
+        return cls(coords, route_type)
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def __eq__(self, other: Any) -> bool:
+        return (
+            isinstance(other, RouteGeometry)
+            and self.route_type == other.route_type
+            and np.array_equal(self.coords, other.coords)
+        )
+
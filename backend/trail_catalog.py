@@ -0,0 +1,175 @@
+"""프로세스 전역 산책로 카탈로그
+
+기동 시 trails 컬렉션 전체를 한 번 읽어 변환(좌표/경로 배열)한 결과를 메모리에 두고,
+Firestore 스냅샷 리스너로 바뀐 문서만 반영한다. 리스너를 못 붙이거나 끊겨도 refresh_sec마다
+전체를 다시 읽어 맞춘다. 요청 경로는 get()으로 메모리만 읽는다.
+
+바뀐 산책로 이름은 on_change 콜백으로 알린다(공간 색인/순위 좌표 갱신용).
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+TrailDoc = Tuple[str, Optional[Dict[str, Any]]]
+
+
+class TrailCatalog:
+    def __init__(
+        self,
+        convert: Callable[[Dict[str, Any]], Dict[str, Any]],
+        on_change: Optional[Callable[[List[str]], None]] = None,
+        refresh_sec: float = 3600,
+    ):
+        self.convert = convert
+        self.on_change = on_change
+        self.refresh_sec = refresh_sec
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watch: Any = None
+        self.loaded = False
+        self.version = 0
+        self.mode = "none"  # snapshot / polling / none
+        self._loaded_at = 0.0  # 마지막 전체 읽기 완료 시각
+        self._changed_at = 0.0  # 마지막으로 내용이 바뀐 시각(전체 읽기 또는 스냅샷)
+        self._last_refresh_ms: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._counters: Dict[str, int] = {"refreshes": 0, "refreshFailures": 0, "snapshotEvents": 0, "misses": 0}
+
+    # ---- 조회(요청 경로) ----
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None and self.loaded:
+                self._counters["misses"] += 1
+        return entry
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return list(self._entries.items())
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._entries
+
+    # ---- 반영 ----
+    def apply(self, docs: Iterable[TrailDoc]) -> List[str]:
+        """(이름, 문서 또는 None=삭제)를 반영. 실제로 바뀐 이름 목록"""
+        converted = []
+        for name, data in docs:
+            entry = None
+            if data is not None:
+                try:
+                    entry = self.convert(data)
+                except Exception as e:
+                    print(f"[DEBUG] Trail catalog: failed to convert {name}: {e}")
+                    continue
+            converted.append((name, entry))
+        changed = []
+        with self._lock:
+            for name, entry in converted:
+                if entry is None:
+                    if self._entries.pop(name, None) is not None:
+                        changed.append(name)
+                elif self._entries.get(name) != entry:
+                    self._entries[name] = entry
+                    changed.append(name)
+            if changed:
+                self.version += 1
+                self._changed_at = time.time()
+        self._notify(changed)
+        return changed
+
+    def replace_all(self, docs: Iterable[TrailDoc]) -> List[str]:
+        """전체 다시 읽은 결과로 교체(없어진 문서는 삭제)"""
+        docs = list(docs)
+        seen = {name for name, _ in docs}
+        with self._lock:
+            gone = [name for name in self._entries if name not in seen]
+        return self.apply(docs + [(name, None) for name in gone])
+
+    def _notify(self, changed: List[str]) -> None:
+        if changed and self.on_change is not None:
+            try:
+                self.on_change(changed)
+            except Exception as e:
+                print(f"[DEBUG] Trail catalog on_change failed: {e}")
+
+    # ---- 적재 ----
+    def refresh(self, fetch_all: Callable[[], Iterable[TrailDoc]]) -> bool:
+        started = time.perf_counter()
+        try:
+            docs = list(fetch_all())
+        except Exception as e:
+            with self._lock:
+                self._counters["refreshFailures"] += 1
+                self._last_error = repr(e)
+            print(f"[DEBUG] Trail catalog refresh failed: {e}")
+            return False
+        changed = self.replace_all(docs)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        with self._lock:
+            self.loaded = True
+            self._loaded_at = time.time()
+            self._last_refresh_ms = elapsed_ms
+            self._counters["refreshes"] += 1
+            size = len(self._entries)
+        print(f"[DEBUG] Trail catalog refreshed: {size} trails, {len(changed)} changed, {elapsed_ms}ms")
+        return True
+
+    def _on_snapshot(self, col_snapshot: Any, changes: Any, read_time: Any) -> None:
+        # Firestore 리스너 스레드에서 호출. 첫 호출은 전체 문서가 ADDED로 온다(이미 읽은 것과 같으면 변경 없음)
+        docs = []
+        for change in changes:
+            doc = change.document
+            removed = getattr(change.type, "name", str(change.type)) == "REMOVED"
+            docs.append((doc.id, None if removed else (doc.to_dict() or {})))
+        with self._lock:
+            self._counters["snapshotEvents"] += 1
+        self.apply(docs)
+
+    def start(self, fetch_all: Callable[[], Iterable[TrailDoc]], collection: Any = None) -> None:
+        """백그라운드로 전체 적재 후 스냅샷 리스너를 붙이고, refresh_sec마다 전체 다시 읽기"""
+        if self._thread is not None:
+            return
+
+        def _loop() -> None:
+            self.refresh(fetch_all)
+            if collection is not None:
+                try:
+                    self._watch = collection.on_snapshot(self._on_snapshot)
+                    self.mode = "snapshot"
+                except Exception as e:
+                    print(f"[DEBUG] Trail catalog snapshot listener unavailable, polling instead: {e}")
+            if self._watch is None:
+                self.mode = "polling"
+            while self.refresh_sec > 0 and not self._stop.wait(self.refresh_sec):
+                self.refresh(fetch_all)
+
+        self._thread = threading.Thread(target=_loop, name="trail-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "mode": self.mode,
+                "trails": len(self._entries),
+                "version": self.version,
+                "ageSec": round(now - self._loaded_at, 1) if self._loaded_at else None,
+                "lastChangeAgoSec": round(now - self._changed_at, 1) if self._changed_at else None,
+                "lastRefreshMs": self._last_refresh_ms,
+                "refreshSec": self.refresh_sec,
+                "lastError": self._last_error,
+                **self._counters,
+            }
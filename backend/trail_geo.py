@@ -0,0 +1,216 @@
+"""산책로 좌표 공간 색인
+
+산책로 좌표(위도/경도)를 고정 크기 격자 칸에 미리 나눠 담아 두고, 반경 조회 때는
+반경의 경계 상자에 걸치는 칸의 행만 모아 벡터화한 하버사인으로 거리를 잰다.
+칸 크기가 반경과 비슷하면 조회 한 번은 칸 몇 개만 보므로 카탈로그가 커져도 비용이 거의 일정하다.
+
+- GeoGrid: 행 번호 순서의 점(산책로 마커) 색인. 한 번 만들고 통째로 바꿔 끼운다(순위 계산용).
+- TrailSpatialIndex: 산책로 이름별 마커 + 경로 점 색인. 경로 경계 상자가 걸치는 칸마다 이름을 넣어 두고
+  산책로 하나씩 추가/교체/삭제할 수 있다. 거리는 마커와 경로 점 중 가장 가까운 점까지.
+"""
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+# 위도 1도의 길이(m)
+METERS_PER_DEG_LAT = 111_320.0
+
+
+def haversine_m(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """한 점에서 여러 점까지의 대원 거리(m)"""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def parse_lat_lng(value: Any) -> Optional[Tuple[float, float]]:
+    """{latitude, longitude} / {lat, lng} 사전이나 GeoPoint에서 (위도, 경도). 범위를 벗어나면 None"""
+    if isinstance(value, dict):
+        lat = value.get("latitude", value.get("lat"))
+        lng = value.get("longitude", value.get("lng"))
+    else:
+        lat = getattr(value, "latitude", None)
+        lng = getattr(value, "longitude", None)
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):  # NaN도 여기서 걸림
+        return None
+    return lat, lng
+
+
+class GeoGrid:
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray, cell_m: float = 1000):
+        """lats/lngs는 행 번호 순서의 좌표. 좌표가 없는(NaN) 행은 색인하지 않는다"""
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        valid = np.flatnonzero(~(np.isnan(self.lats) | np.isnan(self.lngs)))
+        self.size = len(valid)
+        self.cell_lat = cell_m / METERS_PER_DEG_LAT
+        # 경도 칸은 색인한 좌표의 평균 위도에서 같은 거리가 되도록(서울 부근 한정이면 충분)
+        mean_lat = float(self.lats[valid].mean()) if self.size else 0.0
+        self.cell_lng = cell_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(mean_lat)), 0.01))
+        cells = np.stack([
+            np.floor(self.lats[valid] / self.cell_lat).astype(np.int64),
+            np.floor(self.lngs[valid] / self.cell_lng).astype(np.int64),
+        ], axis=1) if self.size else np.empty((0, 2), dtype=np.int64)
+        grouped: Dict[Tuple[int, int], List[int]] = {}
+        for row, (ci, cj) in zip(valid.tolist(), cells.tolist()):
+            grouped.setdefault((ci, cj), []).append(row)
+        self._cells: Dict[Tuple[int, int], np.ndarray] = {k: np.asarray(v, dtype=np.intp) for k, v in grouped.items()}
+
+    def query(self, lat: float, lng: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """반경 radius_m 안의 (행 번호, 거리 m). 행 번호 오름차순"""
+        if not self.size:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        dlat = radius_m / METERS_PER_DEG_LAT
+        dlng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 0.01))
+        i0, i1 = math.floor((lat - dlat) / self.cell_lat), math.floor((lat + dlat) / self.cell_lat)
+        j0, j1 = math.floor((lng - dlng) / self.cell_lng), math.floor((lng + dlng) / self.cell_lng)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) >= len(self._cells):
+            # 반경이 칸보다 훨씬 크면 칸을 하나씩 찾기보다 있는 칸을 훑는 편이 빠름
+            parts = [rows for (ci, cj), rows in self._cells.items() if i0 <= ci <= i1 and j0 <= cj <= j1]
+        else:
+            parts = [
+                rows for rows in (self._cells.get((ci, cj)) for ci in range(i0, i1 + 1) for cj in range(j0, j1 + 1))
+                if rows is not None
+            ]
+        if not parts:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        rows = np.sort(np.concatenate(parts))
+        distances = haversine_m(lat, lng, self.lats[rows], self.lngs[rows])
+        inside = distances <= radius_m
+        return rows[inside], distances[inside]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"indexed": self.size, "cells": len(self._cells)}
+
+
+Cell = Tuple[int, int]
+
+
+class TrailSpatialIndex:
+    def __init__(self, cell_m: float = 500, ref_lat: float = 37.5):
+        """산책로를 하나씩 바꿀 수 있도록 칸 크기는 고정(경도 칸은 ref_lat 기준 길이)"""
+        self.cell_lat = cell_m / METERS_PER_DEG_LAT
+        self.cell_lng = cell_m / (METERS_PER_DEG_LAT * math.cos(math.radians(ref_lat)))
+        self._lock = threading.Lock()
+        self._cells: Dict[Cell, Set[str]] = {}
+        # 이름 → (위도 배열, 경도 배열, 마커 점 수(0/1), 걸친 칸, 부가 정보)
+        self._entries: Dict[str, Tuple[np.ndarray, np.ndarray, int, List[Cell], Dict[str, Any]]] = {}
+        self.version = 0
+        self.updated_at = 0.0
+
+    def _cell_range(self, min_lat: float, max_lat: float, min_lng: float, max_lng: float) -> Tuple[int, int, int, int]:
+        return (
+            math.floor(min_lat / self.cell_lat), math.floor(max_lat / self.cell_lat),
+            math.floor(min_lng / self.cell_lng), math.floor(max_lng / self.cell_lng),
+        )
+
+    def upsert(
+        self,
+        name: str,
+        point: Optional[Tuple[float, float]],
+        route: Optional[np.ndarray] = None,
+        info: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """산책로 하나를 넣거나 교체. point는 (위도, 경도), route는 (N, 2) [경도, 위도] 배열(GeoJSON 순서).
+        좌표가 하나도 없으면 색인에서 뺀다. 색인에 남았는지 반환"""
+        route = np.empty((0, 2)) if route is None else np.asarray(route, dtype=np.float64).reshape(-1, 2)
+        inside = (np.abs(route[:, 1]) <= 90) & (np.abs(route[:, 0]) <= 180)
+        route = route[inside]
+        head = np.asarray([point], dtype=np.float64) if point is not None else np.empty((0, 2))
+        lat_arr = np.concatenate((head[:, 0], route[:, 1]))
+        lng_arr = np.concatenate((head[:, 1], route[:, 0]))
+        if not len(lat_arr):
+            self.remove(name)
+            return False
+        i0, i1, j0, j1 = self._cell_range(lat_arr.min(), lat_arr.max(), lng_arr.min(), lng_arr.max())
+        cells = [(ci, cj) for ci in range(i0, i1 + 1) for cj in range(j0, j1 + 1)]
+        with self._lock:
+            self._unlink(name)
+            self._entries[name] = (lat_arr, lng_arr, 1 if point is not None else 0, cells, dict(info or {}))
+            for cell in cells:
+                self._cells.setdefault(cell, set()).add(name)
+            self._touch()
+        return True
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            if self._unlink(name):
+                self._touch()
+
+    def replace_all(self, trails: Dict[str, Tuple[Optional[Tuple[float, float]], Any, Dict[str, Any]]]) -> int:
+        """전체 다시 적재: 이름 → (마커, 경로, 부가 정보). 없어진 산책로는 뺀다. 색인한 산책로 수"""
+        for name in set(self.names()) - set(trails):
+            self.remove(name)
+        return sum(self.upsert(name, point, route, info) for name, (point, route, info) in trails.items())
+
+    def _unlink(self, name: str) -> bool:
+        old = self._entries.pop(name, None)
+        if old is None:
+            return False
+        for cell in old[3]:
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(name)
+                if not members:
+                    del self._cells[cell]
+        return True
+
+    def _touch(self) -> None:
+        self.version += 1
+        self.updated_at = time.time()
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def nearby(self, lat: float, lng: float, radius_m: float, limit: int = 10) -> List[Dict[str, Any]]:
+        """반경 안 산책로를 가까운 순으로. 거리는 마커/경로 점 중 가장 가까운 점까지(m)"""
+        dlat = radius_m / METERS_PER_DEG_LAT
+        dlng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 0.01))
+        i0, i1, j0, j1 = self._cell_range(lat - dlat, lat + dlat, lng - dlng, lng + dlng)
+        with self._lock:
+            if (i1 - i0 + 1) * (j1 - j0 + 1) >= len(self._cells):
+                groups = [names for (ci, cj), names in self._cells.items() if i0 <= ci <= i1 and j0 <= cj <= j1]
+            else:
+                groups = [
+                    names for names in (self._cells.get((ci, cj)) for ci in range(i0, i1 + 1) for cj in range(j0, j1 + 1))
+                    if names
+                ]
+            candidates = {name: self._entries[name] for group in groups for name in group}
+        found = []
+        for name, (lats, lngs, markers, _, info) in candidates.items():
+            distances = haversine_m(lat, lng, lats, lngs)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] > radius_m:
+                continue
+            found.append({
+                "name": name,
+                "distance_m": int(round(float(distances[nearest]))),
+                "nearest": "marker" if nearest < markers else "route",
+                "nearest_point": {"latitude": float(lats[nearest]), "longitude": float(lngs[nearest])},
+                "coordinates": {"latitude": float(lats[0]), "longitude": float(lngs[0])} if markers else None,
+                **info,
+            })
+        found.sort(key=lambda t: (t["distance_m"], t["name"]))
+        return found[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "trails": len(self._entries),
+                "cells": len(self._cells),
+                "routePoints": sum(len(e[0]) - e[2] for e in self._entries.values()),
+                "version": self.version,
+                "updatedAgoSec": round(time.time() - self.updated_at, 1) if self.updated_at else None,
+            }
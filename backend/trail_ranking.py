@@ -0,0 +1,237 @@
+"""감정 → 산책로 순위표 (미리 계산)
+
+점수 DB(score_df)를 불러올 때 한 번만 float32 점수 행렬(산책로 x 긍정 감정)로 바꾸고,
+긍정 감정 10개의 단일 감정과 두 감정 조합 전부에 대해 상위 top_k개 순위를 미리 계산한다.
+요청 경로에서는 대상 감정 집합으로 사전을 한 번 조회하면 된다.
+
+- 행은 구(district)별로 모아 두어 구 단위 조회(shard)는 행렬의 연속 구간만 본다.
+- 순위는 전체 정렬 대신 argpartition으로 상위 k개만 고른 뒤 그 k개만 정렬한다.
+  동점은 행 순서(구 → CSV 순서)로 정해 항상 같은 결과를 낸다.
+
+두 감정의 평균 점수는 순서와 중복에 무관하므로(['자부심', '자부심']의 평균 = '자부심')
+키는 정렬된 중복 없는 감정 튜플이다.
+
+좌표(set_coordinates)를 넣으면 rank_near로 사용자 위치 반경 안의 산책로만 골라
+감정 점수와 가까운 정도를 섞은 점수로 순위를 매긴다. 반경 조회는 격자 색인(trail_geo.GeoGrid)을 쓴다.
+"""
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trail_geo import GeoGrid
+
+RankKey = Tuple[str, ...]
+Ranked = Tuple[List[int], List[float]]
+
+# 주소에서 구/군을 찾지 못한 행의 shard
+UNKNOWN_DISTRICT = ""
+# 감정 점수 척도의 상한(점수 DB는 0~10점). 거리 항과 섞기 전에 0~1로 맞출 때 사용
+SCORE_MAX = 10.0
+
+
+def district_of(address: Any) -> str:
+    """'서울특별시 동대문구 휘경동 300' → '동대문구'. 구/군이 없으면 두 번째 토큰"""
+    tokens = str(address or "").split()
+    for token in tokens[1:3]:
+        if token.endswith(("구", "군")):
+            return token
+    return tokens[1] if len(tokens) > 1 else UNKNOWN_DISTRICT
+
+
+def top_k(scores: np.ndarray, k: int, has_nan: bool = True) -> np.ndarray:
+    """점수 내림차순 상위 k개 위치. 점수가 없는(NaN) 행은 맨 뒤, 동점은 앞선 위치 우선.
+    np.partition으로 k번째 값만 구해 그 이상인 행(경계의 동점 포함)을 후보로 모은 뒤 후보만 정렬한다
+    (O(n) 선택 + O(k log k) 정렬)"""
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+    filled = np.where(np.isnan(scores), -np.inf, scores) if has_nan else scores
+    if n > k:
+        kth = np.partition(filled, n - k)[n - k]
+        candidates = np.flatnonzero(filled >= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -filled[candidates]))
+    return candidates[order[:k]]
+
+
+class TrailRanking:
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        emotions: Sequence[str],
+        name_col: str = "INTEGRATED_NAME",
+        address_col: str = "ADDRESS",
+        district_col: str = "DISTRICT",
+        name_cutoff: Optional[str] = "장이소공원",
+        top_k: int = 13,
+    ):
+        started = time.perf_counter()
+        self.top_k = top_k
+        # 산책로 이름이 name_cutoff보다 사전순으로 앞서거나 같은 것만 사용(장이소공원까지)
+        if name_cutoff:
+            df = df[(df[name_col].astype(str).str.strip() <= name_cutoff).to_numpy()]
+        addresses = df[address_col].astype(str) if address_col in df.columns else pd.Series("주소 정보 없음", index=df.index)
+        districts = df[district_col].astype(str) if district_col in df.columns else addresses.map(district_of)
+        # 같은 구의 행을 연속 구간으로 모음(구 안에서는 원래 순서 유지)
+        order = np.argsort(districts.to_numpy(), kind="stable")
+        rows = df.iloc[order]
+        self.names: List[str] = [str(v) for v in rows[name_col].tolist()]
+        self.addresses: List[str] = addresses.iloc[order].tolist()
+        district_values = districts.iloc[order].tolist()
+        self.shards: Dict[str, Tuple[int, int]] = {}
+        for pos, district in enumerate(district_values):
+            start, _ = self.shards.get(district, (pos, pos))
+            self.shards[district] = (start, pos + 1)
+
+        self.emotions: List[str] = [e for e in emotions if e in rows.columns]
+        self._column: Dict[str, int] = {e: i for i, e in enumerate(self.emotions)}
+        # 감정별 연속 float32 열. 숫자가 아닌 값은 NaN(pandas mean과 같이 평균에서 제외)
+        matrix = rows[self.emotions].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float32)
+        self._columns: List[np.ndarray] = [np.ascontiguousarray(matrix[:, j]) for j in range(matrix.shape[1])]
+        self._has_nan: List[bool] = [bool(np.isnan(col).any()) for col in self._columns]
+
+        self._lock = threading.Lock()
+        # (구 또는 None, 감정 키) → (상위 행 번호, 평균 점수). 전체 조합은 미리, 구별 조합은 처음 조회할 때 계산
+        self._table: Dict[Tuple[Optional[str], RankKey], Ranked] = {}
+        for size in (1, 2):
+            for combo in itertools.combinations(self.emotions, size):
+                self._table[(None, combo)] = self._compute(combo, 0, len(self.names))
+        self.build_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._counters: Dict[str, int] = {"lookups": 0, "misses": 0, "nearLookups": 0, "nearEmpty": 0}
+        # 행 번호 → 좌표. set_coordinates 전에는 None(위치 기반 순위 불가)
+        self._geo: Optional[GeoGrid] = None
+        print(
+            f"[DEBUG] Trail ranking built: {len(self.names)} trails, {len(self.shards)} districts, "
+            f"{len(self._table)} emotion sets, {self.build_ms}ms"
+        )
+
+    def key(self, target_emotions: Sequence[str]) -> RankKey:
+        return tuple(sorted({e for e in target_emotions if e in self._column}, key=self._column.__getitem__))
+
+    def _rank_values(self, key: RankKey, start: int, end: int) -> Tuple[np.ndarray, bool]:
+        """[start, end) 행의 순위 기준 값과 NaN 포함 여부.
+        NaN이 없으면 감정 수가 같으므로 평균 대신 합으로 순위를 매겨 나눗셈 한 번을 아낌"""
+        cols = [self._column[e] for e in key]
+        parts = [self._columns[j][start:end] for j in cols]
+        has_nan = any(self._has_nan[j] for j in cols)
+        if len(parts) == 1:
+            return parts[0], has_nan
+        if not has_nan:
+            total = parts[0] + parts[1]
+            for part in parts[2:]:
+                total += part
+            return total, False
+        stacked = np.vstack(parts)
+        valid = ~np.isnan(stacked)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(valid, stacked, 0).sum(axis=0) / valid.sum(axis=0).astype(np.float32), True
+
+    def _compute(self, key: RankKey, start: int, end: int) -> Ranked:
+        values, has_nan = self._rank_values(key, start, end)
+        rows = (top_k(values, self.top_k, has_nan) + start).tolist()
+        return rows, [self._report_score(key, row) for row in rows]
+
+    def _report_score(self, key: RankKey, row: int) -> float:
+        # 응답 점수는 고른 k개만 float64로 다시 평균. float32 값은 최단 십진 표기로 되돌려
+        # (5.825가 5.8249998…이 되어) 반올림 결과가 기존과 달라지지 않게 함
+        values = [float(str(self._columns[self._column[e]][row])) for e in key]
+        values = [v for v in values if v == v]
+        return sum(values) / len(values) if values else float("nan")
+
+    def rank(self, target_emotions: Sequence[str], district: Optional[str] = None) -> Tuple[List[str], List[int], List[float]]:
+        """(점수표에 있는 대상 감정, 상위 행 번호, 평균 점수). district를 주면 그 구 안에서만 순위"""
+        key = self.key(target_emotions)
+        if not key:
+            return [], [], []
+        bounds = self.shards.get(district) if district is not None else None
+        if district is not None and bounds is None:
+            return list(key), [], []
+        table_key = (district, key)
+        hit = self._table.get(table_key)
+        with self._lock:
+            self._counters["lookups"] += 1
+            if hit is None:
+                self._counters["misses"] += 1
+        if hit is None:
+            # 구별 조합이나 세 감정 이상 등 미리 계산하지 않은 조합
+            hit = self._compute(key, *(bounds or (0, len(self.names))))
+            if len(key) <= 2:
+                with self._lock:
+                    self._table[table_key] = hit
+        return list(key), hit[0], hit[1]
+
+    def set_coordinates(self, coordinates: Dict[str, Tuple[float, float]], cell_m: float = 1000) -> int:
+        """산책로 이름 → (위도, 경도)로 격자 색인을 새로 만든다. 색인한 산책로 수를 반환"""
+        lats = np.full(len(self.names), np.nan)
+        lngs = np.full(len(self.names), np.nan)
+        for row, name in enumerate(self.names):
+            hit = coordinates.get(name) or coordinates.get(name.strip())
+            if hit is not None:
+                lats[row], lngs[row] = hit
+        geo = GeoGrid(lats, lngs, cell_m=cell_m)
+        self._geo = geo  # 통째로 바꿔 끼워 조회 중인 요청은 이전 색인을 그대로 씀
+        print(f"[DEBUG] Trail coordinates indexed: {geo.size}/{len(self.names)} trails, {geo.stats()['cells']} cells")
+        return geo.size
+
+    def coordinates_of(self, row: int) -> Optional[Tuple[float, float]]:
+        geo = self._geo
+        if geo is None or np.isnan(geo.lats[row]):
+            return None
+        return float(geo.lats[row]), float(geo.lngs[row])
+
+    def rank_near(
+        self,
+        target_emotions: Sequence[str],
+        latitude: float,
+        longitude: float,
+        radius_m: float,
+        distance_weight: float,
+        district: Optional[str] = None,
+    ) -> Optional[Tuple[List[str], List[int], List[float], List[float]]]:
+        """위치 기반 순위: (대상 감정, 상위 행 번호, 평균 감정 점수, 거리 m).
+        반경 안 산책로마다 (1 - w) * 감정 점수/SCORE_MAX + w * (1 - 거리/반경)으로 순위를 매긴다.
+        좌표가 없거나 반경 안에 산책로가 없으면 None(호출 측은 감정만으로 순위)"""
+        key = self.key(target_emotions)
+        geo = self._geo
+        if not key or geo is None:
+            return None
+        rows, distances = geo.query(latitude, longitude, radius_m)
+        if district is not None:
+            start, end = self.shards.get(district, (0, 0))
+            inside = (rows >= start) & (rows < end)
+            rows, distances = rows[inside], distances[inside]
+        with self._lock:
+            self._counters["nearLookups"] += 1
+            if not len(rows):
+                self._counters["nearEmpty"] += 1
+        if not len(rows):
+            return None
+        stacked = np.vstack([self._columns[self._column[e]][rows] for e in key]).astype(np.float64)
+        with np.errstate(invalid="ignore"):
+            valid = ~np.isnan(stacked)
+            emotion = np.where(valid, stacked, 0).sum(axis=0) / valid.sum(axis=0)
+        blended = (1 - distance_weight) * emotion / SCORE_MAX + distance_weight * (1 - distances / radius_m)
+        picked = top_k(blended, self.top_k)
+        top_rows = rows[picked].tolist()
+        return list(key), top_rows, [self._report_score(key, row) for row in top_rows], distances[picked].tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            cached = len(self._table)
+        geo = self._geo
+        return {
+            "trails": len(self.names),
+            "districts": len(self.shards),
+            "emotions": len(self.emotions),
+            "emotionSets": cached,
+            "topK": self.top_k,
+            "buildMs": self.build_ms,
+            "geo": geo.stats() if geo is not None else None,
+            **counters,
+        }
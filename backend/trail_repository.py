@@ -0,0 +1,168 @@
+"""산책로 문서 조회 계층
+
+한 요청에서 필요한 산책로(상위 3개 + 더보기 10개)를 한꺼번에 모아 조회한다.
+1. 메모리 카탈로그(TrailCatalog)에 있으면 그대로 사용
+2. 없는 것만 모아 다중 문서 읽기(get_all) 한 번
+3. 다중 읽기가 실패하면 동시 실행 수를 제한한 문서별 읽기(get_one)로 대체
+같은 이름을 이미 다른 요청이 읽고 있으면 새로 읽지 않고 그 읽기가 끝나기를 기다린다(이름별 single-flight).
+요청마다 기한(deadline_sec)을 두어 느린 문서 하나가 응답 전체를 붙잡지 않게 하고,
+기한을 넘긴 읽기는 백그라운드에서 마저 끝나 카탈로그에 들어간다(다음 요청부터 메모리 조회).
+Firestore 읽기 자체에도 read_timeout_sec를 넘겨 멈춘 읽기가 조회 스레드를 계속 붙잡지 않게 한다.
+없는 문서는 missing_ttl_sec 동안 다시 읽지 않는다.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from trail_catalog import TrailCatalog, TrailDoc
+
+
+class TrailRepository:
+    def __init__(
+        self,
+        catalog: TrailCatalog,
+        get_all: Callable[[List[str], float], Iterable[TrailDoc]],
+        get_one: Callable[[str, float], Optional[Dict[str, Any]]],
+        max_concurrency: int = 4,
+        deadline_sec: float = 1.5,
+        missing_ttl_sec: float = 300,
+        read_timeout_sec: float = 10,
+    ):
+        self.catalog = catalog
+        self.get_all = get_all
+        self.get_one = get_one
+        self.max_concurrency = max(1, max_concurrency)
+        self.deadline_sec = deadline_sec
+        self.missing_ttl_sec = missing_ttl_sec
+        self.read_timeout_sec = read_timeout_sec
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="trail-fetch")
+        self._lock = threading.Lock()
+        self._missing: Dict[str, float] = {}  # 없는 문서 → 다시 읽어도 되는 시각(monotonic)
+        self._inflight: Dict[str, Future] = {}  # 읽는 중인 이름 → 읽기가 끝나면(성공/실패) 완료되는 Future
+        self._counters: Dict[str, int] = {
+            "requests": 0,
+            "catalogHits": 0,
+            "missingHits": 0,
+            "joinedInflight": 0,
+            "batchReads": 0,
+            "batchDocs": 0,
+            "batchFailures": 0,
+            "singleReads": 0,
+            "singleFailures": 0,
+            "deadlineExceeded": 0,
+        }
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _store(self, docs: Sequence[TrailDoc]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for name, data in docs:
+                if data is None:
+                    self._missing[name] = now + self.missing_ttl_sec
+                else:
+                    self._missing.pop(name, None)
+        # 없는 문서(None)는 카탈로그에서도 빠짐
+        self.catalog.apply(docs)
+
+    def _read_batch(self, names: List[str]) -> None:
+        docs = list(self.get_all(names, self.read_timeout_sec))
+        self._store(docs)
+        self._count("batchReads")
+        self._count("batchDocs", len(docs))
+
+    def _read_one(self, name: str) -> None:
+        try:
+            data = self.get_one(name, self.read_timeout_sec)
+        except Exception:
+            self._count("singleFailures")
+            raise
+        self._count("singleReads")
+        self._store([(name, data)])
+
+    # ---- 이름별 single-flight ----
+    def _claim(self, names: List[str]) -> Tuple[List[str], List[Future]]:
+        """(이 요청이 새로 읽을 이름, 기다릴 Future 목록). 이미 읽는 중인 이름은 그 읽기를 같이 기다림"""
+        owned: List[str] = []
+        futures: List[Future] = []
+        with self._lock:
+            for name in names:
+                flight = self._inflight.get(name)
+                if flight is None:
+                    flight = self._inflight[name] = Future()
+                    owned.append(name)
+                else:
+                    self._counters["joinedInflight"] += 1
+                futures.append(flight)
+        return owned, futures
+
+    def _release(self, names: Iterable[str]) -> None:
+        with self._lock:
+            flights = [self._inflight.pop(name) for name in names if name in self._inflight]
+        for flight in flights:
+            flight.set_result(None)
+
+    def _start_batch(self, names: List[str]) -> None:
+        # 다중 읽기가 실패하면 완료 콜백에서 문서별 읽기로 이어감(요청이 기한으로 먼저 돌아가도 이름이 풀리도록)
+        def _done(batch: Future) -> None:
+            if batch.exception() is None:
+                self._release(names)
+                return
+            self._count("batchFailures")
+            print(f"[DEBUG] Trail batch read failed, falling back to {len(names)} single reads: {batch.exception()}")
+            for name in names:
+                single = self._executor.submit(self._read_one, name)
+                single.add_done_callback(lambda _f, n=name: self._release([n]))
+
+        self._executor.submit(self._read_batch, names).add_done_callback(_done)
+
+    def get_many(self, names: Sequence[str], deadline_sec: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """이름 → 카탈로그 항목. 기한 안에 읽지 못했거나 없는 문서는 결과에서 빠진다"""
+        deadline = time.monotonic() + (self.deadline_sec if deadline_sec is None else deadline_sec)
+        names = list(dict.fromkeys(n for n in names if n))
+        self._count("requests")
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        now = time.monotonic()
+        for name in names:
+            entry = self.catalog.get(name)
+            if entry is not None:
+                found[name] = entry
+                continue
+            with self._lock:
+                known_missing = self._missing.get(name, 0) > now
+            if known_missing:
+                self._count("missingHits")
+            else:
+                missing.append(name)
+        self._count("catalogHits", len(found))
+        if not missing:
+            return found
+
+        owned, flights = self._claim(missing)
+        if owned:
+            self._start_batch(owned)
+        _, pending = wait(flights, timeout=max(0.0, deadline - time.monotonic()))
+        if pending:
+            self._count("deadlineExceeded")
+            print(f"[DEBUG] Trail fetch deadline exceeded for {len(pending)} trails (continuing in background)")
+
+        for name in missing:
+            entry = self.catalog.get(name)
+            if entry is not None:
+                found[name] = entry
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "deadlineMs": int(self.deadline_sec * 1000),
+                "readTimeoutMs": int(self.read_timeout_sec * 1000),
+                "maxConcurrency": self.max_concurrency,
+                "knownMissing": sum(1 for t in self._missing.values() if t > time.monotonic()),
+                "inflight": len(self._inflight),
+                **self._counters,
+            }
@@ -1,5 +1,8 @@
 import React, { useEffect, useRef, useState } from 'react'
 import { useLocation } from '../context/LocationContext'
+import { useAuth } from '../context/AuthContext'
+import apiService from '../services/api'
+import { DEFAULT_ROUTE_DETAIL, detailForZoom, routeCoordinates } from '../utils/polyline'
 import './TrailMap.css'
 
 const TrailMap = ({ trails, isVisible, onClose }) => {
@@ -8,6 +11,64 @@ const TrailMap = ({ trails, isVisible, onClose }) => {
   const [markers, setMarkers] = useState([])
   const [polylines, setPolylines] = useState([])
   const { currentLocation } = useLocation()
+  const { getAuthHeaders } = useAuth()
+  // 그려 둔 루트: [{ name, lines: [배경선, 메인선], detail }] (확대/축소 때 상세도 바꾸기용)
+  const routeLinesRef = useRef([])
+  // `${산책로 이름}|${상세도}` → 카카오 좌표 배열 Promise (같은 루트를 동시에 두 번 받지 않도록)
+  const routeCacheRef = useRef({})
+  const detailRequestRef = useRef(0)
+
+  // [[경도, 위도], ...] → 카카오 좌표 배열 (잘못된 좌표는 건너뜀)
+  const toRoutePath = (coords) => {
+    const path = []
+    coords.forEach(coord => {
+      const lng = parseFloat(coord[0])
+      const lat = parseFloat(coord[1])
+      if (!isNaN(lng) && !isNaN(lat) && lat >= -90 && lat <= 90 && lng >= -180 && lng <= 180) {
+        path.push(new window.kakao.maps.LatLng(lat, lng))
+      }
+    })
+    return path
+  }
+
+  // 확대 레벨에 맞는 상세도로 루트 다시 그리기 (간소화 루트는 서버가 미리 만들어 둔 것을 받아 캐시)
+  const updateRouteDetail = async (level) => {
+    const detail = detailForZoom(level)
+    const requestId = ++detailRequestRef.current
+    const routes = routeLinesRef.current.filter(route => route.detail !== detail)
+    if (routes.length === 0) {
+      return
+    }
+
+    let authHeaders = {}
+    try {
+      authHeaders = await getAuthHeaders()
+    } catch (error) {
+      console.warn('[TrailMap] 인증 헤더를 가져오지 못했습니다:', error)
+    }
+
+    await Promise.all(routes.map(async (route) => {
+      const key = `${route.name}|${detail}`
+      try {
+        if (!routeCacheRef.current[key]) {
+          routeCacheRef.current[key] = apiService.getTrailRoute(route.name, { detail }, authHeaders)
+            .then(data => toRoutePath(routeCoordinates(data.route)))
+        }
+        const path = await routeCacheRef.current[key]
+        // 기다리는 동안 다시 확대/축소했으면 마지막 요청에 맡김
+        if (requestId !== detailRequestRef.current) {
+          return
+        }
+        if (path.length >= 2) {
+          route.lines.forEach(line => line.setPath(path))
+          route.detail = detail
+        }
+      } catch (error) {
+        delete routeCacheRef.current[key]
+        console.warn(`[TrailMap] ${route.name} ${detail} 루트 조회 실패:`, error)
+      }
+    }))
+  }
 
   useEffect(() => {
     if (!isVisible || !window.kakao || !window.kakao.maps) {
@@ -56,6 +117,21 @@ const TrailMap = ({ trails, isVisible, onClose }) => {
     initializeMap()
   }, [isVisible, currentLocation])
 
+  // 확대/축소하면 레벨에 맞는 상세도의 루트로 교체
+  useEffect(() => {
+    if (!map) {
+      return
+    }
+
+    const handleZoomChanged = () => {
+      updateRouteDetail(map.getLevel())
+    }
+    window.kakao.maps.event.addListener(map, 'zoom_changed', handleZoomChanged)
+    return () => {
+      window.kakao.maps.event.removeListener(map, 'zoom_changed', handleZoomChanged)
+    }
+  }, [map])
+
   useEffect(() => {
     if (!map || !trails || trails.length === 0) {
       return
@@ -67,21 +143,25 @@ const TrailMap = ({ trails, isVisible, onClose }) => {
 
     const newMarkers = []
     const newPolylines = []
+    const newRouteLines = []
     const bounds = new window.kakao.maps.LatLngBounds()
 
     trails.forEach((trail, index) => {
       console.log(`[TrailMap] Processing trail: ${trail.name}`, trail)
 
+      // 루트 좌표 (polyline 압축 형식이면 디코딩, 이전 GeoJSON 형식은 그대로)
+      const routeCoords = routeCoordinates(trail.route)
+
       // 1. 루트 라인 표시 (우선순위)
-      if (trail.route && trail.route.coordinates && trail.route.coordinates.length >= 2) {
-        console.log(`[TrailMap] ${trail.name}에 루트 데이터 있음: ${trail.route.coordinates.length}개 좌표`)
+      if (routeCoords.length >= 2) {
+        console.log(`[TrailMap] ${trail.name}에 루트 데이터 있음: ${routeCoords.length}개 좌표`)
         
         // 루트 좌표들을 카카오맵 좌표로 변환 (안전하게 처리)
         const routePath = []
         
         try {
-          for (let i = 0; i < trail.route.coordinates.length; i++) {
-            const coord = trail.route.coordinates[i]
+          for (let i = 0; i < routeCoords.length; i++) {
+            const coord = routeCoords[i]
             if (coord && coord.length >= 2) {
               const lng = parseFloat(coord[0])
               const lat = parseFloat(coord[1])
@@ -123,6 +203,8 @@ const TrailMap = ({ trails, isVisible, onClose }) => {
               polyline.setMap(map)
               newPolylines.push(backgroundLine)
               newPolylines.push(polyline)
+              // 추천 응답의 루트는 기본 상세도
+              newRouteLines.push({ name: trail.name, lines: [backgroundLine, polyline], detail: DEFAULT_ROUTE_DETAIL })
               console.log(`[TrailMap] ${trail.name} 이중 폴리라인 생성 성공: ${routePath.length}개 좌표`)
             } catch (polylineError) {
               console.error(`[TrailMap] ${trail.name} 폴리라인 생성 실패:`, polylineError)
@@ -272,7 +354,7 @@ const TrailMap = ({ trails, isVisible, onClose }) => {
     }
 
     // 지도 범위 조정
-    if (trails.length === 1 && trails[0].route && trails[0].route.coordinates.length >= 2) {
+    if (trails.length === 1 && routeCoordinates(trails[0].route).length >= 2) {
       // 단일 산책로이고 루트가 있는 경우: 루트 전체가 보이도록 조정
       map.setBounds(bounds)
     } else if (trails.length === 1 && trails[0].coordinates) {
@@ -287,6 +369,9 @@ const TrailMap = ({ trails, isVisible, onClose }) => {
 
     setMarkers(newMarkers)
     setPolylines(newPolylines)
+    routeLinesRef.current = newRouteLines
+    // 범위를 맞춘 뒤의 확대 레벨에 맞게 상세도 조정
+    updateRouteDetail(map.getLevel())
   }, [map, trails])
 
   if (!isVisible) {
@@ -47,6 +47,64 @@ export const apiService = {
     return response.data;
   },
 
+  // AI 분석 스트리밍(SSE) - 필드가 완성되는 대로 onEvent(event, data) 호출, 최종 결과(done)를 반환
+  // event: emotions | trails | keywords | comfort_message | recommendations | done | error
+  analyzeStream: async (data, authHeaders, onEvent) => {
+    const requestData = typeof data === 'string' ? { text: data } : data;
+
+    // EventSource는 POST/인증 헤더를 지원하지 않으므로 fetch 스트림을 직접 읽음
+    const response = await fetch(`${API_BASE}/api/analyze/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...authHeaders },
+      body: JSON.stringify(requestData)
+    });
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      const error = new Error(body.message || `HTTP ${response.status}`);
+      error.status = response.status;
+      error.retryAfter = response.headers.get('Retry-After');
+      throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let finalResult = null;
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // SSE 이벤트는 빈 줄(\n\n)로 구분됨
+      let sep;
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let eventName = 'message';
+        let dataText = '';
+        rawEvent.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) eventName = line.slice(7);
+          else if (line.startsWith('data: ')) dataText += line.slice(6);
+        });
+        const payload = dataText ? JSON.parse(dataText) : null;
+        if (eventName === 'done') finalResult = payload;
+        if (onEvent) onEvent(eventName, payload);
+      }
+    }
+    return finalResult;
+  },
+
+  // 산책로 루트를 지도 확대 레벨에 맞는 상세도로 조회
+  // params: { zoom } 또는 { detail: 'low' | 'medium' | 'full' }
+  getTrailRoute: async (trailName, params, authHeaders) => {
+    const response = await api.get(`/api/trails/${encodeURIComponent(trailName)}/route`, {
+      params,
+      headers: authHeaders
+    });
+    return response.data;
+  },
+
   // 나의 이용 내역 조회
   getHistory: async (authHeaders) => {
     const response = await api.get('/api/history', {
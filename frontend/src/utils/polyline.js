@@ -0,0 +1,51 @@
+// 백엔드가 보내는 압축 루트(polyline) 디코더
+// 형식: Google polyline 알고리즘, 위도/경도 순, 10^precision 고정소수점 정수의 차분 (encoding: 'polyline6')
+
+export const decodePolyline = (text, precision = 6) => {
+  const factor = Math.pow(10, precision)
+  const coordinates = []
+  let index = 0
+  let lat = 0
+  let lng = 0
+
+  const nextValue = () => {
+    let result = 0
+    let shift = 0
+    let byte
+    do {
+      byte = text.charCodeAt(index++) - 63
+      result |= (byte & 0x1f) << shift
+      shift += 5
+    } while (byte >= 0x20 && index < text.length)
+    return result & 1 ? ~(result >> 1) : result >> 1
+  }
+
+  while (index < text.length) {
+    lat += nextValue()
+    if (index >= text.length) break
+    lng += nextValue()
+    // GeoJSON과 같은 [경도, 위도] 순서로 반환
+    coordinates.push([lng / factor, lat / factor])
+  }
+  return coordinates
+}
+
+// route 객체에서 [[경도, 위도], ...] 좌표 배열 꺼내기 (polyline / 이전 GeoJSON 형식 모두 지원)
+export const routeCoordinates = (route) => {
+  if (!route) return []
+  if (typeof route.polyline === 'string') {
+    const match = /^polyline(\d+)$/.exec(route.encoding || 'polyline6')
+    return decodePolyline(route.polyline, match ? parseInt(match[1], 10) : 6)
+  }
+  return Array.isArray(route.coordinates) ? route.coordinates : []
+}
+
+// 추천 응답에 들어 있는 루트의 상세도 (백엔드 ROUTE_DEFAULT_DETAIL 기본값)
+export const DEFAULT_ROUTE_DETAIL = 'medium'
+
+// 카카오맵 확대 레벨 → 루트 상세도 (백엔드 route_geometry.detail_for_zoom과 같은 기준)
+export const detailForZoom = (level) => {
+  if (level <= 3) return 'full'
+  if (level <= 6) return 'medium'
+  return 'low'
+}